@@ -0,0 +1,186 @@
+# archives.py
+# Format d'archive d'un vote termine : fichier autonome, colonnes separees, somme SHA-256.
+#
+#   "VTAR" | version (u16) | nombre de sections (u16) | sha256 (32 octets)
+#   table des sections : nom (16s) | compresse (u8) | offset (u64) | longueur (u64) | longueur brute (u64)
+#   donnees des sections
+#
+# La somme couvre tout ce qui suit son propre champ. Les chiffres (incompressibles) sont stockes
+# bruts : un bulletin se lit directement dans la projection memoire, sans charger le fichier.
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import zlib
+from array import array
+
+MAGIC = b"VTAR"
+VERSION = 1
+ENTETE = struct.Struct("<4sHH32s")
+ENTREE = struct.Struct("<16sB7xQQQ")
+
+
+class ArchiveInvalide(Exception):
+    pass
+
+
+def _colonne_entiers(valeurs):
+    return array("q", valeurs).tobytes()
+
+
+def _colonne_textes(valeurs):
+    return "\n".join("" if v is None else str(v) for v in valeurs).encode()
+
+
+def ecrire_archive(chemin, meta, resultats, bulletins, jetons):
+    # bulletins : (id, bulletin_chiffre, jeton_hash, date_bulletin) ; jetons : (jeton_hash, utilise, date_creation)
+    fins = []
+    position = 0
+    for b in bulletins:
+        position = position + len(b[1])
+        fins.append(position)
+    utilises = bytearray((len(jetons) + 7) // 8)
+    for i, jeton in enumerate(jetons):
+        if jeton[1]:
+            utilises[i >> 3] |= 1 << (i & 7)
+
+    sections = [
+        ("meta", True, json.dumps(meta, ensure_ascii=False).encode()),
+        ("resultats", True, json.dumps(resultats, ensure_ascii=False).encode()),
+        ("bulletins_id", True, _colonne_entiers([b[0] for b in bulletins])),
+        ("bulletins_fin", True, _colonne_entiers(fins)),
+        ("bulletins", False, b"".join(bytes(b[1]) for b in bulletins)),
+        ("bulletins_jeton", False, b"".join(bytes.fromhex(b[2]) for b in bulletins)),
+        ("bulletins_date", True, _colonne_textes([b[3] for b in bulletins])),
+        ("jetons_hash", False, b"".join(bytes.fromhex(j[0]) for j in jetons)),
+        ("jetons_utilise", True, bytes(utilises)),
+        ("jetons_date", True, _colonne_textes([j[2] for j in jetons])),
+    ]
+
+    offset = ENTETE.size + ENTREE.size * len(sections)
+    table = b""
+    donnees = []
+    for nom, compresse, brut in sections:
+        contenu = zlib.compress(brut, 9) if compresse else brut
+        table = table + ENTREE.pack(nom.encode(), 1 if compresse else 0, offset, len(contenu), len(brut))
+        donnees.append(contenu)
+        offset = offset + len(contenu)
+
+    somme = hashlib.sha256(table)
+    for contenu in donnees:
+        somme.update(contenu)
+
+    temporaire = chemin + ".tmp"
+    with open(temporaire, "wb") as f:
+        f.write(ENTETE.pack(MAGIC, VERSION, len(sections), somme.digest()))
+        f.write(table)
+        for contenu in donnees:
+            f.write(contenu)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporaire, chemin)
+    return somme.hexdigest()
+
+
+class LectureArchive:
+
+    def __init__(self, chemin):
+        self.chemin = chemin
+        self.fichier = open(chemin, "rb")
+        self.mm = mmap.mmap(self.fichier.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, nombre, somme = ENTETE.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self.fermer()
+            raise ArchiveInvalide("Fichier d'archive non reconnu : " + chemin)
+        self.somme = somme
+        self.sections = {}
+        for i in range(nombre):
+            nom, compresse, offset, longueur, brute = ENTREE.unpack_from(self.mm, ENTETE.size + i * ENTREE.size)
+            self.sections[nom.rstrip(b"\x00").decode()] = (compresse, offset, longueur, brute)
+        self._cache = {}
+
+    def verifier(self, taille_bloc=1 << 20):
+        vue = memoryview(self.mm)
+        somme = hashlib.sha256()
+        for debut in range(ENTETE.size, len(self.mm), taille_bloc):
+            somme.update(vue[debut:debut + taille_bloc])
+        vue.release()
+        return somme.digest() == self.somme
+
+    def _section(self, nom):
+        compresse, offset, longueur, brute = self.sections[nom]
+        if not compresse:
+            return memoryview(self.mm)[offset:offset + longueur]
+        if nom not in self._cache:
+            self._cache[nom] = zlib.decompress(self.mm[offset:offset + longueur])
+        return self._cache[nom]
+
+    def meta(self):
+        return json.loads(self._section("meta"))
+
+    def resultats(self):
+        return json.loads(self._section("resultats"))
+
+    def nombre_bulletins(self):
+        return self.sections["bulletins_id"][3] // 8
+
+    def nombre_jetons(self):
+        return self.sections["jetons_hash"][3] // 32
+
+    def nombre_jetons_utilises(self):
+        total = 0
+        for octet in self._section("jetons_utilise"):
+            total = total + bin(octet).count("1")
+        return total
+
+    def jetons_utilises(self):
+        # Ensemble des jetons ayant vote, construit une fois puis garde avec les sections
+        if "_utilises" not in self._cache:
+            hashs = self._section("jetons_hash")
+            bits = self._section("jetons_utilise")
+            utilises = set()
+            for i in range(self.nombre_jetons()):
+                if bits[i >> 3] & (1 << (i & 7)):
+                    utilises.add(bytes(hashs[i * 32:(i + 1) * 32]).hex())
+            self._cache["_utilises"] = utilises
+        return self._cache["_utilises"]
+
+    def bulletins_depuis(self, apres_id, limite):
+        ids = array("q")
+        ids.frombytes(self._section("bulletins_id"))
+        fins = array("q")
+        fins.frombytes(self._section("bulletins_fin"))
+        chiffres = self._section("bulletins")
+        # Les ids sont croissants : recherche dichotomique du premier id > apres_id
+        bas, haut = 0, len(ids)
+        while bas < haut:
+            milieu = (bas + haut) // 2
+            if ids[milieu] <= apres_id:
+                bas = milieu + 1
+            else:
+                haut = milieu
+        lignes = []
+        for i in range(bas, min(bas + limite, len(ids))):
+            debut = fins[i - 1] if i > 0 else 0
+            lignes.append((ids[i], chiffres[debut:fins[i]]))
+        return lignes
+
+    def bulletins(self):
+        ids = array("q")
+        ids.frombytes(self._section("bulletins_id"))
+        fins = array("q")
+        fins.frombytes(self._section("bulletins_fin"))
+        chiffres = self._section("bulletins")
+        dates = bytes(self._section("bulletins_date")).decode().split("\n")
+        lignes = []
+        for i in range(len(ids)):
+            debut = fins[i - 1] if i > 0 else 0
+            lignes.append((ids[i], chiffres[debut:fins[i]], dates[i]))
+        return lignes
+
+    def fermer(self):
+        self._cache = {}
+        self.mm.close()
+        self.fichier.close()
@@ -0,0 +1,189 @@
+# audit.py
+# Journal d'audit en ajout seul, chaine par hash. Les evenements sont mis en file en memoire
+# (aucune ecriture disque sur le chemin des requetes) puis ecrits par lots par un fil dedie,
+# avec un seul fsync par lot.
+#
+# Une ligne : "<hash> <json>\n" avec hash = SHA-256(hash precedent + json). Verifier la chaine
+# ne demande donc aucun decodage JSON.
+#
+# Usage : python audit.py [chemin]   -> verifie la chaine
+
+import atexit
+import datetime
+import hashlib
+import json
+import os
+import sys
+import threading
+
+CHEMIN = os.environ.get("VOTE_AUDIT_CHEMIN", "audit.log")
+# Duree maximale (secondes) pendant laquelle un evenement peut n'exister qu'en memoire
+FENETRE_DURABILITE = float(os.environ.get("VOTE_AUDIT_FENETRE", "1.0"))
+# Au-dela, le lot est ecrit sans attendre la fin de la fenetre
+TAILLE_LOT_MAX = 1000
+
+ORIGINE = "0" * 64
+
+_en_attente = []
+_condition = threading.Condition()
+_verrou_ecriture = threading.Lock()
+_etat = {"chemin": None, "dernier_hash": ORIGINE, "sequence": 0, "ecrits": 0, "lots": 0}
+_thread = None
+
+
+def _reprendre(chemin):
+    # Retrouve le dernier hash du fichier ; une ligne incomplete (arret pendant l'ecriture,
+    # donc jamais confirmee par fsync) est retiree
+    if not os.path.exists(chemin):
+        return ORIGINE, 0
+    with open(chemin, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        taille = f.tell()
+        position = taille
+        bloc = b""
+        while position > 0:
+            lecture = min(4096, position)
+            position = position - lecture
+            f.seek(position)
+            bloc = f.read(lecture) + bloc
+            if bloc.count(b"\n") >= 2 or position == 0:
+                break
+        fin = bloc.rfind(b"\n")
+        if fin < 0:
+            f.truncate(0)
+            return ORIGINE, 0
+        if fin != len(bloc) - 1:
+            f.truncate(position + fin + 1)
+        debut = bloc.rfind(b"\n", 0, fin) + 1
+        derniere = bloc[debut:fin]
+    hash_ligne, corps = derniere.split(b" ", 1)
+    return hash_ligne.decode(), json.loads(corps)["seq"]
+
+
+def demarrer(chemin=None):
+    global _thread
+    with _condition:
+        if _thread is not None:
+            return _thread
+        _etat["chemin"] = chemin or CHEMIN
+        _etat["dernier_hash"], _etat["sequence"] = _reprendre(_etat["chemin"])
+        _thread = threading.Thread(target=_boucle, name="audit", daemon=True)
+        _thread.start()
+    return _thread
+
+
+def enregistrer(type_evenement, **details):
+    if _thread is None:
+        demarrer()
+    date = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")
+    evenement = (date, type_evenement, details)
+    with _condition:
+        _en_attente.append(evenement)
+        if len(_en_attente) >= TAILLE_LOT_MAX:
+            _condition.notify()
+
+
+def _ecrire_lot():
+    with _verrou_ecriture:
+        with _condition:
+            lot = _en_attente[:]
+            del _en_attente[:]
+        if not lot:
+            return 0
+        precedent = _etat["dernier_hash"]
+        sequence = _etat["sequence"]
+        lignes = []
+        for date, type_evenement, details in lot:
+            sequence = sequence + 1
+            corps = json.dumps({"seq": sequence, "date": date, "type": type_evenement, "details": details},
+                               ensure_ascii=False, separators=(",", ":"), sort_keys=True).encode()
+            precedent = hashlib.sha256(precedent.encode() + corps).hexdigest()
+            lignes.append(precedent.encode() + b" " + corps + b"\n")
+        with open(_etat["chemin"], "ab") as f:
+            debut = f.tell()
+            try:
+                f.write(b"".join(lignes))
+                f.flush()
+                os.fsync(f.fileno())
+            except OSError:
+                # Rien de partiel ne reste dans la chaine : le lot retourne en tete de file
+                with _condition:
+                    _en_attente[0:0] = lot
+                f.truncate(debut)
+                raise
+        _etat["dernier_hash"] = precedent
+        _etat["sequence"] = sequence
+        _etat["ecrits"] = _etat["ecrits"] + len(lot)
+        _etat["lots"] = _etat["lots"] + 1
+        return len(lot)
+
+
+def _boucle():
+    while True:
+        with _condition:
+            if len(_en_attente) < TAILLE_LOT_MAX:
+                _condition.wait(FENETRE_DURABILITE)
+        try:
+            _ecrire_lot()
+        except Exception as e:
+            # Le lot est remis en file : nouvel essai a la prochaine fenetre
+            print("Audit : ecriture echouee : " + str(e))
+
+
+def vider():
+    # Ecriture immediate de la file (arret du serveur, tests)
+    if _thread is not None:
+        return _ecrire_lot()
+    return 0
+
+
+def statistiques():
+    return {
+        "chemin": _etat["chemin"],
+        "en_attente": len(_en_attente),
+        "ecrits": _etat["ecrits"],
+        "lots": _etat["lots"],
+        "sequence": _etat["sequence"],
+        "dernier_hash": _etat["dernier_hash"],
+        "fenetre_durabilite": FENETRE_DURABILITE
+    }
+
+
+def _lignes(f, taille):
+    lu = 0
+    for ligne in f:
+        if lu + len(ligne) > taille:
+            return
+        lu = lu + len(ligne)
+        yield ligne
+
+
+def verifier(chemin=None):
+    chemin = chemin or _etat["chemin"] or CHEMIN
+    if not os.path.exists(chemin):
+        return {"valide": True, "evenements": 0, "dernier_hash": ORIGINE}
+    # Taille lue sous le verrou d'ecriture : un lot en cours d'ajout n'est pas pris pour une coupure
+    with _verrou_ecriture:
+        taille = os.path.getsize(chemin)
+    precedent = ORIGINE.encode()
+    nombre = 0
+    with open(chemin, "rb") as f:
+        for ligne in _lignes(f, taille):
+            nombre = nombre + 1
+            if not ligne.endswith(b"\n") or b" " not in ligne:
+                return {"valide": False, "evenements": nombre - 1, "ligne": nombre, "erreur": "Ligne incomplete"}
+            hash_ligne, corps = ligne[:-1].split(b" ", 1)
+            attendu = hashlib.sha256(precedent + corps).hexdigest().encode()
+            if hash_ligne != attendu:
+                return {"valide": False, "evenements": nombre - 1, "ligne": nombre, "erreur": "Chaine rompue"}
+            precedent = hash_ligne
+    return {"valide": True, "evenements": nombre, "dernier_hash": precedent.decode()}
+
+
+atexit.register(vider)
+
+
+if __name__ == "__main__":
+    rapport = verifier(sys.argv[1] if len(sys.argv) > 1 else CHEMIN)
+    print(json.dumps(rapport, ensure_ascii=False))
+    sys.exit(0 if rapport["valide"] else 1)
@@ -0,0 +1,70 @@
+# bench_demarrage.py
+# Mesure le temps d'import et la memoire (RSS max) d'un processus qui charge le serveur.
+# Usage : python bench_demarrage.py [repetitions]
+#
+# Les mesures tournent sur une copie temporaire de vote_system.db : l'initialisation peut creer
+# la cle de signature des recus (recus.charger_cle), qui ne doit pas aller dans la vraie base.
+
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+
+import database as db
+
+SCRIPT = """
+import resource, time
+debut = time.perf_counter()
+import server
+import_ms = (time.perf_counter() - debut) * 1000
+debut = time.perf_counter()
+server.initialiser(skip_init=True)
+init_ms = (time.perf_counter() - debut) * 1000
+rss_ko = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(import_ms, init_ms, rss_ko, 'sympy' in __import__('sys').modules)
+"""
+
+
+def copier_base(dossier):
+    # Copie coherente meme en mode WAL (API de sauvegarde de SQLite)
+    if not os.path.exists(db.DATABASE_PATH):
+        return
+    source = sqlite3.connect(db.DATABASE_PATH)
+    copie = sqlite3.connect(os.path.join(dossier, os.path.basename(db.DATABASE_PATH)))
+    source.backup(copie)
+    copie.close()
+    source.close()
+
+
+def mesurer(repetitions=5):
+    # Processus lances dans un dossier jetable : base, audit.log et fichiers annexes y restent
+    dossier = tempfile.mkdtemp()
+    chemins = [os.path.dirname(os.path.abspath(__file__))]
+    if os.environ.get("PYTHONPATH"):
+        chemins.append(os.environ["PYTHONPATH"])
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(chemins))
+    mesures = []
+    try:
+        copier_base(dossier)
+        for _ in range(repetitions):
+            sortie = subprocess.run([sys.executable, "-c", SCRIPT], capture_output=True, text=True, check=True,
+                                    cwd=dossier, env=env)
+            valeurs = sortie.stdout.strip().splitlines()[-1].split()
+            mesures.append((float(valeurs[0]), float(valeurs[1]), int(valeurs[2]), valeurs[3] == "True"))
+    finally:
+        shutil.rmtree(dossier, ignore_errors=True)
+    return mesures
+
+
+if __name__ == "__main__":
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    mesures = mesurer(repetitions)
+    imports = sorted(m[0] for m in mesures)
+    inits = sorted(m[1] for m in mesures)
+    rss = sorted(m[2] for m in mesures)
+    print("Import server    : median " + str(round(imports[len(imports) // 2], 2)) + " ms")
+    print("Init (skip-init) : median " + str(round(inits[len(inits) // 2], 2)) + " ms")
+    print("RSS max          : median " + str(rss[len(rss) // 2]) + " Ko")
+    print("sympy charge     : " + str(mesures[0][3]))
@@ -0,0 +1,188 @@
+# bitmaps.py
+# Ensembles d'entiers compresses, facon Roaring, pour les listes electorales. Les id sont
+# regroupes par tranches de 65536 : une tranche peu remplie est un tableau trie d'entiers
+# 16 bits, une tranche dense un bitmap de 8 Ko. Appartenance en temps constant, intersections
+# tranche par tranche ; la forme serialisee (zlib) est celle stockee en base.
+
+import array
+import bisect
+import struct
+import sys
+import zlib
+
+# Au-dela, un tableau de 16 bits prendrait plus de place qu'un bitmap de 8 Ko
+LIMITE_TABLEAU = 4096
+TAILLE_BITMAP = 8192
+ID_MAX = 2 ** 32 - 1
+
+TABLEAU, DENSE = 0, 1
+_ENTETE = struct.Struct("<HBI")
+
+
+def _vers_dense(tableau):
+    octets = bytearray(TAILLE_BITMAP)
+    for bas in tableau:
+        octets[bas >> 3] |= 1 << (bas & 7)
+    return octets
+
+
+def _entier(octets):
+    return int.from_bytes(octets, "little")
+
+
+def _valeurs_denses(octets):
+    for position, octet in enumerate(octets):
+        if octet:
+            for bit in range(8):
+                if octet >> bit & 1:
+                    yield (position << 3) | bit
+
+
+def _cardinalite(conteneur):
+    if isinstance(conteneur, bytearray):
+        return _entier(conteneur).bit_count()
+    return len(conteneur)
+
+
+def _intersecter(a, b):
+    # Retourne le conteneur intersection (tableau ou dense), ou None s'il est vide
+    if isinstance(a, bytearray) and isinstance(b, bytearray):
+        commun = _entier(a) & _entier(b)
+        if not commun:
+            return None
+        octets = bytearray(commun.to_bytes(TAILLE_BITMAP, "little"))
+        if commun.bit_count() > LIMITE_TABLEAU:
+            return octets
+        return array.array("H", _valeurs_denses(octets))
+    if isinstance(a, bytearray):
+        a, b = b, a
+    if isinstance(b, bytearray):
+        resultat = array.array("H", (bas for bas in a if b[bas >> 3] >> (bas & 7) & 1))
+    else:
+        resultat = array.array("H", sorted(set(a).intersection(b)))
+    return resultat if resultat else None
+
+
+class Bitmap:
+
+    def __init__(self):
+        self._conteneurs = {}
+        self._taille = 0
+
+    @classmethod
+    def depuis_ids(cls, ids):
+        bitmap = cls()
+        valeurs = set(ids)
+        if not all(isinstance(x, int) and 0 <= x <= ID_MAX for x in valeurs):
+            raise ValueError("Identifiants attendus : entiers de 0 a " + str(ID_MAX))
+        valeurs = sorted(valeurs)
+        debut = 0
+        while debut < len(valeurs):
+            haut = valeurs[debut] >> 16
+            fin = bisect.bisect_left(valeurs, (haut + 1) << 16, debut)
+            tableau = array.array("H", (x & 0xFFFF for x in valeurs[debut:fin]))
+            bitmap._conteneurs[haut] = _vers_dense(tableau) if len(tableau) > LIMITE_TABLEAU else tableau
+            debut = fin
+        bitmap._taille = len(valeurs)
+        return bitmap
+
+    def ajouter(self, x):
+        # Retourne True si x n'y etait pas
+        haut, bas = x >> 16, x & 0xFFFF
+        conteneur = self._conteneurs.get(haut)
+        if conteneur is None:
+            self._conteneurs[haut] = array.array("H", [bas])
+        elif isinstance(conteneur, bytearray):
+            if conteneur[bas >> 3] >> (bas & 7) & 1:
+                return False
+            conteneur[bas >> 3] |= 1 << (bas & 7)
+        else:
+            position = bisect.bisect_left(conteneur, bas)
+            if position < len(conteneur) and conteneur[position] == bas:
+                return False
+            conteneur.insert(position, bas)
+            if len(conteneur) > LIMITE_TABLEAU:
+                self._conteneurs[haut] = _vers_dense(conteneur)
+        self._taille = self._taille + 1
+        return True
+
+    def __contains__(self, x):
+        conteneur = self._conteneurs.get(x >> 16)
+        if conteneur is None:
+            return False
+        bas = x & 0xFFFF
+        if isinstance(conteneur, bytearray):
+            return conteneur[bas >> 3] >> (bas & 7) & 1 == 1
+        position = bisect.bisect_left(conteneur, bas)
+        return position < len(conteneur) and conteneur[position] == bas
+
+    def __len__(self):
+        return self._taille
+
+    def __iter__(self):
+        for haut in sorted(self._conteneurs):
+            conteneur = self._conteneurs[haut]
+            valeurs = _valeurs_denses(conteneur) if isinstance(conteneur, bytearray) else conteneur
+            for bas in valeurs:
+                yield (haut << 16) | bas
+
+    def intersection(self, autre):
+        resultat = Bitmap()
+        for haut in self._conteneurs:
+            if haut in autre._conteneurs:
+                conteneur = _intersecter(self._conteneurs[haut], autre._conteneurs[haut])
+                if conteneur is not None:
+                    resultat._conteneurs[haut] = conteneur
+                    resultat._taille = resultat._taille + _cardinalite(conteneur)
+        return resultat
+
+    def cardinalite_intersection(self, autre):
+        # Sans construire l'intersection : un ET par tranche dense puis un comptage de bits
+        total = 0
+        for haut in self._conteneurs:
+            if haut not in autre._conteneurs:
+                continue
+            a, b = self._conteneurs[haut], autre._conteneurs[haut]
+            if isinstance(a, bytearray) and isinstance(b, bytearray):
+                total = total + (_entier(a) & _entier(b)).bit_count()
+            else:
+                conteneur = _intersecter(a, b)
+                total = total + (len(conteneur) if conteneur is not None else 0)
+        return total
+
+    def memoire(self):
+        return sum(len(c) if isinstance(c, bytearray) else len(c) * 2 for c in self._conteneurs.values())
+
+    def serialiser(self):
+        morceaux = []
+        for haut in sorted(self._conteneurs):
+            conteneur = self._conteneurs[haut]
+            if isinstance(conteneur, bytearray):
+                morceaux.append(_ENTETE.pack(haut, DENSE, _cardinalite(conteneur)) + bytes(conteneur))
+            else:
+                tableau = array.array("H", conteneur)
+                if sys.byteorder == "big":
+                    tableau.byteswap()
+                morceaux.append(_ENTETE.pack(haut, TABLEAU, len(tableau)) + tableau.tobytes())
+        return zlib.compress(b"".join(morceaux))
+
+    @classmethod
+    def charger(cls, donnees):
+        bitmap = cls()
+        brut = zlib.decompress(donnees)
+        position = 0
+        while position < len(brut):
+            haut, type_conteneur, nombre = _ENTETE.unpack_from(brut, position)
+            position = position + _ENTETE.size
+            if type_conteneur == DENSE:
+                bitmap._conteneurs[haut] = bytearray(brut[position:position + TAILLE_BITMAP])
+                position = position + TAILLE_BITMAP
+            else:
+                tableau = array.array("H")
+                tableau.frombytes(brut[position:position + nombre * 2])
+                if sys.byteorder == "big":
+                    tableau.byteswap()
+                bitmap._conteneurs[haut] = tableau
+                position = position + nombre * 2
+            bitmap._taille = bitmap._taille + nombre
+        return bitmap
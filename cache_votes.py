@@ -0,0 +1,87 @@
+import threading
+import database as db
+import filtre_jetons
+import listes_electorales
+import recus
+import reponses
+import rsa as crypto
+
+# Caches en memoire des donnees lues a chaque bulletin ; invalides a chaque changement de statut
+_cles_publiques = {}
+_options = {}
+_votes_actifs = {}
+_vote_actif = {"charge": False, "vote": None}
+_verrou = threading.Lock()
+
+
+def get_cle_publique(vote):
+    cle = _cles_publiques.get(vote["id"])
+    if cle is None:
+        cle = crypto.json_vers_cle_publique(vote["cle_publique_vote"])
+        _cles_publiques[vote["id"]] = cle
+    return cle
+
+
+def get_options(vote_id):
+    options = _options.get(vote_id)
+    if options is None:
+        options = db.get_options_by_vote(vote_id)
+        _options[vote_id] = options
+    return options
+
+
+def get_vote(vote_id):
+    # Seuls les votes actifs sont gardes : leur statut ne change que via invalider()
+    vote = _votes_actifs.get(int(vote_id))
+    if vote is None:
+        vote = db.get_vote(vote_id)
+        if vote and vote["statut"] == "active":
+            _votes_actifs[vote["id"]] = vote
+    return vote
+
+
+def get_vote_actif():
+    if not _vote_actif["charge"]:
+        with _verrou:
+            _vote_actif["vote"] = db.get_vote_actif()
+            _vote_actif["charge"] = True
+    return _vote_actif["vote"]
+
+
+def invalider_options(vote_id=None):
+    if vote_id is None:
+        _options.clear()
+        reponses.invalider_tout("options")
+    else:
+        _options.pop(int(vote_id), None)
+        reponses.invalider(("options", int(vote_id)))
+
+
+def invalider(vote_id):
+    vote_id = int(vote_id)
+    with _verrou:
+        _cles_publiques.pop(vote_id, None)
+        _options.pop(vote_id, None)
+        _votes_actifs.pop(vote_id, None)
+        _vote_actif["charge"] = False
+
+
+def prechauffer(vote_id):
+    # Charge tout ce dont les premiers votants auront besoin avant qu'ils n'arrivent
+    vote = db.get_vote(vote_id)
+    if not vote:
+        return False
+    if vote["cle_publique_vote"]:
+        get_cle_publique(vote)
+    recus.charger_cle()
+    listes_electorales.get_liste(vote["id"])
+    _options[vote["id"]] = db.get_options_by_vote(vote["id"])
+    if vote["statut"] == "active":
+        _votes_actifs[vote["id"]] = vote
+        get_vote_actif()
+        # Les options sont figees une fois le vote ouvert
+        reponses.invalider(("options", vote["id"]))
+        reponses.options(vote["id"])
+    if filtre_jetons.get_filtre(vote["id"]) is None or vote["statut"] == "active":
+        db.charger_filtre_jetons(vote["id"])
+    return True
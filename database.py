@@ -1,10 +1,52 @@
 
 import sqlite3
+import base64
 import hashlib
+import json
+import os
 import random
+import shutil
 import string
+import threading
+import archives
+import audit
+import filtre_jetons
+import medias
+import merkle
 
 DATABASE_PATH = "vote_system.db"
+SCHEMA_VERSION = 10
+
+# Cycle de vie d'un vote : transitions autorisees
+TRANSITIONS = {
+    "en_attente": ("active",),
+    "active": ("terminee",),
+    "terminee": (),
+}
+
+# Copie de la base servie aux lectures d'administration (voir replique.py)
+REPLIQUE_PATH = None
+
+# Mode optionnel : bulletins et jetons de chaque vote dans leur propre fichier SQLite
+STOCKAGE_PAR_VOTE = os.environ.get("VOTE_STOCKAGE_PAR_VOTE", "0") == "1"
+DOSSIER_FRAGMENTS = "fragments"
+DOSSIER_FRAGMENTS_ARCHIVES = os.path.join("fragments", "archives")
+
+# Mode partitionne (voir routeur.py) : ce processus ne detient que les jetons dont le hash
+# tombe dans sa plage ; le catalogue (votes, options, electeurs) reste dans DATABASE_PATH
+PARTITION = None
+NB_PARTITIONS = 1
+DOSSIER_PARTITIONS = "partitions"
+CHEMIN_PARTITION = None
+
+# Votes termines exportes hors de la base (voir archives.py)
+DOSSIER_ARCHIVES = "archives"
+TAILLE_LOT_PURGE = 5000
+
+_fragments_prets = set()
+_verrou_fragments = threading.Lock()
+_archives_ouvertes = {}
+_verrou_archives = threading.Lock()
 
 
 def hash_password(password):
@@ -19,10 +61,90 @@ def generer_salt():
     return salt
 
 
+def _creer_tables_merkle(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS merkle_etats (
+            vote_id INTEGER PRIMARY KEY,
+            taille INTEGER NOT NULL,
+            frontiere TEXT NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS merkle_noeuds (
+            vote_id INTEGER NOT NULL,
+            niveau INTEGER NOT NULL,
+            indice INTEGER NOT NULL,
+            hash TEXT NOT NULL,
+            PRIMARY KEY (vote_id, niveau, indice)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_merkle_feuilles ON merkle_noeuds (vote_id, hash) WHERE niveau = 0")
+
+
+def _creer_table_retraits(cursor):
+    # Electeurs ayant retire un jeton, par vote : rangee a cote des jetons (partition, fragment)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS jetons_retires (
+            vote_id INTEGER NOT NULL,
+            electeur_id INTEGER NOT NULL,
+            PRIMARY KEY (vote_id, electeur_id)
+        ) WITHOUT ROWID
+    """)
+
+
+def _creer_tables_decompte(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS decomptes_en_cours (
+            vote_id INTEGER PRIMARY KEY,
+            dernier_bulletin_id INTEGER NOT NULL DEFAULT 0,
+            total INTEGER NOT NULL DEFAULT 0,
+            invalides INTEGER NOT NULL DEFAULT 0,
+            date_maj TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (vote_id) REFERENCES votes(id)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS decomptes_partiels (
+            vote_id INTEGER NOT NULL,
+            option_id INTEGER NOT NULL,
+            nombre INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (vote_id, option_id)
+        )
+    """)
+
+
+def connexion_lecture(replique=False):
+    if replique and REPLIQUE_PATH:
+        return sqlite3.connect("file:" + REPLIQUE_PATH + "?mode=ro", uri=True)
+    return sqlite3.connect(DATABASE_PATH)
+
+
+def schema_a_jour():
+    if not os.path.exists(DATABASE_PATH):
+        return False
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA user_version")
+    version = cursor.fetchone()[0]
+    conn.close()
+    return version == SCHEMA_VERSION
+
+
+def _ajouter_colonne(cursor, table, colonne, type_colonne):
+    cursor.execute("PRAGMA table_info(" + table + ")")
+    for row in cursor.fetchall():
+        if row[1] == colonne:
+            return
+    cursor.execute("ALTER TABLE " + table + " ADD COLUMN " + colonne + " " + type_colonne)
+
+
 def init_database():
     conn = sqlite3.connect(DATABASE_PATH)
     cursor = conn.cursor()
     
+    # WAL : les lectures (et les copies de replique.py) ne bloquent pas les ecritures de bulletins
+    cursor.execute("PRAGMA journal_mode=WAL")
+    
 
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS electeurs (
@@ -45,9 +167,13 @@ def init_database():
             cle_publique_vote TEXT,
             cle_privee_vote TEXT,
             statut TEXT DEFAULT 'en_attente',
-            date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            date_ouverture TIMESTAMP,
+            date_fermeture TIMESTAMP
         )
     """)
+    _ajouter_colonne(cursor, "votes", "date_ouverture", "TIMESTAMP")
+    _ajouter_colonne(cursor, "votes", "date_fermeture", "TIMESTAMP")
     
 
     cursor.execute("""
@@ -79,7 +205,7 @@ def init_database():
         CREATE TABLE IF NOT EXISTS bulletins (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             vote_id INTEGER NOT NULL,
-            bulletin_chiffre TEXT NOT NULL,
+            bulletin_chiffre BLOB NOT NULL,
             jeton_hash TEXT NOT NULL,
             date_bulletin TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (vote_id) REFERENCES votes(id)
@@ -110,6 +236,105 @@ def init_database():
     """)
     
 
+    _creer_tables_merkle(cursor)
+    
+
+    # Index plein texte du registre des electeurs, synchronise par triggers
+    cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS electeurs_fts USING fts5(
+            nom, prenom, email,
+            content='electeurs', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS electeurs_fts_ai AFTER INSERT ON electeurs BEGIN
+            INSERT INTO electeurs_fts (rowid, nom, prenom, email) VALUES (new.id, new.nom, new.prenom, new.email);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS electeurs_fts_ad AFTER DELETE ON electeurs BEGIN
+            INSERT INTO electeurs_fts (electeurs_fts, rowid, nom, prenom, email) VALUES ('delete', old.id, old.nom, old.prenom, old.email);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS electeurs_fts_au AFTER UPDATE ON electeurs BEGIN
+            INSERT INTO electeurs_fts (electeurs_fts, rowid, nom, prenom, email) VALUES ('delete', old.id, old.nom, old.prenom, old.email);
+            INSERT INTO electeurs_fts (rowid, nom, prenom, email) VALUES (new.id, new.nom, new.prenom, new.email);
+        END
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_electeurs_inscription ON electeurs (date_inscription)")
+    
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS cles_signature (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cle_publique TEXT NOT NULL,
+            cle_privee TEXT NOT NULL,
+            date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
+
+    _creer_tables_decompte(cursor)
+    
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS archives_votes (
+            vote_id INTEGER PRIMARY KEY,
+            chemin TEXT NOT NULL,
+            sha256 TEXT NOT NULL,
+            nb_bulletins INTEGER NOT NULL,
+            nb_jetons INTEGER NOT NULL,
+            nb_jetons_utilises INTEGER NOT NULL,
+            date_archive TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (vote_id) REFERENCES votes(id)
+        )
+    """)
+    
+
+    # Listes electorales par vote : bitmaps compresses sur electeurs.id (voir bitmaps.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS listes_electorales (
+            vote_id INTEGER PRIMARY KEY,
+            eligibles BLOB NOT NULL,
+            nb_eligibles INTEGER NOT NULL,
+            date_maj TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (vote_id) REFERENCES votes(id)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS segments_electoraux (
+            vote_id INTEGER NOT NULL,
+            nom TEXT NOT NULL,
+            membres BLOB NOT NULL,
+            nb_membres INTEGER NOT NULL,
+            PRIMARY KEY (vote_id, nom),
+            FOREIGN KEY (vote_id) REFERENCES votes(id)
+        )
+    """)
+    _creer_table_retraits(cursor)
+    
+
+    # Travaux d'administration executes en arriere-plan (voir taches.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS taches (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cle TEXT UNIQUE,
+            type TEXT NOT NULL,
+            parametres TEXT NOT NULL,
+            statut TEXT DEFAULT 'en_attente',
+            progression REAL DEFAULT 0,
+            resultat TEXT,
+            erreur TEXT,
+            date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            date_debut TIMESTAMP,
+            date_fin TIMESTAMP
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_taches_statut ON taches (statut)")
+    
+
     cursor.execute("SELECT COUNT(*) FROM administrateurs")
     count = cursor.fetchone()[0]
     if count == 0:
@@ -119,7 +344,37 @@ def init_database():
         )
     
     conn.commit()
+    
+    cursor.execute("PRAGMA user_version")
+    version = cursor.fetchone()[0]
     conn.close()
+    if version < 1:
+        migrer_bulletins_binaires()
+    if version < 2:
+        conn = sqlite3.connect(DATABASE_PATH)
+        conn.execute("INSERT INTO electeurs_fts (electeurs_fts) VALUES ('rebuild')")
+        conn.commit()
+        conn.close()
+    if version < 5:
+        # auto_vacuum ne change qu'avec un VACUUM complet : fait une fois, les purges
+        # d'archivage rendent ensuite les pages libres par PRAGMA incremental_vacuum
+        conn = sqlite3.connect(DATABASE_PATH)
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        conn.close()
+    if version < 10:
+        # Rejouee en version 10 : les photos illisibles laissees par la premiere passe sont effacees
+        migrer_photos()
+    if version < 9:
+        # Les anciennes taches generer_cles gardaient la cle privee dans leur resultat
+        conn = sqlite3.connect(DATABASE_PATH)
+        conn.execute("UPDATE taches SET resultat = NULL WHERE type = 'generer_cles'")
+        conn.commit()
+        conn.close()
+    if version < SCHEMA_VERSION:
+        conn = sqlite3.connect(DATABASE_PATH)
+        conn.execute("PRAGMA user_version = " + str(SCHEMA_VERSION))
+        conn.close()
     print("Base de donnees initialisee avec succes.")
 
 
@@ -183,8 +438,8 @@ def get_electeur(electeur_id):
         return None
 
 
-def get_all_electeurs():
-    conn = sqlite3.connect(DATABASE_PATH)
+def get_all_electeurs(replique=False):
+    conn = connexion_lecture(replique)
     cursor = conn.cursor()
     cursor.execute("SELECT id, nom, prenom, email, date_inscription FROM electeurs")
     rows = cursor.fetchall()
@@ -204,7 +459,125 @@ def get_all_electeurs():
 
 
 
+def _requete_fts(q):
+    # Chaque mot devient un prefixe entre guillemets : pas d'injection de syntaxe FTS5
+    termes = []
+    for mot in q.split():
+        propre = ""
+        for c in mot:
+            if c.isalnum():
+                propre = propre + c
+            else:
+                propre = propre + " "
+        for morceau in propre.split():
+            termes.append('"' + morceau + '"*')
+    return " ".join(termes)
+
+
+def rechercher_electeurs(q="", limite=20, inscrit_apres=None, inscrit_avant=None, vote_id=None, a_vote=None):
+    requete_fts = _requete_fts(q)
+    conditions = []
+    params = []
+    if requete_fts:
+        sql = "SELECT e.id, e.nom, e.prenom, e.email, e.date_inscription FROM electeurs_fts f JOIN electeurs e ON e.id = f.rowid"
+        conditions.append("electeurs_fts MATCH ?")
+        params.append(requete_fts)
+        ordre = " ORDER BY f.rank"
+    else:
+        sql = "SELECT e.id, e.nom, e.prenom, e.email, e.date_inscription FROM electeurs e"
+        ordre = " ORDER BY e.id"
+    if inscrit_apres:
+        conditions.append("e.date_inscription >= ?")
+        params.append(inscrit_apres)
+    if inscrit_avant:
+        conditions.append("e.date_inscription < ?")
+        params.append(inscrit_avant)
+    if conditions:
+        sql = sql + " WHERE " + " AND ".join(conditions)
+    sql = sql + ordre + " LIMIT ? OFFSET ?"
+    
+    vote = None
+    if vote_id is not None and a_vote is not None:
+        vote = get_vote(vote_id)
+        if not vote:
+            return []
+    
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    electeurs = []
+    decalage = 0
+    while len(electeurs) < limite:
+        # Le filtre "a vote" se calcule hors SQL (jetons anonymes) : on parcourt par lots
+        taille_lot = limite if vote is None else max(limite * 4, 100)
+        cursor.execute(sql, params + [taille_lot, decalage])
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        decalage = decalage + len(rows)
+        if vote is not None:
+            rows = _filtrer_par_participation(rows, vote, a_vote)
+        for row in rows:
+            if len(electeurs) >= limite:
+                break
+            electeurs.append({
+                "id": row[0],
+                "nom": row[1],
+                "prenom": row[2],
+                "email": row[3],
+                "date_inscription": row[4]
+            })
+        if vote is None:
+            break
+    conn.close()
+    return electeurs
+
+
+def _filtrer_par_participation(rows, vote, a_vote):
+    hashs = {}
+    for row in rows:
+        hashs[hash_jeton(generer_jeton(row[0], vote["id"], vote["salt"]))] = row[0]
+    ont_vote = set()
+    archive = get_archive(vote["id"])
+    if archive is not None:
+        utilises = archive.jetons_utilises()
+        for jeton_hash in hashs:
+            if jeton_hash in utilises:
+                ont_vote.add(hashs[jeton_hash])
+    else:
+        # Mode partitionne : chaque jeton est lu dans le fichier de la partition qui le detient
+        groupes = {}
+        for jeton_hash in hashs:
+            indice = partition_de(jeton_hash) if PARTITION is not None else None
+            groupes.setdefault(indice, []).append(jeton_hash)
+        for indice in groupes:
+            if indice is None:
+                conn = connexion_bulletins(vote["id"])
+            else:
+                conn = sqlite3.connect(chemin_partition(indice), timeout=10)
+            cursor = conn.cursor()
+            marques = ",".join("?" * len(groupes[indice]))
+            cursor.execute(
+                "SELECT jeton_hash FROM jetons WHERE utilise = 1 AND jeton_hash IN (" + marques + ")",
+                groupes[indice]
+            )
+            for (jeton_hash,) in cursor.fetchall():
+                ont_vote.add(hashs[jeton_hash])
+            conn.close()
+    
+    filtres = []
+    for row in rows:
+        if (row[0] in ont_vote) == bool(a_vote):
+            filtres.append(row)
+    return filtres
+
+
+
 def ajouter_option(vote_id, libelle, description="", photo=""):
+    # La photo est rangee dans medias/ ; la ligne ne garde que son hash (MediaInvalide sinon)
+    if not photo:
+        photo = ""
+    elif not medias.est_hash(photo):
+        photo = medias.enregistrer(photo)
     conn = sqlite3.connect(DATABASE_PATH)
     cursor = conn.cursor()
     cursor.execute(
@@ -214,6 +587,7 @@ def ajouter_option(vote_id, libelle, description="", photo=""):
     conn.commit()
     option_id = cursor.lastrowid
     conn.close()
+    audit.enregistrer("ajouter_option", vote_id=vote_id, option_id=option_id, libelle=libelle)
     return {"success": True, "id": option_id}
 
 
@@ -265,16 +639,367 @@ def get_all_options():
     return options
 
 
+def definir_photo_option(option_id, photo):
+    empreinte = medias.enregistrer(photo) if photo else ""
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    cursor.execute("UPDATE options SET photo = ? WHERE id = ?", (empreinte, option_id))
+    modifiees = cursor.rowcount
+    cursor.execute("SELECT vote_id FROM options WHERE id = ?", (option_id,))
+    row = cursor.fetchone()
+    conn.commit()
+    conn.close()
+    if modifiees == 0:
+        return {"success": False, "error": "Option non trouvee"}
+    audit.enregistrer("definir_photo_option", option_id=option_id, photo=empreinte)
+    return {"success": True, "id": option_id, "vote_id": row[0], "photo": empreinte}
+
+
+def migrer_photos():
+    # Images stockees dans options.photo (data URL, base64) deplacees vers medias/
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, photo FROM options WHERE photo IS NOT NULL AND photo != ''")
+    rows = cursor.fetchall()
+    migrees = 0
+    for option_id, photo in rows:
+        if medias.est_hash(photo):
+            continue
+        try:
+            empreinte = medias.enregistrer(photo)
+        except medias.MediaInvalide:
+            # Valeur illisible : la page de vote en ferait une URL /medias/<valeur>/... invalide
+            empreinte = None
+        cursor.execute("UPDATE options SET photo = ? WHERE id = ?", (empreinte, option_id))
+        migrees = migrees + 1
+    conn.commit()
+    conn.close()
+    return migrees
+
+
 def supprimer_option(option_id):
     conn = sqlite3.connect(DATABASE_PATH)
     cursor = conn.cursor()
     cursor.execute("DELETE FROM options WHERE id = ?", (option_id,))
+    supprimees = cursor.rowcount
     conn.commit()
     conn.close()
+    audit.enregistrer("supprimer_option", option_id=option_id, supprimees=supprimees)
     return {"success": True}
 
 
 
+def chemin_fragment(vote_id):
+    nom = "vote_" + str(int(vote_id)) + ".db"
+    chemin = os.path.join(DOSSIER_FRAGMENTS, nom)
+    archive = os.path.join(DOSSIER_FRAGMENTS_ARCHIVES, nom)
+    if not os.path.exists(chemin) and os.path.exists(archive):
+        return archive
+    return chemin
+
+
+def _init_fragment(chemin):
+    os.makedirs(os.path.dirname(chemin), exist_ok=True)
+    conn = sqlite3.connect(chemin)
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jetons (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            vote_id INTEGER NOT NULL,
+            jeton_hash TEXT NOT NULL UNIQUE,
+            utilise INTEGER DEFAULT 0,
+            date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS bulletins (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            vote_id INTEGER NOT NULL,
+            bulletin_chiffre BLOB NOT NULL,
+            jeton_hash TEXT NOT NULL,
+            date_bulletin TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    _creer_tables_merkle(conn.cursor())
+    _creer_table_retraits(conn.cursor())
+    conn.commit()
+    conn.execute("PRAGMA user_version = " + str(SCHEMA_VERSION))
+    conn.close()
+
+
+def partition_de(jeton_hash, nombre=None):
+    # Plages contigues sur les 32 premiers bits du hash (deja uniformes : c'est un SHA-256)
+    if nombre is None:
+        nombre = NB_PARTITIONS
+    return (int(jeton_hash[:8], 16) * nombre) >> 32
+
+
+def chemin_partition(indice):
+    return os.path.join(DOSSIER_PARTITIONS, "partition_" + str(int(indice)) + ".db")
+
+
+def configurer_partition(indice, nombre):
+    global PARTITION, NB_PARTITIONS, CHEMIN_PARTITION
+    if not 0 <= indice < nombre:
+        raise ValueError("Partition hors plage : " + str(indice) + "/" + str(nombre))
+    chemin = chemin_partition(indice)
+    _init_fragment(chemin)
+    # Les points de reprise du decompte suivent les bulletins de la partition
+    conn = sqlite3.connect(chemin)
+    _creer_tables_decompte(conn.cursor())
+    conn.commit()
+    conn.close()
+    PARTITION, NB_PARTITIONS, CHEMIN_PARTITION = indice, nombre, chemin
+
+
+def _fragment(vote_id):
+    # Fichier propre au vote s'il existe ; None : le vote est dans la base principale.
+    # Un fichier n'est jamais cree ici (lectures anonymes) : voir creer_fragment
+    chemin = chemin_fragment(vote_id)
+    if chemin in _fragments_prets:
+        return chemin
+    if not os.path.exists(chemin):
+        return None
+    with _verrou_fragments:
+        if chemin not in _fragments_prets:
+            # Fragment ouvert pour la premiere fois par ce processus : schema mis a jour
+            if not chemin.startswith(DOSSIER_FRAGMENTS_ARCHIVES):
+                _init_fragment(chemin)
+            _fragments_prets.add(chemin)
+    return chemin
+
+
+def creer_fragment(vote_id):
+    # Appele a la creation et a l'ouverture d'un vote. Un vote qui a deja des jetons dans la
+    # base principale (stockage par vote active en cours de route) y reste
+    if not STOCKAGE_PAR_VOTE or CHEMIN_PARTITION or _fragment(vote_id):
+        return
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM jetons WHERE vote_id = ? LIMIT 1", (vote_id,))
+    en_base = cursor.fetchone() is not None
+    conn.close()
+    if en_base:
+        return
+    chemin = chemin_fragment(vote_id)
+    with _verrou_fragments:
+        if chemin not in _fragments_prets:
+            _init_fragment(chemin)
+            _fragments_prets.add(chemin)
+
+
+def connexion_bulletins(vote_id):
+    # Route vers la partition de ce processus, le fichier propre au vote ou la base principale
+    if CHEMIN_PARTITION:
+        return sqlite3.connect(CHEMIN_PARTITION, timeout=10)
+    if STOCKAGE_PAR_VOTE:
+        chemin = _fragment(vote_id)
+        if chemin:
+            return sqlite3.connect(chemin, timeout=10)
+    return sqlite3.connect(DATABASE_PATH)
+
+
+def get_votes_fragmentes():
+    vote_ids = []
+    for dossier in (DOSSIER_FRAGMENTS, DOSSIER_FRAGMENTS_ARCHIVES):
+        if not os.path.isdir(dossier):
+            continue
+        for nom in os.listdir(dossier):
+            if nom.startswith("vote_") and nom.endswith(".db"):
+                vote_id = int(nom[5:-3])
+                if vote_id not in vote_ids:
+                    vote_ids.append(vote_id)
+    return vote_ids
+
+
+def bulletins_en_base_principale():
+    # Faux si des jetons ou bulletins vivent hors de DATABASE_PATH : la replique ne les contient pas
+    return CHEMIN_PARTITION is None and not (STOCKAGE_PAR_VOTE and get_votes_fragmentes())
+
+
+def _connexions_bulletins(votes_actifs=False):
+    # Toutes les bases contenant des bulletins : principale puis fragments.
+    # votes_actifs : seulement les fragments des votes ouverts (recherche d'un jeton a utiliser)
+    if CHEMIN_PARTITION:
+        return [sqlite3.connect(CHEMIN_PARTITION, timeout=10)]
+    connexions = [sqlite3.connect(DATABASE_PATH)]
+    if STOCKAGE_PAR_VOTE:
+        vote_ids = get_ids_votes_actifs() if votes_actifs else get_votes_fragmentes()
+        for vote_id in vote_ids:
+            chemin = _fragment(vote_id)
+            if chemin:
+                connexions.append(sqlite3.connect(chemin, timeout=10))
+    return connexions
+
+
+def detacher_fragment(vote_id):
+    if not STOCKAGE_PAR_VOTE:
+        return {"success": False, "error": "Stockage par vote desactive"}
+    vote = get_vote(vote_id)
+    if not vote:
+        return {"success": False, "error": "Vote non trouve"}
+    if vote["statut"] != "terminee":
+        return {"success": False, "error": "Seul un vote termine peut etre archive"}
+    nom = "vote_" + str(int(vote_id)) + ".db"
+    chemin = os.path.join(DOSSIER_FRAGMENTS, nom)
+    if not os.path.exists(chemin):
+        return {"success": False, "error": "Aucun fragment pour ce vote"}
+    conn = sqlite3.connect(chemin)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.execute("PRAGMA journal_mode=DELETE")
+    conn.close()
+    os.makedirs(DOSSIER_FRAGMENTS_ARCHIVES, exist_ok=True)
+    archive = os.path.join(DOSSIER_FRAGMENTS_ARCHIVES, nom)
+    with _verrou_fragments:
+        shutil.move(chemin, archive)
+        _fragments_prets.discard(chemin)
+    return {"success": True, "archive": archive}
+
+
+
+def chemin_archive(vote_id):
+    return os.path.join(DOSSIER_ARCHIVES, "vote_" + str(int(vote_id)) + ".vtar")
+
+
+def get_archive(vote_id):
+    # Archive ouverte (projection memoire) d'un vote exporte, None si le vote est encore en base
+    vote_id = int(vote_id)
+    archive = _archives_ouvertes.get(vote_id)
+    if archive is not None:
+        return archive
+    chemin = chemin_archive(vote_id)
+    if not os.path.exists(chemin):
+        return None
+    with _verrou_archives:
+        if vote_id not in _archives_ouvertes:
+            _archives_ouvertes[vote_id] = archives.LectureArchive(chemin)
+        return _archives_ouvertes[vote_id]
+
+
+def _archives_a_compter(replique=False):
+    # Le catalogue est partage : en mode partitionne, seule la partition 0 compte les archives
+    # (le routeur additionne les reponses des partitions)
+    if PARTITION:
+        return []
+    return get_votes_archives(replique)
+
+
+def get_votes_archives(replique=False):
+    conn = connexion_lecture(replique)
+    cursor = conn.cursor()
+    cursor.execute("SELECT vote_id, chemin, sha256, nb_bulletins, nb_jetons, nb_jetons_utilises, date_archive FROM archives_votes ORDER BY vote_id")
+    rows = cursor.fetchall()
+    conn.close()
+
+    archives_votes = []
+    for row in rows:
+        archives_votes.append({
+            "vote_id": row[0],
+            "chemin": row[1],
+            "sha256": row[2],
+            "nb_bulletins": row[3],
+            "nb_jetons": row[4],
+            "nb_jetons_utilises": row[5],
+            "date_archive": row[6]
+        })
+    return archives_votes
+
+
+def _purger_par_lots(conn, table, vote_id):
+    # Petites transactions : les votes en cours ne restent pas bloques pendant la purge
+    cursor = conn.cursor()
+    while True:
+        cursor.execute(
+            "DELETE FROM " + table + " WHERE id IN (SELECT id FROM " + table + " WHERE vote_id = ? LIMIT ?)",
+            (vote_id, TAILLE_LOT_PURGE)
+        )
+        supprimes = cursor.rowcount
+        conn.commit()
+        # executescript deroule le pragma jusqu'au bout (execute ne libere qu'une page)
+        conn.executescript("PRAGMA incremental_vacuum(" + str(TAILLE_LOT_PURGE) + ")")
+        if supprimes < TAILLE_LOT_PURGE:
+            return
+
+
+def exporter_vote(vote_id):
+    vote = get_vote(vote_id)
+    if not vote:
+        return {"success": False, "error": "Vote non trouve"}
+    if vote["statut"] != "terminee":
+        return {"success": False, "error": "Seul un vote termine peut etre archive"}
+    if PARTITION is not None:
+        return {"success": False, "error": "Archivage indisponible en mode partitionne"}
+    if get_archive(vote_id) is not None:
+        return {"success": False, "error": "Vote deja archive"}
+    if not resultats_existent(vote_id):
+        return {"success": False, "error": "Decompte requis avant l'archivage"}
+    vote_id = int(vote_id)
+
+    conn = connexion_bulletins(vote_id)
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, bulletin_chiffre, jeton_hash, date_bulletin FROM bulletins WHERE vote_id = ? ORDER BY id", (vote_id,))
+    bulletins = cursor.fetchall()
+    cursor.execute("SELECT jeton_hash, utilise, date_creation FROM jetons WHERE vote_id = ? ORDER BY id", (vote_id,))
+    jetons = cursor.fetchall()
+    conn.close()
+
+    # La cle privee reste dans la table votes : l'archive ne contient que des donnees publiables
+    meta = {
+        "vote_id": vote_id,
+        "titre": vote["titre"],
+        "description": vote["description"],
+        "cle_publique_vote": vote["cle_publique_vote"],
+        "date_creation": vote["date_creation"],
+        "date_ouverture": vote["date_ouverture"],
+        "date_fermeture": vote["date_fermeture"],
+        "registre": get_racine_merkle(vote_id)
+    }
+    resultats = get_resultats(vote_id)
+
+    os.makedirs(DOSSIER_ARCHIVES, exist_ok=True)
+    chemin = chemin_archive(vote_id)
+    somme = archives.ecrire_archive(chemin + ".export", meta, resultats, bulletins, jetons)
+    lecture = archives.LectureArchive(chemin + ".export")
+    valide = lecture.verifier() and lecture.nombre_bulletins() == len(bulletins) and lecture.nombre_jetons() == len(jetons)
+    utilises = lecture.nombre_jetons_utilises()
+    lecture.fermer()
+    if not valide:
+        os.remove(chemin + ".export")
+        return {"success": False, "error": "Archive invalide apres ecriture"}
+
+    conn = sqlite3.connect(DATABASE_PATH)
+    conn.execute(
+        "INSERT OR REPLACE INTO archives_votes (vote_id, chemin, sha256, nb_bulletins, nb_jetons, nb_jetons_utilises) VALUES (?, ?, ?, ?, ?, ?)",
+        (vote_id, chemin, somme, len(bulletins), len(jetons), utilises)
+    )
+    conn.commit()
+    conn.close()
+    # A partir d'ici les lectures de ce vote passent par l'archive
+    os.replace(chemin + ".export", chemin)
+    filtre_jetons.retirer(vote_id)
+
+    conn = connexion_bulletins(vote_id)
+    _purger_par_lots(conn, "bulletins", vote_id)
+    _purger_par_lots(conn, "jetons", vote_id)
+    conn.close()
+    conn = sqlite3.connect(DATABASE_PATH)
+    _purger_par_lots(conn, "resultats", vote_id)
+    conn.close()
+    audit.enregistrer("exporter_vote", vote_id=vote_id, sha256=somme, nb_bulletins=len(bulletins))
+
+    return {
+        "success": True,
+        "vote_id": vote_id,
+        "chemin": chemin,
+        "sha256": somme,
+        "nb_bulletins": len(bulletins),
+        "nb_jetons": len(jetons),
+        "taille_octets": os.path.getsize(chemin)
+    }
+
+
+
 def generer_jeton(electeur_id, vote_id, salt):
     data = str(salt) + ":" + str(electeur_id) + ":" + str(vote_id)
     return hashlib.sha256(data.encode()).hexdigest()
@@ -284,25 +1009,86 @@ def hash_jeton(jeton):
     return hashlib.sha256(jeton.encode()).hexdigest()
 
 
-def creer_jeton(vote_id, jeton_hash):
+def get_nombre_inscrits(vote_id):
+    # Nombre maximal de jetons d'un vote : sa liste electorale, sinon tout le registre
     conn = sqlite3.connect(DATABASE_PATH)
     cursor = conn.cursor()
+    cursor.execute("SELECT nb_eligibles FROM listes_electorales WHERE vote_id = ?", (vote_id,))
+    row = cursor.fetchone()
+    if not row:
+        cursor.execute("SELECT COUNT(*) FROM electeurs")
+        row = cursor.fetchone()
+    conn.close()
+    return row[0]
+
+
+def charger_filtre_jetons(vote_id, capacite=0):
+    conn = connexion_bulletins(vote_id)
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, jeton_hash FROM jetons WHERE vote_id = ?", (vote_id,))
+    rows = cursor.fetchall()
+    
+    # Un jeton par inscrit (reparti entre les partitions) : le filtre est dimensionne des l'ouverture
+    inscrits = get_nombre_inscrits(vote_id) // NB_PARTITIONS + 1
+    filtre = filtre_jetons.FiltreJetons(max(capacite, inscrits, 2 * len(rows), 1024))
+    dernier_id = 0
+    for jeton_id, jeton_hash in rows:
+        filtre.ajouter(jeton_hash)
+        dernier_id = max(dernier_id, jeton_id)
+    filtre_jetons.installer(vote_id, filtre)
+    # Jetons crees pendant la construction : ils sont alles dans l'ancien filtre, pas dans celui-ci
+    cursor.execute("SELECT jeton_hash FROM jetons WHERE vote_id = ? AND id > ?", (vote_id, dernier_id))
+    for (jeton_hash,) in cursor.fetchall():
+        filtre.ajouter(jeton_hash)
+    conn.close()
+    return filtre
+
+
+def _agrandir_filtre(vote_id, ancien):
+    # Reconstruction hors du fil de la requete : l'ancien filtre repond jusqu'a l'echange
+    def travail():
+        if filtre_jetons.get_filtre(vote_id) is ancien:
+            charger_filtre_jetons(vote_id, 2 * ancien.nombre)
+    threading.Thread(target=travail, name="filtre-" + str(vote_id), daemon=True).start()
+
+
+def creer_jeton(vote_id, jeton_hash):
+    conn = connexion_bulletins(vote_id)
+    cursor = conn.cursor()
     try:
         cursor.execute("INSERT INTO jetons (vote_id, jeton_hash) VALUES (?, ?)", (vote_id, jeton_hash))
         conn.commit()
         conn.close()
+        filtre = filtre_jetons.get_filtre(vote_id)
+        if filtre:
+            filtre.ajouter(jeton_hash)
+            if filtre.a_agrandir():
+                _agrandir_filtre(vote_id, filtre)
         return {"success": True}
     except sqlite3.IntegrityError:
         conn.close()
         return {"success": False, "error": "Jeton deja existant"}
 
 
-def jeton_existe(jeton_hash):
-    conn = sqlite3.connect(DATABASE_PATH)
+def _chercher_jeton(conn, jeton_hash):
     cursor = conn.cursor()
     cursor.execute("SELECT id, vote_id, jeton_hash, utilise, date_creation FROM jetons WHERE jeton_hash = ?", (jeton_hash,))
     row = cursor.fetchone()
     conn.close()
+    return row
+
+
+def jeton_existe(jeton_hash, vote_id=None):
+    # Sans vote_id : un jeton ne sert qu'a voter, on ne cherche que parmi les votes ouverts
+    if vote_id is not None:
+        row = _chercher_jeton(connexion_bulletins(vote_id), jeton_hash)
+    else:
+        row = None
+        for conn in _connexions_bulletins(votes_actifs=True):
+            if row is None:
+                row = _chercher_jeton(conn, jeton_hash)
+            else:
+                conn.close()
     
     if row:
         return {
@@ -316,8 +1102,13 @@ def jeton_existe(jeton_hash):
         return None
 
 
-def marquer_jeton_utilise(jeton_hash):
-    conn = sqlite3.connect(DATABASE_PATH)
+def marquer_jeton_utilise(jeton_hash, vote_id=None):
+    if vote_id is None:
+        jeton = jeton_existe(jeton_hash)
+        if not jeton:
+            return
+        vote_id = jeton["vote_id"]
+    conn = connexion_bulletins(vote_id)
     cursor = conn.cursor()
     cursor.execute("UPDATE jetons SET utilise = 1 WHERE jeton_hash = ?", (jeton_hash,))
     conn.commit()
@@ -327,7 +1118,7 @@ def marquer_jeton_utilise(jeton_hash):
 
 def enregistrer_bulletin(vote_id, bulletin_chiffre, jeton_hash):
 
-    jeton = jeton_existe(jeton_hash)
+    jeton = jeton_existe(jeton_hash, vote_id)
     if not jeton:
         return {"success": False, "error": "Jeton invalide"}
     
@@ -335,54 +1126,326 @@ def enregistrer_bulletin(vote_id, bulletin_chiffre, jeton_hash):
     if jeton["utilise"] == 1:
         return {"success": False, "error": "Vous avez deja vote"}
     
-    conn = sqlite3.connect(DATABASE_PATH)
+    conn = connexion_bulletins(vote_id)
     cursor = conn.cursor()
     try:
     
+        # Verrou d'ecriture des le debut : la frontiere Merkle est lue puis reecrite
+        cursor.execute("BEGIN IMMEDIATE")
+        # Le jeton est revalide sous le verrou : deux depots concurrents du meme jeton
+        # passent tous deux jeton_existe, un seul trouve encore utilise = 0
+        cursor.execute("UPDATE jetons SET utilise = 1 WHERE jeton_hash = ? AND utilise = 0", (jeton_hash,))
+        if cursor.rowcount == 0:
+            conn.rollback()
+            conn.close()
+            return {"success": False, "error": "Ce jeton a deja ete utilise"}
+        recu = _ajouter_au_registre(cursor, vote_id, bulletin_chiffre)
         cursor.execute(
             "INSERT INTO bulletins (vote_id, bulletin_chiffre, jeton_hash) VALUES (?, ?, ?)",
             (vote_id, bulletin_chiffre, jeton_hash)
         )
-    
-        cursor.execute("UPDATE jetons SET utilise = 1 WHERE jeton_hash = ?", (jeton_hash,))
-        conn.commit()
         bulletin_id = cursor.lastrowid
+        conn.commit()
         conn.close()
-        return {"success": True, "bulletin_id": bulletin_id}
+        if PARTITION is not None:
+            # Chaque partition tient son propre registre : la preuve se demande a celle-ci
+            recu["partition"] = PARTITION
+        return {"success": True, "bulletin_id": bulletin_id, "recu": recu}
     except Exception as e:
         conn.close()
         return {"success": False, "error": str(e)}
 
 
-def get_bulletins_by_vote(vote_id):
-    conn = sqlite3.connect(DATABASE_PATH)
+def _tranches(valeurs, taille=500):
+    # Requetes IN (...) par tranches : reste sous la limite de parametres de SQLite
+    for debut in range(0, len(valeurs), taille):
+        yield valeurs[debut:debut + taille]
+
+
+def get_jetons(jetons_hash):
+    # Recherche ensembliste (depot groupe) : jeton_hash -> {vote_id, utilise}
+    trouves = {}
+    for conn in _connexions_bulletins(votes_actifs=True):
+        cursor = conn.cursor()
+        restants = [h for h in jetons_hash if h not in trouves]
+        for tranche in _tranches(restants):
+            cursor.execute(
+                "SELECT jeton_hash, vote_id, utilise FROM jetons WHERE jeton_hash IN (" + ",".join("?" * len(tranche)) + ")",
+                tranche
+            )
+            for row in cursor.fetchall():
+                trouves[row[0]] = {"vote_id": row[1], "utilise": row[2]}
+        conn.close()
+    return trouves
+
+
+def enregistrer_bulletins(vote_id, bulletins):
+    # Depot groupe : une transaction, frontiere Merkle lue et ecrite une seule fois.
+    # bulletins : [(bulletin_chiffre, jeton_hash)] ; un resultat par bulletin, dans l'ordre
+    conn = connexion_bulletins(vote_id)
     cursor = conn.cursor()
-    cursor.execute(
-        "SELECT id, vote_id, bulletin_chiffre, date_bulletin FROM bulletins WHERE vote_id = ? ORDER BY date_bulletin",
-        (vote_id,)
-    )
-    rows = cursor.fetchall()
+    resultats = []
+    acceptes = []
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        # Relu sous le verrou : un vote unitaire a pu utiliser un de ces jetons depuis la validation
+        disponibles = set()
+        for tranche in _tranches([h for _, h in bulletins]):
+            cursor.execute(
+                "SELECT jeton_hash FROM jetons WHERE vote_id = ? AND utilise = 0 AND jeton_hash IN (" + ",".join("?" * len(tranche)) + ")",
+                [vote_id] + tranche
+            )
+            disponibles.update(row[0] for row in cursor.fetchall())
+
+        taille, frontiere = _charger_frontiere(cursor, vote_id)
+        noeuds = {}
+        for bulletin_chiffre, jeton_hash in bulletins:
+            if jeton_hash not in disponibles:
+                resultats.append({"success": False, "error": "Ce jeton a deja ete utilise"})
+                continue
+            disponibles.discard(jeton_hash)
+            feuille = merkle.hash_feuille(_octets_bulletin(bulletin_chiffre))
+            for niveau, indice, h in merkle.ajouter_feuille(frontiere, taille, feuille):
+                noeuds[(niveau, indice)] = h
+            cursor.execute(
+                "INSERT INTO bulletins (vote_id, bulletin_chiffre, jeton_hash) VALUES (?, ?, ?)",
+                (vote_id, bulletin_chiffre, jeton_hash)
+            )
+            recu = {"vote_id": int(vote_id), "indice": taille, "feuille": feuille}
+            if PARTITION is not None:
+                recu["partition"] = PARTITION
+            resultats.append({"success": True, "bulletin_id": cursor.lastrowid, "recu": recu})
+            acceptes.append(jeton_hash)
+            taille = taille + 1
+
+        cursor.executemany(
+            "INSERT OR REPLACE INTO merkle_noeuds (vote_id, niveau, indice, hash) VALUES (?, ?, ?, ?)",
+            [(vote_id, niveau, indice, noeuds[(niveau, indice)]) for niveau, indice in noeuds]
+        )
+        cursor.execute(
+            "INSERT OR REPLACE INTO merkle_etats (vote_id, taille, frontiere) VALUES (?, ?, ?)",
+            (vote_id, taille, json.dumps(frontiere))
+        )
+        cursor.executemany("UPDATE jetons SET utilise = 1 WHERE jeton_hash = ?", [(h,) for h in acceptes])
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        conn.close()
+        return [{"success": False, "error": str(e)} for _ in bulletins]
     conn.close()
-    
-    bulletins = []
-    for row in rows:
-        bulletin = {
-            "id": row[0],
-            "vote_id": row[1],
-            "bulletin_chiffre": row[2],
-            "date_bulletin": row[3]
-        }
-        bulletins.append(bulletin)
-    return bulletins
+    return resultats
 
 
-def get_all_bulletins():
+def _octets_bulletin(bulletin_chiffre):
+    if isinstance(bulletin_chiffre, str):
+        return bulletin_chiffre.encode()
+    return bytes(bulletin_chiffre)
+
+
+def _charger_frontiere(cursor, vote_id):
+    cursor.execute("SELECT taille, frontiere FROM merkle_etats WHERE vote_id = ?", (vote_id,))
+    row = cursor.fetchone()
+    if row:
+        return row[0], json.loads(row[1])
+    
+    # Premier bulletin depuis l'activation du registre : on rejoue les bulletins existants
+    taille = 0
+    frontiere = []
+    cursor.execute("SELECT bulletin_chiffre FROM bulletins WHERE vote_id = ? ORDER BY id", (vote_id,))
+    for row in cursor.fetchall():
+        feuille = merkle.hash_feuille(_octets_bulletin(row[0]))
+        _sauver_noeuds(cursor, vote_id, merkle.ajouter_feuille(frontiere, taille, feuille))
+        taille = taille + 1
+    return taille, frontiere
+
+
+def _sauver_noeuds(cursor, vote_id, noeuds):
+    for niveau, indice, h in noeuds:
+        cursor.execute(
+            "INSERT OR REPLACE INTO merkle_noeuds (vote_id, niveau, indice, hash) VALUES (?, ?, ?, ?)",
+            (vote_id, niveau, indice, h)
+        )
+
+
+def _ajouter_au_registre(cursor, vote_id, bulletin_chiffre):
+    taille, frontiere = _charger_frontiere(cursor, vote_id)
+    feuille = merkle.hash_feuille(_octets_bulletin(bulletin_chiffre))
+    _sauver_noeuds(cursor, vote_id, merkle.ajouter_feuille(frontiere, taille, feuille))
+    cursor.execute(
+        "INSERT OR REPLACE INTO merkle_etats (vote_id, taille, frontiere) VALUES (?, ?, ?)",
+        (vote_id, taille + 1, json.dumps(frontiere))
+    )
+    return {"vote_id": int(vote_id), "indice": taille, "feuille": feuille}
+
+
+def _reconstruire_registre(cursor, vote_id):
+    cursor.execute("DELETE FROM merkle_etats WHERE vote_id = ?", (vote_id,))
+    cursor.execute("DELETE FROM merkle_noeuds WHERE vote_id = ?", (vote_id,))
+    taille, frontiere = _charger_frontiere(cursor, vote_id)
+    if taille > 0:
+        cursor.execute(
+            "INSERT INTO merkle_etats (vote_id, taille, frontiere) VALUES (?, ?, ?)",
+            (vote_id, taille, json.dumps(frontiere))
+        )
+
+
+def migrer_bulletins_binaires(taille_lot=1000):
+    # Convertit sur place les bulletins base64 (TEXT) en blocs binaires de largeur fixe
     conn = sqlite3.connect(DATABASE_PATH)
     cursor = conn.cursor()
-    cursor.execute("SELECT id, vote_id, date_bulletin FROM bulletins ORDER BY date_bulletin")
+    cursor.execute("SELECT id, cle_publique_vote FROM votes")
+    tailles = {}
+    for row in cursor.fetchall():
+        if row[1]:
+            n = int(json.loads(row[1])["n"])
+            tailles[row[0]] = (n.bit_length() + 7) // 8
+    conn.close()
+    
+    convertis = 0
+    for conn in _connexions_bulletins():
+        cursor = conn.cursor()
+        votes_touches = set()
+        dernier_id = 0
+        while True:
+            cursor.execute(
+                "SELECT id, vote_id, bulletin_chiffre FROM bulletins "
+                "WHERE id > ? AND typeof(bulletin_chiffre) = 'text' ORDER BY id LIMIT ?",
+                (dernier_id, taille_lot)
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            for bulletin_id, vote_id, bulletin_chiffre in rows:
+                dernier_id = bulletin_id
+                try:
+                    brut = base64.b64decode(bulletin_chiffre, validate=True)
+                except ValueError:
+                    continue
+                largeur = max(tailles.get(vote_id, 0), len(brut))
+                bloc = int.from_bytes(brut, 'big').to_bytes(largeur, 'big')
+                cursor.execute("UPDATE bulletins SET bulletin_chiffre = ? WHERE id = ?", (bloc, bulletin_id))
+                votes_touches.add(vote_id)
+                convertis = convertis + 1
+            conn.commit()
+        
+        # Les feuilles Merkle portent sur les octets stockes : on reconstruit les registres concernes
+        for vote_id in votes_touches:
+            _reconstruire_registre(cursor, vote_id)
+        conn.commit()
+        conn.close()
+    return convertis
+
+
+def get_racine_merkle(vote_id):
+    conn = connexion_bulletins(vote_id)
+    cursor = conn.cursor()
+    cursor.execute("SELECT taille, frontiere FROM merkle_etats WHERE vote_id = ?", (vote_id,))
+    row = cursor.fetchone()
+    conn.close()
+    
+    if row:
+        return {"vote_id": int(vote_id), "taille": row[0], "racine": merkle.racine(json.loads(row[1]))}
+    else:
+        return {"vote_id": int(vote_id), "taille": 0, "racine": merkle.racine([])}
+
+
+def get_preuve_merkle(vote_id, feuille):
+    conn = connexion_bulletins(vote_id)
+    cursor = conn.cursor()
+    cursor.execute("SELECT taille, frontiere FROM merkle_etats WHERE vote_id = ?", (vote_id,))
+    etat = cursor.fetchone()
+    cursor.execute(
+        "SELECT indice FROM merkle_noeuds WHERE vote_id = ? AND niveau = 0 AND hash = ?",
+        (vote_id, feuille)
+    )
+    row = cursor.fetchone()
+    if not etat or not row:
+        conn.close()
+        return None
+    
+    def noeud(niveau, indice):
+        cursor.execute(
+            "SELECT hash FROM merkle_noeuds WHERE vote_id = ? AND niveau = ? AND indice = ?",
+            (vote_id, niveau, indice)
+        )
+        return cursor.fetchone()[0]
+    
+    preuve = merkle.preuve_inclusion(row[0], etat[0], noeud)
+    conn.close()
+    return {
+        "vote_id": int(vote_id),
+        "indice": row[0],
+        "feuille": feuille,
+        "taille": etat[0],
+        "racine": merkle.racine(json.loads(etat[1])),
+        "preuve": preuve
+    }
+
+
+def get_bulletins_by_vote(vote_id):
+    archive = get_archive(vote_id)
+    if archive is not None:
+        bulletins = []
+        for bulletin_id, bulletin_chiffre, date_bulletin in archive.bulletins():
+            bulletins.append({
+                "id": bulletin_id,
+                "vote_id": int(vote_id),
+                "bulletin_chiffre": bytes(bulletin_chiffre),
+                "date_bulletin": date_bulletin
+            })
+        return bulletins
+    conn = connexion_bulletins(vote_id)
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT id, vote_id, bulletin_chiffre, date_bulletin FROM bulletins WHERE vote_id = ? ORDER BY date_bulletin",
+        (vote_id,)
+    )
     rows = cursor.fetchall()
     conn.close()
     
+    bulletins = []
+    for row in rows:
+        bulletin = {
+            "id": row[0],
+            "vote_id": row[1],
+            "bulletin_chiffre": row[2],
+            "date_bulletin": row[3]
+        }
+        bulletins.append(bulletin)
+    return bulletins
+
+
+def get_bulletins_depuis(vote_id, apres_id, limite):
+    archive = get_archive(vote_id)
+    if archive is not None:
+        return archive.bulletins_depuis(apres_id, limite)
+    conn = connexion_bulletins(vote_id)
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT id, bulletin_chiffre FROM bulletins WHERE vote_id = ? AND id > ? ORDER BY id LIMIT ?",
+        (vote_id, apres_id, limite)
+    )
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+
+def get_all_bulletins():
+    rows = []
+    for conn in _connexions_bulletins():
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, vote_id, date_bulletin FROM bulletins ORDER BY date_bulletin")
+        rows.extend(cursor.fetchall())
+        conn.close()
+    archives_presentes = _archives_a_compter()
+    for archive_vote in archives_presentes:
+        archive = get_archive(archive_vote["vote_id"])
+        if archive is not None:
+            for bulletin_id, bulletin_chiffre, date_bulletin in archive.bulletins():
+                rows.append((bulletin_id, archive_vote["vote_id"], date_bulletin))
+    if STOCKAGE_PAR_VOTE or archives_presentes:
+        rows.sort(key=lambda row: row[2])
+    
     bulletins = []
     for row in rows:
         bulletin = {
@@ -395,14 +1458,24 @@ def get_all_bulletins():
 
 
 def get_nombre_bulletins(vote_id=None):
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
     if vote_id:
+        archive = get_archive(vote_id)
+        if archive is not None:
+            return archive.nombre_bulletins()
+        conn = connexion_bulletins(vote_id)
+        cursor = conn.cursor()
         cursor.execute("SELECT COUNT(*) FROM bulletins WHERE vote_id = ?", (vote_id,))
-    else:
+        count = cursor.fetchone()[0]
+        conn.close()
+        return count
+    count = 0
+    for conn in _connexions_bulletins():
+        cursor = conn.cursor()
         cursor.execute("SELECT COUNT(*) FROM bulletins")
-    count = cursor.fetchone()[0]
-    conn.close()
+        count = count + cursor.fetchone()[0]
+        conn.close()
+    for archive_vote in _archives_a_compter():
+        count = count + archive_vote["nb_bulletins"]
     return count
 
 
@@ -418,13 +1491,40 @@ def creer_vote(titre, description, cle_publique="", cle_privee=""):
     conn.commit()
     vote_id = cursor.lastrowid
     conn.close()
+    creer_fragment(vote_id)
+    audit.enregistrer("creer_vote", vote_id=vote_id, titre=titre)
     return {"success": True, "id": vote_id}
 
 
+def enregistrer_cles_vote(vote_id, cle_publique, cle_privee):
+    # Une paire deja en place n'est jamais remplacee : des bulletins peuvent en dependre
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    cursor.execute(
+        "UPDATE votes SET cle_publique_vote = ?, cle_privee_vote = ? WHERE id = ? AND COALESCE(cle_publique_vote, '') = ''",
+        (cle_publique, cle_privee, vote_id)
+    )
+    modifie = cursor.rowcount
+    conn.commit()
+    conn.close()
+    if modifie:
+        audit.enregistrer("enregistrer_cles_vote", vote_id=vote_id)
+    return modifie == 1
+
+
+def get_ids_votes_actifs():
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM votes WHERE statut = 'active'")
+    rows = cursor.fetchall()
+    conn.close()
+    return [row[0] for row in rows]
+
+
 def get_vote_actif():
     conn = sqlite3.connect(DATABASE_PATH)
     cursor = conn.cursor()
-    cursor.execute("SELECT id, titre, description, salt, cle_publique_vote, cle_privee_vote, statut, date_creation FROM votes WHERE statut = 'active' ORDER BY id DESC LIMIT 1")
+    cursor.execute("SELECT id, titre, description, salt, cle_publique_vote, cle_privee_vote, statut, date_creation, date_ouverture, date_fermeture FROM votes WHERE statut = 'active' ORDER BY id DESC LIMIT 1")
     row = cursor.fetchone()
     conn.close()
     
@@ -437,16 +1537,18 @@ def get_vote_actif():
             "cle_publique_vote": row[4],
             "cle_privee_vote": row[5],
             "statut": row[6],
-            "date_creation": row[7]
+            "date_creation": row[7],
+            "date_ouverture": row[8],
+            "date_fermeture": row[9]
         }
     else:
         return None
 
 
-def get_all_votes():
-    conn = sqlite3.connect(DATABASE_PATH)
+def get_all_votes(replique=False):
+    conn = connexion_lecture(replique)
     cursor = conn.cursor()
-    cursor.execute("SELECT id, titre, description, salt, cle_publique_vote, cle_privee_vote, statut, date_creation FROM votes ORDER BY id DESC")
+    cursor.execute("SELECT id, titre, description, salt, cle_publique_vote, cle_privee_vote, statut, date_creation, date_ouverture, date_fermeture FROM votes ORDER BY id DESC")
     rows = cursor.fetchall()
     conn.close()
     
@@ -460,7 +1562,9 @@ def get_all_votes():
             "cle_publique_vote": row[4],
             "cle_privee_vote": row[5],
             "statut": row[6],
-            "date_creation": row[7]
+            "date_creation": row[7],
+            "date_ouverture": row[8],
+            "date_fermeture": row[9]
         }
         votes.append(vote)
     return votes
@@ -469,7 +1573,7 @@ def get_all_votes():
 def get_vote(vote_id):
     conn = sqlite3.connect(DATABASE_PATH)
     cursor = conn.cursor()
-    cursor.execute("SELECT id, titre, description, salt, cle_publique_vote, cle_privee_vote, statut, date_creation FROM votes WHERE id = ?", (vote_id,))
+    cursor.execute("SELECT id, titre, description, salt, cle_publique_vote, cle_privee_vote, statut, date_creation, date_ouverture, date_fermeture FROM votes WHERE id = ?", (vote_id,))
     row = cursor.fetchone()
     conn.close()
     
@@ -482,21 +1586,82 @@ def get_vote(vote_id):
             "cle_publique_vote": row[4],
             "cle_privee_vote": row[5],
             "statut": row[6],
-            "date_creation": row[7]
+            "date_creation": row[7],
+            "date_ouverture": row[8],
+            "date_fermeture": row[9]
         }
     else:
         return None
 
 
 def changer_statut_vote(vote_id, statut):
+    if statut not in TRANSITIONS:
+        return {"success": False, "error": "Statut inconnu"}
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    cursor.execute("SELECT statut, cle_publique_vote FROM votes WHERE id = ?", (vote_id,))
+    row = cursor.fetchone()
+    if not row:
+        conn.close()
+        return {"success": False, "error": "Vote non trouve"}
+    if statut == "active" and not row[1]:
+        # Cles generees par la tache generer_cles lancee a la creation du vote
+        conn.close()
+        return {"success": False, "error": "Cles du vote en cours de generation"}
+    if statut not in TRANSITIONS.get(row[0], ()):
+        conn.close()
+        audit.enregistrer("changer_statut_vote", vote_id=vote_id, ancien=row[0], statut=statut, succes=False)
+        return {"success": False, "error": "Transition invalide : " + str(row[0]) + " -> " + statut}
+    
+    if statut == "active":
+        # Fichier du vote pret avant le premier jeton
+        creer_fragment(vote_id)
+    # Mise a jour conditionnelle : un changement concurrent (minuterie, admin) ne passe qu'une fois
+    cursor.execute("UPDATE votes SET statut = ? WHERE id = ? AND statut = ?", (statut, vote_id, row[0]))
+    modifie = cursor.rowcount
+    conn.commit()
+    conn.close()
+    audit.enregistrer("changer_statut_vote", vote_id=vote_id, ancien=row[0], statut=statut, succes=modifie == 1)
+    if modifie == 0:
+        return {"success": False, "error": "Statut modifie entre-temps"}
+    return {"success": True}
+
+
+def planifier_vote(vote_id, date_ouverture, date_fermeture):
     conn = sqlite3.connect(DATABASE_PATH)
     cursor = conn.cursor()
-    cursor.execute("UPDATE votes SET statut = ? WHERE id = ?", (statut, vote_id))
+    cursor.execute(
+        "UPDATE votes SET date_ouverture = ?, date_fermeture = ? WHERE id = ?",
+        (date_ouverture, date_fermeture, vote_id)
+    )
     conn.commit()
     conn.close()
+    audit.enregistrer("planifier_vote", vote_id=vote_id, date_ouverture=date_ouverture, date_fermeture=date_fermeture)
     return {"success": True}
 
 
+def get_votes_planifies():
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT id, statut, date_ouverture, date_fermeture FROM votes 
+        WHERE (statut = 'en_attente' AND date_ouverture IS NOT NULL) 
+           OR (statut IN ('en_attente', 'active') AND date_fermeture IS NOT NULL)
+    """)
+    rows = cursor.fetchall()
+    conn.close()
+    
+    votes = []
+    for row in rows:
+        votes.append({
+            "id": row[0],
+            "statut": row[1],
+            "date_ouverture": row[2],
+            "date_fermeture": row[3]
+        })
+    return votes
+
+
 
 def authentifier_admin(username, mot_de_passe):
     conn = sqlite3.connect(DATABASE_PATH)
@@ -520,6 +1685,29 @@ def authentifier_admin(username, mot_de_passe):
 
 
 
+def get_cle_signature():
+    # Plusieurs processus peuvent creer une cle en meme temps : tous retiennent la plus ancienne
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, cle_publique, cle_privee FROM cles_signature ORDER BY id LIMIT 1")
+    row = cursor.fetchone()
+    conn.close()
+    
+    if row:
+        return {"id": row[0], "cle_publique": row[1], "cle_privee": row[2]}
+    else:
+        return None
+
+
+def enregistrer_cle_signature(cle_publique, cle_privee):
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO cles_signature (cle_publique, cle_privee) VALUES (?, ?)", (cle_publique, cle_privee))
+    conn.commit()
+    conn.close()
+    return get_cle_signature()
+
+
 def enregistrer_resultat(vote_id, option_id, nombre_bulletins):
     conn = sqlite3.connect(DATABASE_PATH)
     cursor = conn.cursor()
@@ -531,7 +1719,107 @@ def enregistrer_resultat(vote_id, option_id, nombre_bulletins):
     conn.close()
 
 
+def _connexion_decompte():
+    return sqlite3.connect(CHEMIN_PARTITION or DATABASE_PATH, timeout=10)
+
+
+def get_point_decompte(vote_id):
+    conn = _connexion_decompte()
+    cursor = conn.cursor()
+    cursor.execute("SELECT dernier_bulletin_id, total, invalides, date_maj FROM decomptes_en_cours WHERE vote_id = ?", (vote_id,))
+    row = cursor.fetchone()
+    conn.close()
+    
+    if row:
+        return {"dernier_bulletin_id": row[0], "total": row[1], "invalides": row[2], "date_maj": row[3]}
+    else:
+        return {"dernier_bulletin_id": 0, "total": 0, "invalides": 0, "date_maj": None}
+
+
+def sauver_point_decompte(vote_id, ancien_id, nouveau_id, comptes, invalides):
+    # Applique un lot de comptes partiels ; echoue si un autre decompte a avance entre-temps
+    conn = _connexion_decompte()
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    cursor.execute("SELECT dernier_bulletin_id FROM decomptes_en_cours WHERE vote_id = ?", (vote_id,))
+    row = cursor.fetchone()
+    courant = row[0] if row else 0
+    if courant != ancien_id:
+        conn.rollback()
+        conn.close()
+        return False
+    
+    total = 0
+    for option_id in comptes:
+        total = total + comptes[option_id]
+        cursor.execute(
+            "INSERT INTO decomptes_partiels (vote_id, option_id, nombre) VALUES (?, ?, ?) "
+            "ON CONFLICT (vote_id, option_id) DO UPDATE SET nombre = nombre + excluded.nombre",
+            (vote_id, option_id, comptes[option_id])
+        )
+    cursor.execute(
+        "INSERT INTO decomptes_en_cours (vote_id, dernier_bulletin_id, total, invalides) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (vote_id) DO UPDATE SET dernier_bulletin_id = excluded.dernier_bulletin_id, "
+        "total = total + excluded.total, invalides = invalides + excluded.invalides, date_maj = CURRENT_TIMESTAMP",
+        (vote_id, nouveau_id, total, invalides)
+    )
+    conn.commit()
+    conn.close()
+    return True
+
+
+def get_decompte_partiel(vote_id):
+    conn = _connexion_decompte()
+    cursor = conn.cursor()
+    cursor.execute("SELECT vote_id, option_id, nombre FROM decomptes_partiels WHERE vote_id = ? ORDER BY nombre DESC", (vote_id,))
+    rows = cursor.fetchall()
+    conn.close()
+    
+    # Les libelles sont lus a part : en mode partitionne, options est dans la base principale
+    libelles = {}
+    for option in get_options_by_vote(vote_id):
+        libelles[option["id"]] = option["libelle"]
+    
+    resultats = []
+    for row in rows:
+        if row[1] not in libelles:
+            continue
+        resultat = {
+            "vote_id": row[0],
+            "option_id": row[1],
+            "nombre_bulletins": row[2],
+            "libelle": libelles[row[1]]
+        }
+        resultats.append(resultat)
+    return resultats
+
+
+def publier_resultats(vote_id, comptes=None):
+    # Remplace les resultats du vote par les comptes partiels en une seule transaction.
+    # comptes ({option_id: nombre}) : comptes fusionnes des partitions par le coordinateur
+    conn = sqlite3.connect(DATABASE_PATH, timeout=10)
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    cursor.execute("DELETE FROM resultats WHERE vote_id = ?", (vote_id,))
+    if comptes is None:
+        cursor.execute(
+            "INSERT INTO resultats (vote_id, option_id, nombre_bulletins) "
+            "SELECT vote_id, option_id, nombre FROM decomptes_partiels WHERE vote_id = ?",
+            (vote_id,)
+        )
+    else:
+        for option_id in comptes:
+            cursor.execute(
+                "INSERT INTO resultats (vote_id, option_id, nombre_bulletins) VALUES (?, ?, ?)",
+                (vote_id, option_id, comptes[option_id])
+            )
+    conn.commit()
+    conn.close()
+
+
 def resultats_existent(vote_id):
+    if get_archive(vote_id) is not None:
+        return True
     conn = sqlite3.connect(DATABASE_PATH)
     cursor = conn.cursor()
     cursor.execute("SELECT COUNT(*) FROM resultats WHERE vote_id = ?", (vote_id,))
@@ -549,8 +1837,12 @@ def vote_en_cours_ou_termine():
     return row is not None
 
 
-def get_resultats(vote_id=None):
-    conn = sqlite3.connect(DATABASE_PATH)
+def get_resultats(vote_id=None, replique=False):
+    if vote_id:
+        archive = get_archive(vote_id)
+        if archive is not None:
+            return archive.resultats()
+    conn = connexion_lecture(replique)
     cursor = conn.cursor()
     
     if vote_id:
@@ -583,42 +1875,260 @@ def get_resultats(vote_id=None):
             "libelle": row[5]
         }
         resultats.append(resultat)
+    if not vote_id:
+        for archive_vote in get_votes_archives(replique):
+            archive = get_archive(archive_vote["vote_id"])
+            if archive is not None:
+                resultats.extend(archive.resultats())
+        resultats.sort(key=lambda r: r["nombre_bulletins"], reverse=True)
     return resultats
 
 
-def get_statistiques():
+def get_ids_electeurs():
     conn = sqlite3.connect(DATABASE_PATH)
     cursor = conn.cursor()
-    
+    cursor.execute("SELECT id FROM electeurs")
+    ids = [row[0] for row in cursor.fetchall()]
+    conn.close()
+    return ids
+
 
+def get_nombre_electeurs():
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
     cursor.execute("SELECT COUNT(*) FROM electeurs")
-    total_electeurs = cursor.fetchone()[0]
-    
+    nombre = cursor.fetchone()[0]
+    conn.close()
+    return nombre
+
+
+def enregistrer_liste_electorale(vote_id, eligibles, nb_eligibles, segments):
+    # Remplace la liste du vote et ses segments ; segments : [(nom, membres, nb_membres)]
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM segments_electoraux WHERE vote_id = ?", (vote_id,))
+    cursor.execute(
+        "INSERT OR REPLACE INTO listes_electorales (vote_id, eligibles, nb_eligibles) VALUES (?, ?, ?)",
+        (vote_id, eligibles, nb_eligibles)
+    )
+    cursor.executemany(
+        "INSERT INTO segments_electoraux (vote_id, nom, membres, nb_membres) VALUES (?, ?, ?, ?)",
+        [(vote_id, nom, membres, nombre) for nom, membres, nombre in segments]
+    )
+    conn.commit()
+    conn.close()
+    audit.enregistrer("liste_electorale", vote_id=vote_id, nb_eligibles=nb_eligibles, segments=[nom for nom, _, _ in segments])
+
+
+def supprimer_liste_electorale(vote_id):
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM segments_electoraux WHERE vote_id = ?", (vote_id,))
+    cursor.execute("DELETE FROM listes_electorales WHERE vote_id = ?", (vote_id,))
+    supprimee = cursor.rowcount == 1
+    conn.commit()
+    conn.close()
+    audit.enregistrer("liste_electorale", vote_id=vote_id, supprimee=supprimee)
+    return supprimee
+
+
+def get_liste_electorale(vote_id):
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    cursor.execute("SELECT eligibles, nb_eligibles, date_maj FROM listes_electorales WHERE vote_id = ?", (vote_id,))
+    row = cursor.fetchone()
+    if not row:
+        conn.close()
+        return None
+    cursor.execute("SELECT nom, membres FROM segments_electoraux WHERE vote_id = ? ORDER BY nom", (vote_id,))
+    segments = cursor.fetchall()
+    conn.close()
+    return {"eligibles": row[0], "nb_eligibles": row[1], "date_maj": row[2], "segments": segments}
+
+
+def enregistrer_retrait(vote_id, electeur_id):
+    conn = connexion_bulletins(vote_id)
+    conn.execute("INSERT OR IGNORE INTO jetons_retires (vote_id, electeur_id) VALUES (?, ?)", (vote_id, electeur_id))
+    conn.commit()
+    conn.close()
+
+
+def get_retraits(vote_id):
+    # En mode partitionne, seuls les retraits de la partition : le routeur additionne les partitions
+    conn = connexion_bulletins(vote_id)
+    cursor = conn.cursor()
+    cursor.execute("SELECT electeur_id FROM jetons_retires WHERE vote_id = ?", (vote_id,))
+    ids = [row[0] for row in cursor.fetchall()]
+    conn.close()
+    return ids
+
+
+COLONNES_TACHE = "id, cle, type, parametres, statut, progression, resultat, erreur, date_creation, date_debut, date_fin"
+
+
+def _ligne_tache(row):
+    return {
+        "id": row[0],
+        "cle": row[1],
+        "type": row[2],
+        "parametres": json.loads(row[3]),
+        "statut": row[4],
+        "progression": row[5],
+        "resultat": json.loads(row[6]) if row[6] else None,
+        "erreur": row[7],
+        "date_creation": row[8],
+        "date_debut": row[9],
+        "date_fin": row[10]
+    }
+
+
+def creer_tache(type_tache, parametres, cle=None):
+    # Cle d'idempotence deja connue : on renvoie la tache existante au lieu d'en creer une
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "INSERT INTO taches (cle, type, parametres) VALUES (?, ?, ?)",
+            (cle, type_tache, json.dumps(parametres))
+        )
+        conn.commit()
+        tache_id = cursor.lastrowid
+        creee = True
+    except sqlite3.IntegrityError:
+        cursor.execute("SELECT id FROM taches WHERE cle = ?", (cle,))
+        tache_id = cursor.fetchone()[0]
+        creee = False
+    conn.close()
+    return tache_id, creee
+
+
+def get_tache(tache_id):
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    cursor.execute("SELECT " + COLONNES_TACHE + " FROM taches WHERE id = ?", (tache_id,))
+    row = cursor.fetchone()
+    conn.close()
+    return _ligne_tache(row) if row else None
+
+
+def get_taches(limite=50):
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    cursor.execute("SELECT " + COLONNES_TACHE + " FROM taches ORDER BY id DESC LIMIT ?", (limite,))
+    rows = cursor.fetchall()
+    conn.close()
+    return [_ligne_tache(row) for row in rows]
+
+
+def get_taches_interrompues():
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, type FROM taches WHERE statut IN ('en_attente', 'en_cours') ORDER BY id")
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+
+def relancer_tache(tache_id):
+    # Seule une tache echouee repart : une tache en cours ou terminee n'est jamais rejouee
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    cursor.execute(
+        "UPDATE taches SET statut = 'en_attente', progression = 0, resultat = NULL, erreur = NULL, "
+        "date_debut = NULL, date_fin = NULL WHERE id = ? AND statut = 'echouee'",
+        (tache_id,)
+    )
+    relancee = cursor.rowcount == 1
+    conn.commit()
+    conn.close()
+    return relancee
+
 
-    cursor.execute("SELECT COUNT(*) FROM jetons")
-    jetons_distribues = cursor.fetchone()[0]
+def demarrer_tache(tache_id):
+    conn = sqlite3.connect(DATABASE_PATH)
+    conn.execute("UPDATE taches SET statut = 'en_cours', date_debut = CURRENT_TIMESTAMP WHERE id = ?", (tache_id,))
+    conn.commit()
+    conn.close()
+
+
+def progresser_tache(tache_id, progression):
+    conn = sqlite3.connect(DATABASE_PATH)
+    conn.execute("UPDATE taches SET progression = ? WHERE id = ?", (progression, tache_id))
+    conn.commit()
+    conn.close()
+
+
+def terminer_tache(tache_id, statut, resultat=None, erreur=None):
+    conn = sqlite3.connect(DATABASE_PATH)
+    conn.execute(
+        "UPDATE taches SET statut = ?, progression = COALESCE(?, progression), resultat = ?, erreur = ?, date_fin = CURRENT_TIMESTAMP WHERE id = ?",
+        (statut, 1 if statut == "terminee" else None, json.dumps(resultat) if resultat is not None else None, erreur, tache_id)
+    )
+    conn.commit()
+    conn.close()
+
+
+def get_statistiques(replique=False):
+    conn = connexion_lecture(replique)
+    cursor = conn.cursor()
     
 
-    cursor.execute("SELECT COUNT(*) FROM jetons WHERE utilise = 1")
-    jetons_utilises = cursor.fetchone()[0]
+    cursor.execute("SELECT COUNT(*) FROM electeurs")
+    total_electeurs = cursor.fetchone()[0]
     
 
     cursor.execute("SELECT COUNT(*) FROM options")
     total_options = cursor.fetchone()[0]
     
 
-    cursor.execute("SELECT COUNT(*) FROM bulletins")
-    total_bulletins = cursor.fetchone()[0]
-    
-
     cursor.execute("SELECT COUNT(*) FROM votes")
     total_votes = cursor.fetchone()[0]
     
+
+    # Inscrits de chaque vote ouvert ou termine : sa liste electorale, sinon tous les electeurs
+    cursor.execute("""
+        SELECT v.id, l.nb_eligibles FROM votes v LEFT JOIN listes_electorales l ON l.vote_id = v.id
+        WHERE v.statut IN ('active', 'terminee')
+    """)
+    inscrits_par_vote = {}
+    for row in cursor.fetchall():
+        inscrits_par_vote[row[0]] = row[1] if row[1] is not None else total_electeurs
+    
     conn.close()
     
 
-    if total_electeurs > 0:
-        taux_participation = round((jetons_utilises / total_electeurs) * 100, 2)
+    jetons_distribues = 0
+    jetons_utilises = 0
+    total_bulletins = 0
+    utilises_par_vote = {}
+    # Sur la replique, les parcours des jetons et bulletins la lisent aussi : l'age annonce vaut pour tout
+    if replique and REPLIQUE_PATH and bulletins_en_base_principale():
+        connexions = [connexion_lecture(True)]
+    else:
+        connexions = _connexions_bulletins()
+    for conn in connexions:
+        cursor = conn.cursor()
+        cursor.execute("SELECT vote_id, COUNT(*), COALESCE(SUM(utilise), 0) FROM jetons GROUP BY vote_id")
+        for row in cursor.fetchall():
+            jetons_distribues = jetons_distribues + row[1]
+            jetons_utilises = jetons_utilises + row[2]
+            utilises_par_vote[row[0]] = utilises_par_vote.get(row[0], 0) + row[2]
+        cursor.execute("SELECT COUNT(*) FROM bulletins")
+        total_bulletins = total_bulletins + cursor.fetchone()[0]
+        conn.close()
+    for archive_vote in _archives_a_compter(replique):
+        jetons_distribues = jetons_distribues + archive_vote["nb_jetons"]
+        jetons_utilises = jetons_utilises + archive_vote["nb_jetons_utilises"]
+        total_bulletins = total_bulletins + archive_vote["nb_bulletins"]
+        utilises_par_vote[archive_vote["vote_id"]] = utilises_par_vote.get(archive_vote["vote_id"], 0) + archive_vote["nb_jetons_utilises"]
+    
+
+    # Participation : bulletins deposes sur inscrits, cumules sur les votes ouverts ou termines
+    # (un electeur compte une fois par vote auquel il est inscrit)
+    total_inscrits = sum(inscrits_par_vote.values())
+    votants = sum(utilises_par_vote.get(vote_id, 0) for vote_id in inscrits_par_vote)
+    if total_inscrits > 0:
+        taux_participation = round((votants / total_inscrits) * 100, 2)
     else:
         taux_participation = 0
     
@@ -629,6 +2139,8 @@ def get_statistiques():
         "total_options": total_options,
         "total_bulletins": total_bulletins,
         "total_votes": total_votes,
+        "total_inscrits": total_inscrits,
+        "votants": votants,
         "taux_participation": taux_participation
     }
 
@@ -0,0 +1,93 @@
+import threading
+import time
+import audit
+import database as db
+import reponses
+import rsa as crypto
+
+TAILLE_LOT = 500
+
+_verrous = {}
+_verrou_global = threading.Lock()
+
+
+def _verrou_vote(vote_id):
+    with _verrou_global:
+        if vote_id not in _verrous:
+            _verrous[vote_id] = threading.Lock()
+        return _verrous[vote_id]
+
+
+def _avancer(vote_id, cle_priv, progression=None):
+    # Traite les bulletins non encore comptes, lot par lot, avec un point de reprise par lot
+    point = db.get_point_decompte(vote_id)
+    dernier_id = point["dernier_bulletin_id"]
+    traites = point["total"] + point["invalides"]
+    while True:
+        lot = db.get_bulletins_depuis(vote_id, dernier_id, TAILLE_LOT)
+        if not lot:
+            return
+
+        comptes = {}
+        invalides = 0
+        for bulletin_id, bulletin_chiffre in lot:
+            try:
+                resultat = crypto.dechiffrer_vote(bulletin_chiffre, cle_priv)
+                option_id = resultat["candidat_id"]
+                comptes[option_id] = comptes.get(option_id, 0) + 1
+            except Exception:
+                invalides = invalides + 1
+
+        nouveau_id = lot[-1][0]
+        if not db.sauver_point_decompte(vote_id, dernier_id, nouveau_id, comptes, invalides):
+            # Un autre processus a avance le point de reprise : on repart de son etat
+            nouveau_id = db.get_point_decompte(vote_id)["dernier_bulletin_id"]
+        dernier_id = nouveau_id
+        traites = traites + len(lot)
+        if progression:
+            progression(traites)
+
+
+def executer_decompte(vote, progression=None):
+    # progression(n) : appelee apres chaque lot avec le nombre de bulletins deja traites
+    debut = time.perf_counter()
+    try:
+        resultat = _executer(vote, progression)
+    except Exception as e:
+        audit.enregistrer("decompte", vote_id=vote["id"], succes=False, erreur=str(e))
+        raise
+    audit.enregistrer(
+        "decompte", vote_id=vote["id"], succes=True,
+        provisoire=resultat.get("provisoire", False), deja_calcule=resultat.get("deja_calcule", False),
+        total_bulletins=resultat.get("total_bulletins"), duree_ms=round((time.perf_counter() - debut) * 1000, 1)
+    )
+    return resultat
+
+
+def _executer(vote, progression=None):
+    # Vote actif : decompte provisoire. Sinon : decompte final publie atomiquement.
+    vote_id = int(vote["id"])
+
+    if db.resultats_existent(vote_id):
+        return {"success": True, "resultats": db.get_resultats(vote_id), "deja_calcule": True}
+
+    cle_priv = crypto.json_vers_cle_privee(vote["cle_privee_vote"])
+    with _verrou_vote(vote_id):
+        _avancer(vote_id, cle_priv, progression)
+        point = db.get_point_decompte(vote_id)
+
+        # En mode partitionne, seul le coordinateur (routeur.py) fusionne et publie
+        if vote["statut"] == "active" or db.PARTITION is not None:
+            return {
+                "success": True,
+                "provisoire": vote["statut"] == "active",
+                "partition": db.PARTITION,
+                "resultats": db.get_decompte_partiel(vote_id),
+                "total_bulletins": point["total"],
+                "invalides": point["invalides"],
+                "dernier_bulletin_id": point["dernier_bulletin_id"]
+            }
+
+        db.publier_resultats(vote_id)
+        reponses.publier_resultats(vote_id)
+        return {"success": True, "resultats": db.get_resultats(vote_id), "total_bulletins": point["total"]}
@@ -0,0 +1,196 @@
+# filtre_jetons.py
+# Pre-filtre en memoire des jetons d'un vote : filtre coucou (empreintes 32 bits).
+# Seul INCONNU est une reponse sure et evite la base. L'etat "utilise" n'est pas garde ici :
+# deux jetons de meme empreinte et memes casiers partagent une case, un bit par case ne
+# pourrait donc pas refuser un jeton sans confirmation en base.
+
+import threading
+from array import array
+
+TAILLE_CASIER = 4
+MAX_DEPLACEMENTS = 500
+# Au-dela de ce remplissage, le filtre est reconstruit deux fois plus grand (voir database.py)
+TAUX_AGRANDISSEMENT = 0.85
+
+INCONNU = "inconnu"
+PEUT_ETRE = "peut_etre"
+
+
+def _empreinte_et_index(jeton_hash):
+    # jeton_hash est deja un SHA-256 : on decoupe ses octets au lieu de re-hacher
+    brut = bytes.fromhex(jeton_hash)
+    empreinte = int.from_bytes(brut[0:4], "big") or 1
+    index = int.from_bytes(brut[4:12], "big")
+    return empreinte, index
+
+
+def _melange(empreinte):
+    return (empreinte * 0x5BD1E995) & 0xFFFFFFFF
+
+
+class FiltreJetons:
+
+    def __init__(self, capacite):
+        nb_casiers = 1
+        while nb_casiers * TAILLE_CASIER * 0.9 < capacite:
+            nb_casiers = nb_casiers * 2
+        self.masque = nb_casiers - 1
+        self.cases = array("I", bytes(4 * nb_casiers * TAILLE_CASIER))
+        self.nombre = 0
+        self.fiable = True
+        self.agrandissement = False
+        self.consultations = 0
+        self.passages_base = 0
+        self.faux_positifs = 0
+        self.verrou = threading.Lock()
+
+    def _casiers(self, empreinte, index):
+        i1 = index & self.masque
+        i2 = (i1 ^ _melange(empreinte)) & self.masque
+        return i1, i2
+
+    def _chercher(self, empreinte, index):
+        for casier in self._casiers(empreinte, index):
+            debut = casier * TAILLE_CASIER
+            for case in range(debut, debut + TAILLE_CASIER):
+                if self.cases[case] == empreinte:
+                    return case
+        return -1
+
+    def _placer(self, casier, empreinte):
+        debut = casier * TAILLE_CASIER
+        for case in range(debut, debut + TAILLE_CASIER):
+            if self.cases[case] == 0:
+                self.cases[case] = empreinte
+                return True
+        return False
+
+    def ajouter(self, jeton_hash):
+        empreinte, index = _empreinte_et_index(jeton_hash)
+        with self.verrou:
+            if self._chercher(empreinte, index) >= 0:
+                return
+            i1, i2 = self._casiers(empreinte, index)
+            if self._placer(i1, empreinte) or self._placer(i2, empreinte):
+                self.nombre = self.nombre + 1
+                return
+            casier = i2
+            for n in range(MAX_DEPLACEMENTS):
+                case = casier * TAILLE_CASIER + n % TAILLE_CASIER
+                empreinte, self.cases[case] = self.cases[case], empreinte
+                casier = (casier ^ _melange(empreinte)) & self.masque
+                if self._placer(casier, empreinte):
+                    self.nombre = self.nombre + 1
+                    return
+            # Filtre sature : une empreinte a ete perdue, on ne peut plus conclure "inconnu"
+            if self.fiable:
+                print("Filtre de jetons sature (" + str(self.nombre) + " jetons) : passage par la base jusqu'a sa reconstruction")
+            self.fiable = False
+
+    def remplissage(self):
+        return self.nombre / len(self.cases)
+
+    def a_agrandir(self):
+        # Vrai une seule fois, quand le filtre approche de la saturation ou l'a atteinte
+        with self.verrou:
+            if self.agrandissement:
+                return False
+            if self.fiable and self.remplissage() < TAUX_AGRANDISSEMENT:
+                return False
+            self.agrandissement = True
+            return True
+
+    def consulter(self, jeton_hash):
+        empreinte, index = _empreinte_et_index(jeton_hash)
+        with self.verrou:
+            self.consultations = self.consultations + 1
+            if self._chercher(empreinte, index) < 0 and self.fiable:
+                return INCONNU
+            self.passages_base = self.passages_base + 1
+            return PEUT_ETRE
+
+    def signaler_absent(self, jeton_hash):
+        # Appele quand la base ne connait pas un jeton : compte les faux positifs observes
+        empreinte, index = _empreinte_et_index(jeton_hash)
+        with self.verrou:
+            if self._chercher(empreinte, index) >= 0:
+                self.faux_positifs = self.faux_positifs + 1
+
+    def memoire(self):
+        return self.cases.itemsize * len(self.cases)
+
+    def statistiques(self):
+        octets = self.memoire()
+        # Memoire pour un million de jetons au taux de remplissage nominal (90 %)
+        par_million = round(octets * 1000000 / (len(self.cases) * 0.9))
+        # Une cle absente compare son empreinte a 2 casiers de TAILLE_CASIER cases
+        theorique = 2 * TAILLE_CASIER / 2 ** 32
+        observe = self.faux_positifs / self.consultations if self.consultations else 0
+        alerte = None
+        if not self.fiable:
+            alerte = "Filtre sature : tous les jetons sont verifies en base"
+        elif self.remplissage() >= TAUX_AGRANDISSEMENT:
+            alerte = "Filtre presque plein : reconstruction en cours"
+        return {
+            "jetons": self.nombre,
+            "capacite": len(self.cases),
+            "taux_remplissage": round(self.remplissage(), 4),
+            "octets": octets,
+            "octets_par_million": par_million,
+            "taux_faux_positifs_theorique": theorique,
+            "taux_faux_positifs_observe": observe,
+            "consultations": self.consultations,
+            "passages_base": self.passages_base,
+            "fiable": self.fiable,
+            "alerte": alerte
+        }
+
+
+_filtres = {}
+_verrou_registre = threading.Lock()
+
+
+def installer(vote_id, filtre):
+    with _verrou_registre:
+        _filtres[int(vote_id)] = filtre
+
+
+def retirer(vote_id):
+    with _verrou_registre:
+        _filtres.pop(int(vote_id), None)
+
+
+def get_filtre(vote_id):
+    return _filtres.get(int(vote_id))
+
+
+def consulter(jeton_hash, vote_id=None, votes_actifs=()):
+    # Sans vote_id, un jeton n'est rejete que si chaque vote ouvert (votes_actifs, lus en base
+    # par l'appelant) a son filtre charge et qu'aucun ne le connait : un vote dont le filtre
+    # n'est pas encore construit dans ce processus peut detenir le jeton
+    if vote_id is not None:
+        votes_actifs = (vote_id,)
+    if not votes_actifs:
+        return PEUT_ETRE
+    for vote_actif in votes_actifs:
+        filtre = get_filtre(vote_actif)
+        if filtre is None or filtre.consulter(jeton_hash) != INCONNU:
+            return PEUT_ETRE
+    return INCONNU
+
+
+def signaler_absent(jeton_hash, vote_id=None):
+    if vote_id is not None:
+        filtres = [get_filtre(vote_id)]
+    else:
+        filtres = list(_filtres.values())
+    for filtre in filtres:
+        if filtre is not None:
+            filtre.signaler_absent(jeton_hash)
+
+
+def statistiques():
+    stats = {}
+    for vote_id in list(_filtres):
+        stats[vote_id] = _filtres[vote_id].statistiques()
+    return stats
@@ -0,0 +1,89 @@
+import threading
+import time
+
+# (capacite du seau, jetons recharges par seconde) par classe de route
+LIMITES = {
+    "auth": (5, 0.5),
+    "vote": (10, 2.0),
+    "admin": (30, 10.0),
+    "lecture": (60, 30.0),
+}
+
+# Nombre maximal de requetes traitees en parallele par classe de route
+CONCURRENCE_MAX = {
+    "auth": 4,
+    "vote": 32,
+    "admin": 4,
+    "lecture": 16,
+}
+
+MAX_SEAUX = 100000
+
+ROUTES_AUTH = ("/api/auth/electeur", "/api/auth/admin")
+ROUTES_VOTE = ("/api/jeton", "/api/voter", "/api/voter/batch")
+ROUTES_ADMIN = ("/api/votes", "/api/votes/statut", "/api/votes/planifier", "/api/options", "/api/options/supprimer", "/api/options/photo",
+                "/api/votes/detacher", "/api/votes/exporter", "/api/votes/liste", "/api/decompte", "/api/partition/synchroniser",
+                "/api/jobs")
+
+_seaux = {}
+_verrou = threading.Lock()
+_semaphores = {}
+for _classe in CONCURRENCE_MAX:
+    _semaphores[_classe] = threading.BoundedSemaphore(CONCURRENCE_MAX[_classe])
+
+
+def classe_route(methode, path):
+    if path in ROUTES_AUTH:
+        return "auth"
+    if path in ROUTES_VOTE:
+        return "vote"
+    if methode == "POST" and path in ROUTES_ADMIN:
+        return "admin"
+    if path in ("/api/generer-cles", "/api/audit/verifier"):
+        return "admin"
+    return "lecture"
+
+
+def _purger_seaux(maintenant):
+    # Un seau plein et inactif equivaut a un seau absent : on peut l'oublier
+    a_supprimer = []
+    for cle in _seaux:
+        jetons, dernier = _seaux[cle]
+        capacite, debit = LIMITES[cle[1]]
+        if jetons + (maintenant - dernier) * debit >= capacite:
+            a_supprimer.append(cle)
+    for cle in a_supprimer:
+        del _seaux[cle]
+
+
+def consommer(client, classe):
+    # Retourne 0 si la requete est admise, sinon le nombre de secondes a attendre
+    capacite, debit = LIMITES[classe]
+    cle = (client, classe)
+    maintenant = time.monotonic()
+    with _verrou:
+        if cle in _seaux:
+            jetons, dernier = _seaux[cle]
+            jetons = min(capacite, jetons + (maintenant - dernier) * debit)
+        else:
+            if len(_seaux) >= MAX_SEAUX:
+                _purger_seaux(maintenant)
+            jetons = capacite
+        if jetons >= 1:
+            _seaux[cle] = (jetons - 1, maintenant)
+            return 0
+        _seaux[cle] = (jetons, maintenant)
+        return (1 - jetons) / debit
+
+
+def entrer(classe):
+    return _semaphores[classe].acquire(blocking=False)
+
+
+def sortir(classe):
+    _semaphores[classe].release()
+
+
+def reinitialiser():
+    with _verrou:
+        _seaux.clear()
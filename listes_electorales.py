@@ -0,0 +1,143 @@
+# listes_electorales.py
+# Listes electorales par vote, gardees en memoire sous forme de bitmaps compresses sur
+# electeurs.id. L'eligibilite se verifie en temps constant dans /api/jeton ; la participation
+# par segment (bureau, circonscription...) se calcule par intersection de bitmaps.
+# Un vote sans liste reste ouvert a tous les electeurs inscrits.
+
+import threading
+import bitmaps
+import database as db
+
+_listes = {}
+_verrou = threading.Lock()
+
+
+def _charger(vote_id):
+    entree = {"eligibles": None, "segments": {}, "retraits": bitmaps.Bitmap.depuis_ids(db.get_retraits(vote_id))}
+    donnees = db.get_liste_electorale(vote_id)
+    if donnees:
+        entree["eligibles"] = bitmaps.Bitmap.charger(donnees["eligibles"])
+        for nom, membres in donnees["segments"]:
+            entree["segments"][nom] = bitmaps.Bitmap.charger(membres)
+    return entree
+
+
+def get_liste(vote_id):
+    vote_id = int(vote_id)
+    entree = _listes.get(vote_id)
+    if entree is None:
+        with _verrou:
+            entree = _listes.get(vote_id)
+            if entree is None:
+                entree = _charger(vote_id)
+                _listes[vote_id] = entree
+    return entree
+
+
+def invalider(vote_id=None):
+    with _verrou:
+        if vote_id is None:
+            _listes.clear()
+        else:
+            _listes.pop(int(vote_id), None)
+
+
+def est_eligible(vote_id, electeur_id):
+    eligibles = get_liste(vote_id)["eligibles"]
+    return eligibles is None or int(electeur_id) in eligibles
+
+
+def marquer_retrait(vote_id, electeur_id):
+    retraits = get_liste(vote_id)["retraits"]
+    with _verrou:
+        nouveau = retraits.ajouter(int(electeur_id))
+    if nouveau:
+        db.enregistrer_retrait(int(vote_id), int(electeur_id))
+
+
+def charger(vote_id, electeurs, segments=None):
+    # Chargement en bloc ; les id inconnus du registre sont ecartes par intersection
+    segments = segments or {}
+    inscrits = bitmaps.Bitmap.depuis_ids(db.get_ids_electeurs())
+    demandes = bitmaps.Bitmap.depuis_ids(electeurs)
+    eligibles = demandes.intersection(inscrits)
+    lignes = []
+    tailles = {}
+    for nom in segments:
+        membres = bitmaps.Bitmap.depuis_ids(segments[nom]).intersection(eligibles)
+        lignes.append((str(nom), membres.serialiser(), len(membres)))
+        tailles[str(nom)] = len(membres)
+    db.enregistrer_liste_electorale(int(vote_id), eligibles.serialiser(), len(eligibles), lignes)
+    invalider(vote_id)
+    return {
+        "success": True,
+        "vote_id": int(vote_id),
+        "eligibles": len(eligibles),
+        "inconnus": len(demandes) - len(eligibles),
+        "segments": tailles
+    }
+
+
+def supprimer(vote_id):
+    supprimee = db.supprimer_liste_electorale(int(vote_id))
+    invalider(vote_id)
+    return {"success": True, "vote_id": int(vote_id), "supprimee": supprimee}
+
+
+def _taux(nombre, total):
+    return round(nombre / total * 100, 2) if total > 0 else 0
+
+
+def participation(vote_id):
+    # En mode partitionne, retraits et bulletins sont ceux de la partition (voir fusionner)
+    entree = get_liste(vote_id)
+    retraits = entree["retraits"]
+    eligibles = entree["eligibles"]
+    if eligibles is None:
+        inscrits = db.get_nombre_electeurs()
+        jetons_retires = len(retraits)
+    else:
+        inscrits = len(eligibles)
+        jetons_retires = eligibles.cardinalite_intersection(retraits)
+    bulletins = db.get_nombre_bulletins(vote_id)
+
+    segments = []
+    for nom in sorted(entree["segments"]):
+        membres = entree["segments"][nom]
+        retires_segment = membres.cardinalite_intersection(retraits)
+        segments.append({
+            "nom": nom,
+            "inscrits": len(membres),
+            "jetons_retires": retires_segment,
+            "taux_retrait": _taux(retires_segment, len(membres))
+        })
+    return {
+        "vote_id": int(vote_id),
+        "liste_electorale": eligibles is not None,
+        "inscrits": inscrits,
+        "jetons_retires": jetons_retires,
+        "bulletins": bulletins,
+        "taux_retrait": _taux(jetons_retires, inscrits),
+        "taux_participation": _taux(bulletins, inscrits),
+        "segments": segments,
+        "memoire_octets": (eligibles.memoire() if eligibles is not None else 0) + retraits.memoire()
+                          + sum(m.memoire() for m in entree["segments"].values())
+    }
+
+
+def fusionner(participations):
+    # Mode partitionne : un electeur ne retire son jeton que dans une partition, les retraits
+    # et les bulletins des partitions sont donc disjoints et s'additionnent
+    resultat = dict(participations[0])
+    for cle in ("jetons_retires", "bulletins", "memoire_octets"):
+        resultat[cle] = sum(p[cle] for p in participations)
+    resultat["taux_retrait"] = _taux(resultat["jetons_retires"], resultat["inscrits"])
+    resultat["taux_participation"] = _taux(resultat["bulletins"], resultat["inscrits"])
+    segments = []
+    for i in range(len(resultat["segments"])):
+        segment = dict(resultat["segments"][i])
+        segment["jetons_retires"] = sum(p["segments"][i]["jetons_retires"] for p in participations)
+        segment["taux_retrait"] = _taux(segment["jetons_retires"], segment["inscrits"])
+        segments.append(segment)
+    resultat["segments"] = segments
+    return resultat
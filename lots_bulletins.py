@@ -0,0 +1,140 @@
+# lots_bulletins.py
+# Depot groupe de bulletins (POST /api/voter/batch) pour les bureaux de vote qui collectent
+# hors ligne : jetons valides par requetes ensemblistes, options verifiees contre le vote,
+# chiffrement sur un groupe de processus, une transaction et un lot de signatures par vote.
+
+import os
+import threading
+import audit
+import cache_votes
+import database as db
+import filtre_jetons
+import recus
+import rsa as crypto
+
+TAILLE_MAX = 5000
+NB_PROCESSUS = os.cpu_count() or 1
+# En dessous, le chiffrement reste dans le fil de la requete : l'envoi aux processus couterait plus
+SEUIL_PARALLELE = 64
+TAILLE_MORCEAU = 128
+
+_groupe = None
+_verrou = threading.Lock()
+
+
+def _groupe_processus():
+    global _groupe
+    with _verrou:
+        if _groupe is None:
+            # Imports differes : un serveur qui ne depasse jamais SEUIL_PARALLELE ne les paie pas
+            import concurrent.futures
+            import multiprocessing
+            # spawn : on ne duplique pas par fork un serveur qui a deja des fils en cours
+            _groupe = concurrent.futures.ProcessPoolExecutor(NB_PROCESSUS, mp_context=multiprocessing.get_context("spawn"))
+    return _groupe
+
+
+def _chiffrer_morceau(cle_pub, demandes):
+    return [crypto.chiffrer_vote(option_id, jeton_hash, cle_pub)["vote_chiffre"] for option_id, jeton_hash in demandes]
+
+
+def chiffrer(cle_pub, demandes):
+    # demandes : [(option_id, jeton_hash)] -> blocs chiffres dans le meme ordre
+    if NB_PROCESSUS < 2 or len(demandes) < SEUIL_PARALLELE:
+        return _chiffrer_morceau(cle_pub, demandes)
+    morceaux = [demandes[debut:debut + TAILLE_MORCEAU] for debut in range(0, len(demandes), TAILLE_MORCEAU)]
+    chiffres = []
+    for morceau in _groupe_processus().map(_chiffrer_morceau, [cle_pub] * len(morceaux), morceaux):
+        chiffres.extend(morceau)
+    return chiffres
+
+
+def _refus(erreur):
+    return {"success": False, "error": erreur}
+
+
+def _deposer_vote(vote_id, demandes, resultats):
+    # demandes : [(indice, option_id, jeton_hash)] d'un meme vote
+    vote = cache_votes.get_vote(vote_id)
+    if not vote or vote["statut"] != "active":
+        erreur = "Vote non trouve" if not vote else "Ce vote n'est pas actif"
+        for indice, _, _ in demandes:
+            resultats[indice] = _refus(erreur)
+        return
+    options = set(option["id"] for option in cache_votes.get_options(vote["id"]))
+    valides = []
+    for demande in demandes:
+        if demande[1] in options:
+            valides.append(demande)
+        else:
+            resultats[demande[0]] = _refus("Option invalide pour ce vote")
+    if not valides:
+        return
+
+    chiffres = chiffrer(cache_votes.get_cle_publique(vote), [(option_id, jeton_hash) for _, option_id, jeton_hash in valides])
+    enregistres = db.enregistrer_bulletins(vote["id"], [(chiffre, demande[2]) for chiffre, demande in zip(chiffres, valides)])
+    a_signer = [enregistre["recu"] for enregistre in enregistres if enregistre["success"]]
+    try:
+        signes = iter(recus.signer_plusieurs(a_signer))
+    except Exception as e:
+        # Bulletins deja enregistres : comme /api/voter, le recu part alors sans signature
+        print("Signature des recus echouee : " + str(e))
+        signes = iter(a_signer)
+    for demande, enregistre in zip(valides, enregistres):
+        if enregistre["success"]:
+            enregistre["recu"] = next(signes)
+        resultats[demande[0]] = enregistre
+
+
+def deposer(bulletins):
+    # bulletins : [{jeton, option_id}] -> un resultat par element, dans l'ordre recu
+    resultats = [None] * len(bulletins)
+    a_verifier = {}
+    votes_actifs = db.get_ids_votes_actifs()
+    for indice, element in enumerate(bulletins):
+        jeton = element.get("jeton") if isinstance(element, dict) else None
+        if not isinstance(jeton, str) or not jeton:
+            resultats[indice] = _refus("Jeton requis")
+            continue
+        try:
+            option_id = int(element.get("option_id"))
+        except (TypeError, ValueError):
+            resultats[indice] = _refus("Option requise")
+            continue
+        jeton_hash = db.hash_jeton(jeton)
+        if jeton_hash in a_verifier:
+            resultats[indice] = _refus("Jeton en double dans le lot")
+            continue
+        if db.PARTITION is not None and db.partition_de(jeton_hash) != db.PARTITION:
+            resultats[indice] = _refus("Jeton hors de la plage de cette partition")
+            continue
+        # Pre-filtre en memoire : seul "inconnu" est certain, le reste est verifie en base
+        if filtre_jetons.consulter(jeton_hash, votes_actifs=votes_actifs) == filtre_jetons.INCONNU:
+            resultats[indice] = _refus("Jeton invalide")
+        else:
+            a_verifier[jeton_hash] = (indice, option_id)
+
+    jetons = db.get_jetons(list(a_verifier))
+    par_vote = {}
+    for jeton_hash in a_verifier:
+        indice, option_id = a_verifier[jeton_hash]
+        jeton = jetons.get(jeton_hash)
+        if not jeton:
+            filtre_jetons.signaler_absent(jeton_hash)
+            resultats[indice] = _refus("Jeton invalide")
+        elif jeton["utilise"] == 1:
+            resultats[indice] = _refus("Ce jeton a deja ete utilise")
+        else:
+            par_vote.setdefault(jeton["vote_id"], []).append((indice, option_id, jeton_hash))
+
+    for vote_id in par_vote:
+        try:
+            _deposer_vote(vote_id, par_vote[vote_id], resultats)
+        except Exception as e:
+            for indice, _, _ in par_vote[vote_id]:
+                if resultats[indice] is None:
+                    resultats[indice] = _refus(str(e))
+
+    acceptes = sum(1 for resultat in resultats if resultat["success"])
+    audit.enregistrer("voter_lot", votes=sorted(par_vote), recus=len(bulletins), acceptes=acceptes)
+    return resultats
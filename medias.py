@@ -0,0 +1,136 @@
+# medias.py
+# Photos des options, adressees par leur SHA-256 : medias/<2 premiers car.>/<hash>[_<taille>].
+# La ligne options.photo ne garde que le hash ; un fichier ne change jamais une fois ecrit,
+# il peut donc etre mis en cache sans limite par les navigateurs.
+#
+# Miniatures : Pillow est optionnel. Sans lui, l'original est servi pour toutes les tailles.
+
+import base64
+import hashlib
+import io
+import os
+import re
+
+DOSSIER = "medias"
+# Largeur maximale des miniatures : carte de la page de vote en 1x et 2x
+TAILLES = (400, 800)
+TAILLE_MAX = 5 * 1024 * 1024
+
+SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+_HASH = re.compile(r"^[0-9a-f]{64}$")
+_pil = None
+
+
+class MediaInvalide(Exception):
+    pass
+
+
+def _image_pil():
+    global _pil
+    if _pil is None:
+        try:
+            from PIL import Image
+        except ImportError:
+            Image = False
+        _pil = Image
+    return _pil
+
+
+def est_hash(valeur):
+    return isinstance(valeur, str) and _HASH.match(valeur) is not None
+
+
+def type_contenu(donnees):
+    for signature, type_mime in SIGNATURES:
+        if donnees.startswith(signature):
+            return type_mime
+    if donnees[0:4] == b"RIFF" and donnees[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def decoder(valeur):
+    # Octets bruts, data URL ou base64 simple
+    if isinstance(valeur, (bytes, bytearray)):
+        return bytes(valeur)
+    if not isinstance(valeur, str):
+        # Nombre, liste ou objet JSON : refuse comme une image illisible, pas en erreur 500
+        raise MediaInvalide("Image non decodable")
+    if valeur.startswith("data:"):
+        valeur = valeur.split(",", 1)[-1]
+    try:
+        return base64.b64decode(valeur, validate=True)
+    except ValueError:
+        raise MediaInvalide("Image non decodable")
+
+
+def chemin(empreinte, taille=None):
+    nom = empreinte if taille is None else empreinte + "_" + str(taille)
+    return os.path.join(DOSSIER, empreinte[:2], nom)
+
+
+def _ecrire(destination, donnees):
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    temporaire = destination + ".tmp" + str(os.getpid())
+    with open(temporaire, "wb") as f:
+        f.write(donnees)
+    os.replace(temporaire, destination)
+
+
+def _miniature(empreinte, taille):
+    Image = _image_pil()
+    if not Image:
+        return None
+    contenu = None
+    with Image.open(chemin(empreinte)) as image:
+        if image.width > taille:
+            format_image = "PNG" if image.format in ("PNG", "GIF") else image.format
+            image.thumbnail((taille, taille * 4))
+            sortie = io.BytesIO()
+            image.save(sortie, format=format_image)
+            contenu = sortie.getvalue()
+    if contenu is None:
+        # Image deja assez petite : la miniature est une copie, pour ne plus rouvrir l'original
+        with open(chemin(empreinte), "rb") as f:
+            contenu = f.read()
+    destination = chemin(empreinte, taille)
+    _ecrire(destination, contenu)
+    return destination
+
+
+def enregistrer(valeur):
+    donnees = decoder(valeur)
+    if len(donnees) > TAILLE_MAX:
+        raise MediaInvalide("Image trop volumineuse (max " + str(TAILLE_MAX // (1024 * 1024)) + " Mo)")
+    if type_contenu(donnees) is None:
+        raise MediaInvalide("Format non pris en charge (PNG, JPEG, GIF ou WebP)")
+    empreinte = hashlib.sha256(donnees).hexdigest()
+    if not os.path.exists(chemin(empreinte)):
+        _ecrire(chemin(empreinte), donnees)
+    for taille in TAILLES:
+        if not os.path.exists(chemin(empreinte, taille)):
+            try:
+                _miniature(empreinte, taille)
+            except Exception as e:
+                print("Miniature " + str(taille) + " de " + empreinte + " non generee : " + str(e))
+    return empreinte
+
+
+def fichier(empreinte, taille=None):
+    # Chemin a servir : miniature si elle existe (generee au besoin), sinon l'original
+    if not est_hash(empreinte) or not os.path.exists(chemin(empreinte)):
+        return None
+    if taille is None or taille not in TAILLES:
+        return chemin(empreinte)
+    if os.path.exists(chemin(empreinte, taille)):
+        return chemin(empreinte, taille)
+    try:
+        return _miniature(empreinte, taille) or chemin(empreinte)
+    except Exception:
+        return chemin(empreinte)
@@ -0,0 +1,90 @@
+# merkle.py
+# Arbre de Merkle en ajout seul (construction RFC 6962) sur les bulletins d'un vote.
+
+import hashlib
+
+
+def hash_feuille(donnees: bytes) -> str:
+    return hashlib.sha256(b"\x00" + donnees).hexdigest()
+
+
+def hash_noeud(gauche: str, droite: str) -> str:
+    return hashlib.sha256(b"\x01" + bytes.fromhex(gauche) + bytes.fromhex(droite)).hexdigest()
+
+
+def ajouter_feuille(frontiere: list, taille: int, feuille: str) -> list:
+    # frontiere[l] = racine du sous-arbre complet de niveau l en attente d'un frere droit.
+    # Retourne les noeuds completes (niveau, indice, hash) a persister.
+    noeuds = [(0, taille, feuille)]
+    h = feuille
+    niveau = 0
+    while niveau < len(frontiere) and frontiere[niveau] is not None:
+        h = hash_noeud(frontiere[niveau], h)
+        frontiere[niveau] = None
+        niveau = niveau + 1
+        noeuds.append((niveau, taille >> niveau, h))
+    if niveau == len(frontiere):
+        frontiere.append(None)
+    frontiere[niveau] = h
+    return noeuds
+
+
+def racine(frontiere: list) -> str:
+    acc = None
+    for h in frontiere:
+        if h is None:
+            continue
+        acc = h if acc is None else hash_noeud(h, acc)
+    return acc if acc is not None else hashlib.sha256(b"").hexdigest()
+
+
+def _plus_grande_puissance(n: int) -> int:
+    # Plus grande puissance de 2 strictement inferieure a n (n > 1)
+    k = 1
+    while k * 2 < n:
+        k = k * 2
+    return k
+
+
+def _hash_plage(debut: int, n: int, noeud) -> str:
+    if n & (n - 1) == 0:
+        niveau = n.bit_length() - 1
+        return noeud(niveau, debut >> niveau)
+    k = _plus_grande_puissance(n)
+    return hash_noeud(_hash_plage(debut, k, noeud), _hash_plage(debut + k, n - k, noeud))
+
+
+def preuve_inclusion(indice: int, taille: int, noeud) -> list:
+    # noeud(niveau, indice) renvoie le hash d'un sous-arbre complet deja persiste
+    preuve = []
+    debut = 0
+    n = taille
+    while n > 1:
+        k = _plus_grande_puissance(n)
+        if indice - debut < k:
+            preuve.append(_hash_plage(debut + k, n - k, noeud))
+            n = k
+        else:
+            preuve.append(_hash_plage(debut, k, noeud))
+            debut = debut + k
+            n = n - k
+    preuve.reverse()
+    return preuve
+
+
+def verifier_inclusion(feuille: str, indice: int, taille: int, preuve: list, racine_attendue: str) -> bool:
+    if indice >= taille:
+        return False
+    fn, sn = indice, taille - 1
+    h = feuille
+    for frere in preuve:
+        if sn == 0:
+            return False
+        if fn & 1 or fn == sn:
+            h = hash_noeud(frere, h)
+            while fn & 1 == 0 and fn != 0:
+                fn, sn = fn >> 1, sn >> 1
+        else:
+            h = hash_noeud(h, frere)
+        fn, sn = fn >> 1, sn >> 1
+    return sn == 0 and h == racine_attendue
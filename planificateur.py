@@ -0,0 +1,181 @@
+import datetime
+import heapq
+import threading
+import time
+import database as db
+import cache_votes
+import decompte
+import filtre_jetons
+import listes_electorales
+import reponses
+
+# Le prechauffage a lieu un peu avant l'ouverture pour que le pic d'ouverture trouve tout en memoire
+AVANCE_PRECHAUFFAGE = 30
+
+_evenements = []
+_planifies = set()
+_condition = threading.Condition()
+_thread = None
+
+
+def normaliser_date(texte):
+    # Dates sans fuseau = UTC, comme CURRENT_TIMESTAMP de SQLite
+    date = datetime.datetime.fromisoformat(texte.strip())
+    if date.tzinfo is not None:
+        date = date.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return date.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def vers_instant(date_texte):
+    date = datetime.datetime.strptime(date_texte, "%Y-%m-%d %H:%M:%S")
+    return date.replace(tzinfo=datetime.timezone.utc).timestamp()
+
+
+def valider_planning(date_ouverture, date_fermeture):
+    # Retourne les dates normalisees (ou None) ; ValueError si le planning est incoherent
+    ouverture = normaliser_date(date_ouverture) if date_ouverture else None
+    fermeture = normaliser_date(date_fermeture) if date_fermeture else None
+    if ouverture and fermeture and vers_instant(fermeture) <= vers_instant(ouverture):
+        raise ValueError("La fermeture doit suivre l'ouverture")
+    if fermeture and vers_instant(fermeture) <= time.time():
+        raise ValueError("La date de fermeture est deja passee")
+    return ouverture, fermeture
+
+
+def lancer_decompte(vote_id):
+    def travail():
+        try:
+            decompte.executer_decompte(db.get_vote(vote_id))
+        except Exception as e:
+            print("Decompte automatique du vote " + str(vote_id) + " echoue : " + str(e))
+    thread = threading.Thread(target=travail, name="decompte-" + str(vote_id), daemon=True)
+    thread.start()
+    return thread
+
+
+def _effets_statut(vote_id, statut):
+    cache_votes.invalider(vote_id)
+    if statut == "active":
+        cache_votes.prechauffer(vote_id)
+    elif statut == "terminee":
+        filtre_jetons.retirer(vote_id)
+        lancer_decompte(vote_id)
+
+
+def appliquer_statut(vote_id, statut):
+    resultat = db.changer_statut_vote(vote_id, statut)
+    if not resultat["success"]:
+        return resultat
+    EFFETS["statut"](vote_id, statut)
+    return resultat
+
+
+def _ajouter(evenement):
+    # Un meme evenement replanifie plusieurs fois (synchronisations) n'est mis qu'une fois en file
+    if evenement not in _planifies:
+        _planifies.add(evenement)
+        heapq.heappush(_evenements, evenement)
+
+
+def planifier(vote_id, date_ouverture=None, date_fermeture=None):
+    # Sans planificateur demarre (partition du mode partitionne), les minuteries sont au routeur
+    if _thread is None:
+        return
+    with _condition:
+        if date_ouverture:
+            instant = vers_instant(date_ouverture)
+            _ajouter((instant - AVANCE_PRECHAUFFAGE, int(vote_id), "prechauffer", instant))
+            _ajouter((instant, int(vote_id), "ouvrir", instant))
+        if date_fermeture:
+            instant = vers_instant(date_fermeture)
+            _ajouter((instant, int(vote_id), "fermer", instant))
+        _condition.notify()
+
+
+def replanifier(vote_id):
+    # Dates relues en base : le vote a pu etre cree ou replanifie par un autre processus
+    vote = db.get_vote(vote_id)
+    if not vote:
+        return
+    if vote["statut"] == "active":
+        planifier(vote_id, None, vote["date_fermeture"])
+    elif vote["statut"] == "en_attente":
+        planifier(vote_id, vote["date_ouverture"], vote["date_fermeture"])
+
+
+def synchroniser(vote_id):
+    # Le vote a pu changer dans un autre processus (mode partitionne) : caches locaux et minuteries
+    vote = db.get_vote(vote_id)
+    cache_votes.invalider(vote_id)
+    cache_votes.invalider_options(vote_id)
+    listes_electorales.invalider(vote_id)
+    reponses.invalider(("resultats", int(vote_id)))
+    reponses.invalider(("resultats", None))
+    if not vote:
+        return False
+    if vote["statut"] == "active":
+        cache_votes.prechauffer(vote_id)
+    elif vote["statut"] == "terminee":
+        filtre_jetons.retirer(vote_id)
+    replanifier(vote_id)
+    return True
+
+
+# Effets d'un evenement dans ce processus. En mode partitionne, le planificateur ne tourne que
+# dans le routeur, qui les remplace pour les faire suivre aux partitions (voir routeur.py)
+EFFETS = {
+    "prechauffer": cache_votes.prechauffer,
+    "statut": _effets_statut,
+    "synchroniser": synchroniser,
+}
+
+
+def _executer(vote_id, action, instant):
+    vote = db.get_vote(vote_id)
+    if not vote:
+        return
+    # L'evenement est ignore si le vote a ete replanifie ou a change de statut entre-temps
+    if action in ("prechauffer", "ouvrir"):
+        if vote["statut"] != "en_attente" or not vote["date_ouverture"] or vers_instant(vote["date_ouverture"]) != instant:
+            return
+        if action == "prechauffer":
+            EFFETS["prechauffer"](vote_id)
+        elif not appliquer_statut(vote_id, "active")["success"]:
+            # Transition faite par un autre processus au meme instant
+            EFFETS["synchroniser"](vote_id)
+    elif action == "fermer":
+        if not vote["date_fermeture"] or vers_instant(vote["date_fermeture"]) != instant:
+            return
+        if vote["statut"] == "terminee":
+            EFFETS["synchroniser"](vote_id)
+        elif vote["statut"] == "active" and not appliquer_statut(vote_id, "terminee")["success"]:
+            EFFETS["synchroniser"](vote_id)
+
+
+def _boucle():
+    while True:
+        with _condition:
+            while not _evenements:
+                _condition.wait()
+            attente = _evenements[0][0] - time.time()
+            if attente > 0:
+                _condition.wait(attente)
+                continue
+            evenement = heapq.heappop(_evenements)
+            _planifies.discard(evenement)
+            _, vote_id, action, instant = evenement
+        try:
+            _executer(vote_id, action, instant)
+        except Exception as e:
+            print("Planificateur : " + action + " du vote " + str(vote_id) + " echoue : " + str(e))
+
+
+def demarrer():
+    global _thread
+    if _thread is None:
+        _thread = threading.Thread(target=_boucle, name="planificateur", daemon=True)
+        _thread.start()
+    for vote in db.get_votes_planifies():
+        date_ouverture = vote["date_ouverture"] if vote["statut"] == "en_attente" else None
+        planifier(vote["id"], date_ouverture, vote["date_fermeture"])
+    return _thread
@@ -0,0 +1,133 @@
+import threading
+import database as db
+import merkle
+import rsa as crypto
+
+# Signature des recus par micro-lots : un signataire unique prend tous les recus en attente,
+# construit un petit arbre de Merkle et ne signe que sa racine (une operation RSA-CRT par lot).
+TAILLE_CLE = (2 ** 511, 2 ** 512)
+LOT_MAX = 256
+DELAI_MAX = 5.0
+
+_attente = []
+_condition = threading.Condition()
+_cle = {}
+_verrou_cle = threading.Lock()
+_thread = None
+
+
+def contenu_recu(recu):
+    return (str(recu["vote_id"]) + ":" + str(recu["indice"]) + ":" + recu["feuille"]).encode()
+
+
+def charger_cle():
+    if not _cle:
+        with _verrou_cle:
+            if not _cle:
+                cle = db.get_cle_signature()
+                if cle is None:
+                    publique, privee = crypto.generer_cles_rsa(TAILLE_CLE[0], TAILLE_CLE[1])
+                    cle_pub_json, cle_priv_json = crypto.cles_vers_json(publique, privee)
+                    cle = db.enregistrer_cle_signature(cle_pub_json, cle_priv_json)
+                _cle["id"] = cle["id"]
+                _cle["publique"] = crypto.json_vers_cle_publique(cle["cle_publique"])
+                _cle["privee"] = crypto.json_vers_cle_privee(cle["cle_privee"])
+    return _cle
+
+
+def get_cle_publique():
+    cle = charger_cle()
+    return {"id": cle["id"], "n": str(cle["publique"]["n"]), "e": str(cle["publique"]["e"])}
+
+
+def signer_lot(recus):
+    cle = charger_cle()
+    frontiere = []
+    noeuds = {}
+    for indice, recu in enumerate(recus):
+        feuille = merkle.hash_feuille(contenu_recu(recu))
+        for niveau, position, h in merkle.ajouter_feuille(frontiere, indice, feuille):
+            noeuds[(niveau, position)] = h
+    racine = merkle.racine(frontiere)
+    signature = str(crypto.signer_hash(int(racine, 16), cle["privee"]))
+
+    signes = []
+    for indice, recu in enumerate(recus):
+        signe = dict(recu)
+        signe["signature"] = {
+            "cle_id": cle["id"],
+            "racine_lot": racine,
+            "indice_lot": indice,
+            "taille_lot": len(recus),
+            "preuve_lot": merkle.preuve_inclusion(indice, len(recus), lambda n, i: noeuds[(n, i)]),
+            "signature": signature
+        }
+        signes.append(signe)
+    return signes
+
+
+def _boucle():
+    while True:
+        with _condition:
+            while not _attente:
+                _condition.wait()
+            lot = _attente[:LOT_MAX]
+            del _attente[:LOT_MAX]
+        try:
+            signes = signer_lot([demande["recu"] for demande in lot])
+        except Exception as e:
+            print("Signature des recus echouee : " + str(e))
+            signes = [None] * len(lot)
+        for demande, signe in zip(lot, signes):
+            demande["resultat"] = signe
+            demande["fait"].set()
+
+
+def demarrer():
+    global _thread
+    with _condition:
+        if _thread is None:
+            _thread = threading.Thread(target=_boucle, name="recus", daemon=True)
+            _thread.start()
+
+
+def signer(recu):
+    # Pas d'attente artificielle : le lot contient ce qui s'est accumule pendant la signature precedente
+    demarrer()
+    demande = {"recu": recu, "fait": threading.Event(), "resultat": None}
+    with _condition:
+        _attente.append(demande)
+        _condition.notify()
+    if not demande["fait"].wait(DELAI_MAX):
+        return None
+    return demande["resultat"]
+
+
+def signer_plusieurs(recus):
+    # Depot groupe : signe directement par lots de LOT_MAX, sans passer par la file du signataire
+    signes = []
+    for debut in range(0, len(recus), LOT_MAX):
+        signes.extend(signer_lot(recus[debut:debut + LOT_MAX]))
+    return signes
+
+
+def verifier_recus(recus, cle_pub=None):
+    # La signature de chaque racine de lot n'est verifiee qu'une fois, quel que soit le nombre de recus
+    if cle_pub is None:
+        cle_pub = charger_cle()["publique"]
+    racines_valides = {}
+    resultats = []
+    for recu in recus:
+        try:
+            signature = recu["signature"]
+            cle = (signature["racine_lot"], signature["signature"])
+            if cle not in racines_valides:
+                racines_valides[cle] = crypto.verifier_hash(int(cle[0], 16), int(cle[1]), cle_pub)
+            feuille = merkle.hash_feuille(contenu_recu(recu))
+            valide = racines_valides[cle] and merkle.verifier_inclusion(
+                feuille, signature["indice_lot"], signature["taille_lot"], signature["preuve_lot"], cle[0]
+            )
+        except (KeyError, TypeError, ValueError):
+            valide = False
+        resultats.append(valide)
+    return resultats
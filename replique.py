@@ -0,0 +1,79 @@
+import os
+import sqlite3
+import threading
+import time
+import database as db
+
+# Replique periodique de la base pour les lectures lourdes (tableaux de bord, resultats)
+ACTIVE = os.environ.get("VOTE_REPLIQUE", "0") == "1"
+CHEMIN = "vote_system_replique.db"
+INTERVALLE = float(os.environ.get("VOTE_REPLIQUE_INTERVALLE", "5"))
+AGE_MAX = float(os.environ.get("VOTE_REPLIQUE_AGE_MAX", "30"))
+
+_date_copie = None
+_source = None
+_version_copiee = None
+_verrou = threading.Lock()
+
+
+def _version_source():
+    # PRAGMA data_version change quand une autre connexion a valide une ecriture
+    global _source
+    if _source is None:
+        _source = sqlite3.connect(db.DATABASE_PATH, check_same_thread=False)
+    # fetchall : l'instruction est terminee, aucune lecture ne reste ouverte sur la base
+    return _source.execute("PRAGMA data_version").fetchall()[0][0]
+
+
+def rafraichir():
+    # Retourne True si la base a ete recopiee, False si rien n'avait change depuis la copie
+    global _date_copie, _version_copiee
+    with _verrou:
+        debut = time.time()
+        version = _version_source()
+        if version == _version_copiee and os.path.exists(CHEMIN):
+            # Copie encore exacte : seul son age est remis a zero
+            _date_copie = debut
+            return False
+        temporaire = CHEMIN + ".tmp"
+        copie = sqlite3.connect(temporaire)
+        _source.backup(copie)
+        copie.execute("PRAGMA journal_mode=DELETE")
+        copie.close()
+        # Remplacement atomique : les lecteurs en cours gardent l'ancienne copie
+        os.replace(temporaire, CHEMIN)
+        _date_copie = debut
+        _version_copiee = version
+        db.REPLIQUE_PATH = CHEMIN
+        return True
+
+
+def age():
+    if _date_copie is None:
+        return None
+    return round(time.time() - _date_copie, 3)
+
+
+def disponible():
+    # Au-dela de AGE_MAX, on lit la base principale plutot qu'une copie trop ancienne
+    a = age()
+    return ACTIVE and a is not None and a <= AGE_MAX
+
+
+def _boucle():
+    while True:
+        time.sleep(INTERVALLE)
+        try:
+            rafraichir()
+        except (sqlite3.Error, OSError) as e:
+            print("Replique : echec de la copie (" + str(e) + ")")
+
+
+def demarrer(intervalle=None):
+    global INTERVALLE
+    if intervalle:
+        INTERVALLE = intervalle
+    rafraichir()
+    thread = threading.Thread(target=_boucle, name="replique", daemon=True)
+    thread.start()
+    return thread
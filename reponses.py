@@ -0,0 +1,82 @@
+import gzip
+import hashlib
+import json
+import threading
+import database as db
+
+# Reponses JSON figees : encodees, compressees et etiquetees (ETag) une seule fois.
+# Resultats : figes a la publication du decompte. Options : figees quand le vote est ouvert.
+# Au-dela de MAX_REPONSES, les plus anciennes sont oubliees (reconstruites a la demande)
+MAX_REPONSES = 1000
+
+_reponses = {}
+_generations = {}
+_verrou = threading.Lock()
+
+
+def _figer(data):
+    corps = json.dumps(data, ensure_ascii=False).encode()
+    return {
+        "corps": corps,
+        "gzip": gzip.compress(corps, 6),
+        "etag": '"' + hashlib.sha256(corps).hexdigest()[:32] + '"'
+    }
+
+
+def _obtenir(cle, construire, a_garder=None):
+    # a_garder(data) : faux si la reponse peut encore changer sans invalidation (rien n'est garde)
+    entree = _reponses.get(cle)
+    if entree is not None:
+        return entree
+    generation = _generations.get(cle, 0)
+    data = construire()
+    entree = _figer(data)
+    if a_garder is not None and not a_garder(data):
+        return entree
+    with _verrou:
+        # Une invalidation pendant la construction rend cette entree perimee : on ne la garde pas
+        if _generations.get(cle, 0) == generation:
+            _reponses[cle] = entree
+            while len(_reponses) > MAX_REPONSES:
+                _reponses.pop(next(iter(_reponses)))
+    return entree
+
+
+def invalider(cle):
+    with _verrou:
+        _reponses.pop(cle, None)
+        _generations[cle] = _generations.get(cle, 0) + 1
+
+
+def invalider_tout(type_reponse):
+    with _verrou:
+        for cle in list(_reponses):
+            if cle[0] == type_reponse:
+                _reponses.pop(cle, None)
+                _generations[cle] = _generations.get(cle, 0) + 1
+
+
+def resultats(vote_id=None):
+    # Un vote n'a de resultats qu'une fois publies : sans resultats (vote inconnu, pas encore
+    # depouille), la reponse n'est pas gardee. La page globale est invalidee a chaque publication
+    return _obtenir(
+        ("resultats", vote_id),
+        lambda: {"success": True, "resultats": db.get_resultats(vote_id)},
+        lambda data: vote_id is None or len(data["resultats"]) > 0
+    )
+
+
+def options(vote_id):
+    return _obtenir(("options", vote_id), lambda: {"success": True, "options": db.get_options_by_vote(vote_id)})
+
+
+def options_figees(vote_id):
+    return _reponses.get(("options", vote_id))
+
+
+def publier_resultats(vote_id):
+    # Appele a la fin d'un decompte : fige les resultats du vote et ceux de la page globale
+    invalider(("resultats", vote_id))
+    invalider(("resultats", None))
+    resultats(vote_id)
+    resultats(None)
@@ -0,0 +1,448 @@
+# routeur.py
+# Mode partitionne : N processus server.py sur un meme hote, chacun proprietaire d'une plage
+# de jeton_hash et de son fichier partitions/partition_<i>.db. Le catalogue (votes, options,
+# electeurs) reste partage dans vote_system.db.
+#
+# Le routeur envoie /api/jeton et /api/voter a la partition du hash, lance /api/decompte sur
+# toutes les partitions en parallele puis publie la somme. Les comptes de bulletins, les
+# statistiques et la liste des bulletins sont lus sur toutes les partitions puis fusionnes.
+# Le reste va a la partition 0.
+# Les minuteries des votes (planificateur.py) tournent ici et non dans les partitions : une
+# fermeture programmee publie le decompte fusionne comme une fermeture manuelle.
+#
+# Usage : python routeur.py --partitions 3 [--port 8000] [--port-base 8101]
+
+import http.client
+import http.server
+import json
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+import audit
+import database as db
+import listes_electorales
+import lots_bulletins
+import planificateur
+import server
+import taches
+
+PARTITIONS = []
+
+# Requetes admin qui modifient un vote : les autres partitions doivent recaler leurs caches
+ROUTES_DIFFUSEES = ("/api/votes", "/api/votes/statut", "/api/votes/planifier", "/api/options", "/api/options/supprimer",
+                    "/api/options/photo", "/api/votes/liste")
+ENTETES_RELAYES = ("Content-Type", "Accept-Encoding", "If-None-Match", "Idempotency-Key")
+ENTETES_IGNORES = ("connection", "transfer-encoding", "keep-alive")
+
+_sels = {}
+
+
+def appeler(indice, methode, chemin, corps=None, entetes=None, delai=60):
+    hote, port = PARTITIONS[indice]
+    conn = http.client.HTTPConnection(hote, port, timeout=delai)
+    try:
+        conn.request(methode, chemin, corps, entetes or {})
+        reponse = conn.getresponse()
+        return reponse.status, reponse.getheaders(), reponse.read()
+    finally:
+        conn.close()
+
+
+def appeler_json(indice, chemin, data, entetes=None):
+    entetes = dict(entetes or {}, **{"Content-Type": "application/json"})
+    statut, entetes, corps = appeler(indice, "POST", chemin, json.dumps(data).encode(), entetes)
+    return statut, json.loads(corps.decode())
+
+
+def partition_jeton(vote_id, electeur_id):
+    # Le sel d'un vote ne change jamais : on le garde apres la premiere lecture
+    sel = _sels.get(str(vote_id))
+    if sel is None:
+        vote = db.get_vote(vote_id)
+        if not vote:
+            return 0
+        sel = vote["salt"]
+        _sels[str(vote_id)] = sel
+    return db.partition_de(db.hash_jeton(db.generer_jeton(electeur_id, vote_id, sel)), len(PARTITIONS))
+
+
+def diffuser(vote_id, sauf=None, prechauffer=False):
+    for indice in range(len(PARTITIONS)):
+        if indice == sauf:
+            continue
+        try:
+            appeler_json(indice, "/api/partition/synchroniser", {"vote_id": vote_id, "prechauffer": prechauffer})
+        except (OSError, ValueError) as e:
+            print("Partition " + str(indice) + " non synchronisee : " + str(e))
+
+
+def coordonner_decompte(vote_id):
+    vote = db.get_vote(vote_id)
+    if not vote:
+        return 404, {"success": False, "error": "Vote non trouve"}
+    if db.resultats_existent(vote_id):
+        return 200, {"success": True, "resultats": db.get_resultats(vote_id), "deja_calcule": True}
+
+    reponses_partitions = [None] * len(PARTITIONS)
+
+    def decompter(indice):
+        try:
+            reponses_partitions[indice] = appeler_json(indice, "/api/decompte", {"vote_id": vote_id})
+        except (OSError, ValueError) as e:
+            reponses_partitions[indice] = (502, {"success": False, "error": str(e)})
+
+    threads = []
+    for indice in range(len(PARTITIONS)):
+        thread = threading.Thread(target=decompter, args=(indice,))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+
+    comptes = {}
+    libelles = {}
+    total = 0
+    invalides = 0
+    for indice in range(len(PARTITIONS)):
+        statut, data = reponses_partitions[indice]
+        if statut != 200 or not data.get("success"):
+            return 502, {"success": False, "error": "Partition " + str(indice) + " : " + str(data.get("error"))}
+        for ligne in data["resultats"]:
+            comptes[ligne["option_id"]] = comptes.get(ligne["option_id"], 0) + ligne["nombre_bulletins"]
+            libelles[ligne["option_id"]] = ligne["libelle"]
+        total = total + data.get("total_bulletins", 0)
+        invalides = invalides + data.get("invalides", 0)
+
+    if vote["statut"] == "active":
+        resultats = []
+        for option_id in comptes:
+            resultats.append({
+                "vote_id": int(vote_id),
+                "option_id": option_id,
+                "nombre_bulletins": comptes[option_id],
+                "libelle": libelles[option_id]
+            })
+        resultats.sort(key=lambda r: r["nombre_bulletins"], reverse=True)
+        return 200, {"success": True, "provisoire": True, "resultats": resultats, "total_bulletins": total,
+                     "invalides": invalides, "partitions": len(PARTITIONS)}
+
+    db.publier_resultats(vote_id, comptes)
+    audit.enregistrer("publier_resultats", vote_id=vote_id, total_bulletins=total, partitions=len(PARTITIONS))
+    diffuser(vote_id)
+    return 200, {"success": True, "resultats": db.get_resultats(vote_id), "total_bulletins": total,
+                 "invalides": invalides, "partitions": len(PARTITIONS)}
+
+
+def repartir_lot(bulletins, client):
+    # Depot groupe : chaque partition recoit les bulletins de sa plage, en parallele,
+    # puis les resultats sont remis dans l'ordre du lot d'origine
+    groupes = {}
+    for indice, element in enumerate(bulletins):
+        jeton = element.get("jeton") if isinstance(element, dict) else None
+        partition = db.partition_de(db.hash_jeton(jeton), len(PARTITIONS)) if isinstance(jeton, str) and jeton else 0
+        groupes.setdefault(partition, []).append(indice)
+
+    reponses_partitions = {}
+
+    def deposer(partition):
+        lot = [bulletins[indice] for indice in groupes[partition]]
+        try:
+            reponses_partitions[partition] = appeler_json(partition, "/api/voter/batch", {"bulletins": lot}, {"X-Forwarded-For": client})
+        except (OSError, ValueError) as e:
+            reponses_partitions[partition] = (502, {"success": False, "error": str(e)})
+
+    threads = []
+    for partition in groupes:
+        thread = threading.Thread(target=deposer, args=(partition,))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+
+    resultats = [None] * len(bulletins)
+    for partition in groupes:
+        statut, data = reponses_partitions[partition]
+        if statut == 200 and data.get("success"):
+            for indice, resultat in zip(groupes[partition], data["resultats"]):
+                resultats[indice] = resultat
+        else:
+            for indice in groupes[partition]:
+                resultats[indice] = {"success": False, "error": "Partition " + str(partition) + " : " + str(data.get("error"))}
+    acceptes = sum(1 for resultat in resultats if resultat["success"])
+    return {"success": True, "acceptes": acceptes, "refuses": len(resultats) - acceptes, "resultats": resultats}
+
+
+def interroger_toutes(chemin, client):
+    # GET en parallele sur toutes les partitions : [(statut, data)] dans l'ordre des partitions
+    reponses_partitions = [None] * len(PARTITIONS)
+
+    def lire(indice):
+        try:
+            statut, entetes, corps = appeler(indice, "GET", chemin, entetes={"X-Forwarded-For": client})
+            reponses_partitions[indice] = (statut, json.loads(corps.decode()))
+        except (OSError, ValueError) as e:
+            reponses_partitions[indice] = (502, {"success": False, "error": str(e)})
+
+    threads = []
+    for indice in range(len(PARTITIONS)):
+        thread = threading.Thread(target=lire, args=(indice,))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    return reponses_partitions
+
+
+def _fusionner_comptes(donnees):
+    return {"success": True, "count": sum(data["count"] for data in donnees)}
+
+
+def _fusionner_statistiques(donnees):
+    # Le catalogue (electeurs, options, votes, inscrits) est le meme partout : seuls les jetons
+    # et bulletins s'additionnent
+    stats = dict(donnees[0]["statistiques"])
+    for cle in ("jetons_distribues", "jetons_utilises", "total_bulletins", "votants"):
+        stats[cle] = sum(data["statistiques"][cle] for data in donnees)
+    if stats["total_inscrits"] > 0:
+        stats["taux_participation"] = round(stats["votants"] / stats["total_inscrits"] * 100, 2)
+    return {"success": True, "statistiques": stats, "age_replique": max(data.get("age_replique") or 0 for data in donnees)}
+
+
+def _fusionner_bulletins(donnees):
+    # Les id de bulletins sont propres a chaque partition : on indique la partition d'origine
+    bulletins = []
+    for indice in range(len(donnees)):
+        for bulletin in donnees[indice]["bulletins"]:
+            bulletin["partition"] = indice
+            bulletins.append(bulletin)
+    bulletins.sort(key=lambda b: b["date_bulletin"])
+    return {"success": True, "bulletins": bulletins}
+
+
+def _fusionner_participation(donnees):
+    return {"success": True, "participation": listes_electorales.fusionner([data["participation"] for data in donnees])}
+
+
+# Lectures dont chaque partition ne connait que sa part : interrogees partout puis fusionnees
+ROUTES_AGREGEES = {
+    "/api/bulletins/count": _fusionner_comptes,
+    "/api/statistiques": _fusionner_statistiques,
+    "/api/bulletins": _fusionner_bulletins,
+    "/api/votes/participation": _fusionner_participation,
+}
+
+
+def _prechauffer(vote_id):
+    diffuser(vote_id, prechauffer=True)
+
+
+def _apres_statut(vote_id, statut):
+    # Transition faite par la minuterie du routeur : les partitions recalent leurs caches et
+    # une fermeture publie le decompte fusionne, comme une fermeture manuelle
+    diffuser(vote_id)
+    if statut == "terminee":
+        threading.Thread(target=coordonner_decompte, args=(vote_id,), daemon=True).start()
+
+
+def _synchroniser(vote_id):
+    # Transition deja faite par ailleurs : coordonner_decompte ne refait rien si c'est publie
+    vote = db.get_vote(vote_id)
+    if vote:
+        _apres_statut(vote_id, vote["statut"])
+
+
+def _decompte_coordonne(parametres, progression):
+    statut, resultat = coordonner_decompte(parametres["vote_id"])
+    return resultat
+
+
+class RouteurHandler(http.server.BaseHTTPRequestHandler):
+
+    def repondre(self, statut, entetes, corps):
+        self.send_response(statut)
+        for nom, valeur in entetes:
+            if nom.lower() not in ENTETES_IGNORES and nom.lower() != "content-length":
+                self.send_header(nom, valeur)
+        self.send_header("Content-Length", str(len(corps)))
+        self.end_headers()
+        self.wfile.write(corps)
+
+    def repondre_json(self, statut, data):
+        corps = json.dumps(data, ensure_ascii=False).encode()
+        self.repondre(statut, [("Content-Type", "application/json; charset=utf-8"), ("Access-Control-Allow-Origin", "*")], corps)
+
+    def relayer(self, indice, methode, corps=None):
+        entetes = {"X-Forwarded-For": self.client_address[0]}
+        for nom in ENTETES_RELAYES:
+            if self.headers.get(nom):
+                entetes[nom] = self.headers.get(nom)
+        try:
+            statut, entetes_reponse, corps_reponse = appeler(indice, methode, self.path, corps, entetes)
+        except OSError as e:
+            self.repondre_json(502, {"success": False, "error": "Partition " + str(indice) + " injoignable : " + str(e)})
+            return None
+        self.repondre(statut, entetes_reponse, corps_reponse)
+        return statut, corps_reponse
+
+    def agreger(self, path):
+        donnees = []
+        for indice, (statut, data) in enumerate(interroger_toutes(self.path, self.client_address[0])):
+            if statut != 200 or not data.get("success"):
+                # Refus d'une partition (requete invalide, limitation) : renvoye tel quel
+                self.repondre_json(statut if statut != 200 else 502, dict(data, partition=indice))
+                return
+            donnees.append(data)
+        self.repondre_json(200, ROUTES_AGREGEES[path](donnees))
+
+    def do_OPTIONS(self):
+        self.relayer(0, "OPTIONS")
+
+    def do_GET(self):
+        # ?partition=i : lectures propres a une partition (registre Merkle, preuves des recus)
+        parsed = urllib.parse.urlparse(self.path)
+        query = urllib.parse.parse_qs(parsed.query)
+        if parsed.path in ROUTES_AGREGEES and "partition" not in query:
+            self.agreger(parsed.path)
+            return
+        indice = 0
+        if "partition" in query:
+            try:
+                indice = int(query["partition"][0])
+            except ValueError:
+                indice = -1
+            if not 0 <= indice < len(PARTITIONS):
+                self.repondre_json(400, {"success": False, "error": "Partition inconnue"})
+                return
+        self.relayer(indice, "GET")
+
+    def do_POST(self):
+        path = urllib.parse.urlparse(self.path).path
+        corps = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            data = json.loads(corps.decode())
+        except ValueError:
+            data = {}
+        if not isinstance(data, dict):
+            data = {}
+
+        if path == "/api/decompte" and data.get("vote_id"):
+            statut, resultat = coordonner_decompte(data["vote_id"])
+            self.repondre_json(statut, resultat)
+            return
+        if path == "/api/voter/batch" and isinstance(data.get("bulletins"), list) and data["bulletins"]:
+            if len(data["bulletins"]) > lots_bulletins.TAILLE_MAX:
+                self.repondre_json(413, {"success": False, "error": "Lot limite a " + str(lots_bulletins.TAILLE_MAX) + " bulletins"})
+            else:
+                self.repondre_json(200, repartir_lot(data["bulletins"], self.client_address[0]))
+            return
+        if path == "/api/jobs" and data.get("type") == "decompte":
+            # Tache executee ici ; son etat est dans le catalogue partage, lisible par la partition 0
+            cle = self.headers.get("Idempotency-Key") or data.get("cle") or None
+            try:
+                tache, creee = taches.soumettre("decompte", data.get("parametres") or {}, cle)
+            except taches.TacheInvalide as e:
+                self.repondre_json(400, {"success": False, "error": str(e)})
+                return
+            except taches.FileSaturee as e:
+                self.repondre_json(503, {"success": False, "error": str(e)})
+                return
+            self.repondre_json(202 if creee else 200, {"success": True, "tache": tache, "existante": not creee})
+            return
+
+        indice = 0
+        if path == "/api/jeton" and data.get("vote_id") and data.get("electeur_id"):
+            indice = partition_jeton(data["vote_id"], data["electeur_id"])
+        elif path == "/api/voter" and isinstance(data.get("jeton"), str) and data.get("jeton"):
+            indice = db.partition_de(db.hash_jeton(data["jeton"]), len(PARTITIONS))
+
+        relaye = self.relayer(indice, "POST", corps)
+        if relaye and relaye[0] == 200 and path in ROUTES_DIFFUSEES:
+            # Suppression d'option : le vote n'est pas connu, toutes les options sont invalidees
+            if path == "/api/options/supprimer":
+                vote_id = None
+            elif path == "/api/votes":
+                vote_id = json.loads(relaye[1].decode()).get("id")
+            elif path == "/api/options/photo":
+                vote_id = json.loads(relaye[1].decode()).get("vote_id")
+            else:
+                vote_id = data.get("vote_id") or data.get("id")
+            diffuser(vote_id, sauf=indice)
+            if vote_id:
+                planificateur.replanifier(vote_id)
+            if path == "/api/votes/statut" and data.get("statut") == "terminee":
+                # Fermeture manuelle : le decompte fusionne est publie sans attendre l'admin
+                threading.Thread(target=coordonner_decompte, args=(vote_id,), daemon=True).start()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def lancer_partitions(nombre, hote, port_base):
+    processus = []
+    for indice in range(nombre):
+        commande = [sys.executable, "server.py", "--host", hote, "--port", str(port_base + indice),
+                    "--partition", str(indice), "--partitions", str(nombre), "--skip-init"]
+        processus.append(subprocess.Popen(commande))
+    return processus
+
+
+def attendre_partitions(delai=30):
+    fin = time.time() + delai
+    for indice in range(len(PARTITIONS)):
+        while True:
+            try:
+                appeler(indice, "GET", "/api/vote/actif", delai=2)
+                break
+            except OSError:
+                if time.time() > fin:
+                    raise
+                time.sleep(0.2)
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Routeur du mode partitionne")
+    parser.add_argument("--host", default=server.HOST)
+    parser.add_argument("--port", type=int, default=server.PORT)
+    parser.add_argument("--partitions", type=int, default=2)
+    parser.add_argument("--port-base", type=int, default=8101, help="Port de la partition 0 (puis +1, +2...)")
+    parser.add_argument("--sans-lancement", action="store_true", help="Partitions deja demarrees par ailleurs")
+    args = parser.parse_args(argv)
+
+    for indice in range(args.partitions):
+        PARTITIONS.append(("127.0.0.1", args.port_base + indice))
+
+    processus = []
+    if not args.sans_lancement:
+        # Une seule initialisation du catalogue partage, avant que les partitions ne l'ouvrent
+        db.init_database()
+        processus = lancer_partitions(args.partitions, "127.0.0.1", args.port_base)
+    attendre_partitions()
+    taches.TRAVAUX["decompte"] = (_decompte_coordonne, ("vote_id",))
+    taches.demarrer(("decompte",))
+    planificateur.EFFETS["prechauffer"] = _prechauffer
+    planificateur.EFFETS["statut"] = _apres_statut
+    planificateur.EFFETS["synchroniser"] = _synchroniser
+    planificateur.demarrer()
+
+    routeur = server.VoteServer((args.host, args.port), RouteurHandler)
+    print("")
+    print("Routeur : http://" + args.host + ":" + str(args.port) + " -> " + str(args.partitions) + " partitions")
+    print("")
+    try:
+        routeur.serve_forever()
+    except KeyboardInterrupt:
+        print("")
+        print("Arret du routeur.")
+    finally:
+        routeur.server_close()
+        for p in processus:
+            p.terminate()
+        for p in processus:
+            p.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,50 @@
 
 import json
 import base64
+import hashlib
 import secrets
 import math
-from sympy import isprime
+
+# sympy est lourd a importer : il n'est charge qu'a la premiere generation de cles
+_isprime = None
+
+
+def est_premier_miller_rabin(n: int, tours: int = 40) -> bool:
+    if n < 2:
+        return False
+    for p in (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37):
+        if n % p == 0:
+            return n == p
+    d, r = n - 1, 0
+    while d % 2 == 0:
+        d, r = d // 2, r + 1
+    for _ in range(tours):
+        a = secrets.randbelow(n - 3) + 2
+        x = pow(a, d, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in range(r - 1):
+            x = pow(x, 2, n)
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def test_primalite():
+    global _isprime
+    if _isprime is None:
+        try:
+            from sympy import isprime
+        except ImportError:
+            isprime = est_premier_miller_rabin
+        _isprime = isprime
+    return _isprime
 
 
 def generer_nombre_premier(min_val: int, max_val: int) -> int:
+    isprime = test_primalite()
     while True:
         n = secrets.randbelow(max_val - min_val + 1) + min_val
         if isprime(n):
@@ -47,7 +85,7 @@ def generer_cles(taille_min: int, taille_max: int) -> tuple[tuple[int, int], tup
     d = euclide_etendu(e, phi_n)
     
     cle_publique = (n, e)
-    cle_privee = (n, d)
+    cle_privee = (n, d, p, q)
     
     return cle_publique, cle_privee
 
@@ -62,9 +100,33 @@ def dechiffrer_rsa(chiffre: int, n: int, d: int) -> int:
     return pow(chiffre, d, n)
 
 
+def dechiffrer_rsa_crt(chiffre: int, cle_priv: dict) -> int:
+    # Theoreme des restes chinois : deux exponentiations sur des modules deux fois plus courts
+    m1 = pow(chiffre, cle_priv["dp"], cle_priv["p"])
+    m2 = pow(chiffre, cle_priv["dq"], cle_priv["q"])
+    h = (cle_priv["qinv"] * (m1 - m2)) % cle_priv["p"]
+    return m2 + h * cle_priv["q"]
+
+
+def operation_privee(valeur: int, cle_priv: dict) -> int:
+    if "p" in cle_priv:
+        return dechiffrer_rsa_crt(valeur, cle_priv)
+    return dechiffrer_rsa(valeur, cle_priv["n"], cle_priv["d"])
+
+
 def generer_cles_rsa(taille_min: int = 50000, taille_max: int = 200000):
     cle_pub, cle_priv = generer_cles(taille_min, taille_max)
-    return {"n": cle_pub[0], "e": cle_pub[1]}, {"n": cle_priv[0], "d": cle_priv[1]}
+    n, d, p, q = cle_priv
+    privee = {
+        "n": n,
+        "d": d,
+        "p": p,
+        "q": q,
+        "dp": d % (p - 1),
+        "dq": d % (q - 1),
+        "qinv": pow(q, -1, p)
+    }
+    return {"n": cle_pub[0], "e": cle_pub[1]}, privee
 
 
 def cles_vers_json(public, private):
@@ -78,25 +140,56 @@ def json_vers_cle_publique(s):
 
 def json_vers_cle_privee(s):
     data = json.loads(s)
-    return {"n": int(data["n"]), "d": int(data["d"])}
+    cle = {"n": int(data["n"]), "d": int(data["d"])}
+    # Les cles anciennes n'ont pas les parametres CRT
+    if "p" in data:
+        for nom in ("p", "q", "dp", "dq", "qinv"):
+            cle[nom] = int(data[nom])
+    return cle
+
+
+def taille_bloc(n: int) -> int:
+    return (n.bit_length() + 7) // 8
 
 
 def chiffrer_vote(candidat_id, electeur_id, cle_pub):
     vote = json.dumps({"candidat_id": candidat_id, "electeur_id": electeur_id})
     m = int.from_bytes(vote.encode(), 'big')
     c = chiffrer_rsa(m, cle_pub["n"], cle_pub["e"])
-    vote_b64 = base64.b64encode(c.to_bytes((c.bit_length() + 7) // 8, 'big')).decode()
-    return {"vote_chiffre": vote_b64, "hash": str(hash(vote))}
+    # Bloc binaire big-endian de largeur fixe (taille de n), stocke tel quel en BLOB
+    vote_chiffre = c.to_bytes(taille_bloc(cle_pub["n"]), 'big')
+    # SHA-256 et non hash() : la valeur doit etre la meme dans tous les processus
+    return {"vote_chiffre": vote_chiffre, "hash": hashlib.sha256(vote.encode()).hexdigest()}
 
 
 def dechiffrer_vote(vote_chiffre, cle_priv):
-    c = int.from_bytes(base64.b64decode(vote_chiffre), 'big')
-    m = dechiffrer_rsa(c, cle_priv["n"], cle_priv["d"])  # m = c^d mod n
+    if isinstance(vote_chiffre, str):
+        vote_chiffre = base64.b64decode(vote_chiffre)
+    c = int.from_bytes(memoryview(vote_chiffre), 'big')
+    m = operation_privee(c, cle_priv)  # m = c^d mod n
     vote_json = m.to_bytes((m.bit_length() + 7) // 8, 'big').decode()
     return json.loads(vote_json)
 
 
+def hash_message(message) -> int:
+    if isinstance(message, str):
+        message = message.encode()
+    return int.from_bytes(hashlib.sha256(message).digest(), 'big')
+
+
+def signer_hash(h: int, cle_priv: dict) -> int:
+    return operation_privee(h % cle_priv["n"], cle_priv)
+
+
+def verifier_hash(h: int, signature: int, cle_pub: dict) -> bool:
+    return pow(signature, cle_pub["e"], cle_pub["n"]) == h % cle_pub["n"]
+
+
 def signer_message(message, cle_priv):
-    h = hash(message) % cle_priv["n"]
-    return str(dechiffrer_rsa(h, cle_priv["n"], cle_priv["d"]))
+    # SHA-256 et non hash() : hash() est randomise par processus
+    return str(signer_hash(hash_message(message), cle_priv))
+
+
+def verifier_message(message, signature, cle_pub):
+    return verifier_hash(hash_message(message), int(signature), cle_pub)
 
@@ -3,11 +3,35 @@ import http.server
 import socketserver
 import json
 import urllib.parse
+import math
+import os
+import audit
 import database as db
 import rsa as crypto
+import cache_votes
+import decompte
+import filtre_jetons
+import limiteur
+import listes_electorales
+import lots_bulletins
+import medias
+import planificateur
+import recus
+import replique
+import reponses
+import taches
 
 PORT, HOST = 8000, "localhost"
-db.init_database()
+LOCAUX = ("127.0.0.1", "::1")
+
+def lire_id(valeur):
+    # Identifiant lu dans la requete : None s'il n'est pas un entier positif
+    try:
+        identifiant = int(valeur)
+    except (TypeError, ValueError):
+        return None
+    return identifiant if identifiant > 0 else None
+
 
 def generer_cles():
     cle_publique, cle_privee = crypto.generer_cles_rsa(1024)
@@ -21,17 +45,79 @@ class VoteRequestHandler(http.server.SimpleHTTPRequestHandler):
         super().__init__(*args, directory="static", **kwargs)
     
 
-    def send_json(self, data, status=200):
+    def send_json(self, data, status=200, headers=None):
         self.send_response(status)
         self.send_header("Content-Type", "application/json; charset=utf-8")
+        if headers:
+            for nom in headers:
+                self.send_header(nom, headers[nom])
         self.send_header("Access-Control-Allow-Origin", "*")
         self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
-        self.send_header("Access-Control-Allow-Headers", "Content-Type")
+        self.send_header("Access-Control-Allow-Headers", "Content-Type, Idempotency-Key")
         self.end_headers()
         response = json.dumps(data, ensure_ascii=False)
         self.wfile.write(response.encode())
     
 
+    def send_figee(self, entree):
+        # Reponse pre-encodee : 304 si le client a deja la bonne version, gzip si accepte
+        if self.headers.get("If-None-Match") == entree["etag"]:
+            self.send_response(304)
+            self.send_header("ETag", entree["etag"])
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            return
+        gzip_accepte = "gzip" in self.headers.get("Accept-Encoding", "")
+        corps = entree["gzip"] if gzip_accepte else entree["corps"]
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
+        self.send_header("Access-Control-Allow-Headers", "Content-Type, Idempotency-Key")
+        self.send_header("ETag", entree["etag"])
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Vary", "Accept-Encoding")
+        if gzip_accepte:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(corps)))
+        self.end_headers()
+        self.wfile.write(corps)
+    
+
+    def send_media(self, path):
+        # /medias/<hash>[/<taille>] : contenu immuable, mis en cache un an par le client
+        morceaux = path.split("/")
+        taille = int(morceaux[3]) if len(morceaux) == 4 and morceaux[3].isdigit() else None
+        chemin = medias.fichier(morceaux[2], taille) if len(morceaux) in (3, 4) else None
+        if chemin is None:
+            self.send_json({"success": False, "error": "Media non trouve"}, 404)
+            return
+        etag = '"' + os.path.basename(chemin) + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "public, max-age=31536000, immutable")
+            self.end_headers()
+            return
+        with open(chemin, "rb") as f:
+            contenu = f.read()
+        self.send_response(200)
+        self.send_header("Content-Type", medias.type_contenu(contenu) or "application/octet-stream")
+        self.send_header("Content-Length", str(len(contenu)))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "public, max-age=31536000, immutable")
+        self.send_header("X-Content-Type-Options", "nosniff")
+        self.end_headers()
+        self.wfile.write(contenu)
+    
+
+    def send_lecture(self, data, lecture):
+        # Lecture servie par la replique : on indique l'age de la copie
+        age = replique.age() if lecture else 0
+        data["age_replique"] = age
+        self.send_json(data, headers={"X-Replique-Age": str(age)})
+    
+
     def get_body(self):
         try:
             content_length = int(self.headers.get("Content-Length", 0))
@@ -45,7 +131,64 @@ class VoteRequestHandler(http.server.SimpleHTTPRequestHandler):
         self.send_json({})
     
 
+    def client(self):
+        # Derriere routeur.py, l'adresse du votant est transmise par le routeur local
+        adresse = self.client_address[0]
+        if db.PARTITION is not None and adresse in LOCAUX:
+            return self.headers.get("X-Forwarded-For", adresse)
+        return adresse
+    
+
+    def hors_partition(self, jeton_hash):
+        if db.PARTITION is None or db.partition_de(jeton_hash) == db.PARTITION:
+            return False
+        self.send_json({"success": False, "error": "Jeton hors de la plage de cette partition"}, 421)
+        return True
+    
+
+    def admettre(self, methode, path):
+        # Refus rapide (429/503) plutot que d'empiler les requetes en file d'attente
+        classe = limiteur.classe_route(methode, path)
+        attente = limiteur.consommer(self.client(), classe)
+        if attente > 0:
+            retry = str(max(1, math.ceil(attente)))
+            self.send_json({"success": False, "error": "Trop de requetes"}, 429, {"Retry-After": retry})
+            return None
+        if not limiteur.entrer(classe):
+            self.send_json({"success": False, "error": "Serveur surcharge"}, 503, {"Retry-After": "1"})
+            return None
+        return classe
+    
+
     def do_GET(self):
+        path = urllib.parse.urlparse(self.path).path
+        if path.startswith("/medias/"):
+            self.send_media(path)
+            return
+        if not path.startswith("/api/"):
+            self.traiter_get()
+            return
+        classe = self.admettre("GET", path)
+        if classe is None:
+            return
+        try:
+            self.traiter_get()
+        finally:
+            limiteur.sortir(classe)
+    
+
+    def do_POST(self):
+        path = urllib.parse.urlparse(self.path).path
+        classe = self.admettre("POST", path)
+        if classe is None:
+            return
+        try:
+            self.traiter_post()
+        finally:
+            limiteur.sortir(classe)
+    
+
+    def traiter_get(self):
     
         parsed = urllib.parse.urlparse(self.path)
         path = parsed.path
@@ -59,36 +202,82 @@ class VoteRequestHandler(http.server.SimpleHTTPRequestHandler):
     
         elif path == "/api/options/vote":
             vote_id = query.get("vote_id", [None])[0]
-            if vote_id:
-                options = db.get_options_by_vote(int(vote_id))
-                self.send_json({"success": True, "options": options})
+            if vote_id and not lire_id(vote_id):
+                self.send_json({"success": False, "error": "vote_id entier requis"}, 400)
+            elif vote_id:
+                vote_id = lire_id(vote_id)
+                entree = reponses.options_figees(vote_id)
+                if entree is None:
+                    vote = cache_votes.get_vote(vote_id)
+                    if vote and vote["statut"] != "en_attente":
+                        entree = reponses.options(vote_id)
+                if entree is not None:
+                    self.send_figee(entree)
+                else:
+                    options = cache_votes.get_options(vote_id)
+                    self.send_json({"success": True, "options": options})
             else:
                 self.send_json({"success": False, "error": "vote_id requis"}, 400)
         
     
         elif path == "/api/electeurs":
-            electeurs = db.get_all_electeurs()
-            self.send_json({"success": True, "electeurs": electeurs})
+            lecture = replique.disponible()
+            electeurs = db.get_all_electeurs(lecture)
+            self.send_lecture({"success": True, "electeurs": electeurs}, lecture)
+        
+    
+        elif path == "/api/electeurs/search":
+            q = query.get("q", [""])[0]
+            vote_id = query.get("vote_id", [None])[0]
+            a_vote = query.get("a_vote", [None])[0]
+            try:
+                limite = min(int(query.get("limit", ["20"])[0]), 100)
+            except ValueError:
+                limite = 20
+            if a_vote is not None:
+                a_vote = a_vote in ("1", "true", "oui")
+            if vote_id is not None:
+                vote_id = lire_id(vote_id)
+                if vote_id is None:
+                    self.send_json({"success": False, "error": "vote_id entier requis"}, 400)
+                    return
+            if a_vote is not None and not vote_id:
+                self.send_json({"success": False, "error": "vote_id requis avec a_vote"}, 400)
+            else:
+                electeurs = db.rechercher_electeurs(
+                    q, max(limite, 1),
+                    query.get("inscrit_apres", [None])[0],
+                    query.get("inscrit_avant", [None])[0],
+                    vote_id,
+                    a_vote
+                )
+                self.send_json({"success": True, "electeurs": electeurs})
         
     
         elif path == "/api/votes":
-            votes = db.get_all_votes()
-            self.send_json({"success": True, "votes": votes})
+            lecture = replique.disponible()
+            votes = db.get_all_votes(lecture)
+            self.send_lecture({"success": True, "votes": votes}, lecture)
         
     
         elif path == "/api/vote/actif":
-            vote = db.get_vote_actif()
+            vote = cache_votes.get_vote_actif()
             self.send_json({"success": True, "vote": vote})
         
     
         elif path == "/api/statistiques":
-            stats = db.get_statistiques()
-            self.send_json({"success": True, "statistiques": stats})
+            # Jetons en fragments ou en partitions : absents de la replique, tout est lu en direct
+            lecture = replique.disponible() and db.bulletins_en_base_principale()
+            stats = db.get_statistiques(lecture)
+            self.send_lecture({"success": True, "statistiques": stats}, lecture)
         
     
         elif path == "/api/resultats":
-            resultats = db.get_resultats()
-            self.send_json({"success": True, "resultats": resultats})
+            vote_id = query.get("vote_id", [None])[0]
+            if vote_id and not lire_id(vote_id):
+                self.send_json({"success": False, "error": "vote_id entier requis"}, 400)
+            else:
+                self.send_figee(reponses.resultats(lire_id(vote_id) if vote_id else None))
         
     
         elif path == "/api/bulletins":
@@ -96,11 +285,78 @@ class VoteRequestHandler(http.server.SimpleHTTPRequestHandler):
             self.send_json({"success": True, "bulletins": bulletins})
         
     
+        elif path == "/api/registre/racine":
+            vote_id = lire_id(query.get("vote_id", [None])[0])
+            if vote_id:
+                self.send_json({"success": True, "registre": db.get_racine_merkle(vote_id)})
+            else:
+                self.send_json({"success": False, "error": "vote_id entier requis"}, 400)
+        
+    
+        elif path == "/api/registre/preuve":
+            vote_id = lire_id(query.get("vote_id", [None])[0])
+            feuille = query.get("feuille", [None])[0]
+            if not vote_id or not feuille:
+                self.send_json({"success": False, "error": "vote_id entier et feuille requis"}, 400)
+            else:
+                preuve = db.get_preuve_merkle(vote_id, feuille)
+                if preuve:
+                    self.send_json({"success": True, "preuve": preuve})
+                else:
+                    self.send_json({"success": False, "error": "Recu inconnu"}, 404)
+        
+    
         elif path == "/api/bulletins/count":
             count = db.get_nombre_bulletins()
             self.send_json({"success": True, "count": count})
         
     
+        elif path == "/api/recus/cle":
+            self.send_json({"success": True, "cle": recus.get_cle_publique()})
+        
+    
+        elif path == "/api/jetons/filtres":
+            self.send_json({"success": True, "filtres": filtre_jetons.statistiques()})
+        
+    
+        elif path == "/api/audit/verifier":
+            self.send_json({"success": True, "verification": audit.verifier(), "journal": audit.statistiques()})
+        
+    
+        elif path == "/api/archives":
+            self.send_json({"success": True, "archives": db.get_votes_archives()})
+        
+    
+        elif path == "/api/votes/participation":
+            vote_id = lire_id(query.get("vote_id", [None])[0])
+            if not vote_id:
+                self.send_json({"success": False, "error": "vote_id entier requis"}, 400)
+            elif not db.get_vote(vote_id):
+                self.send_json({"success": False, "error": "Vote non trouve"}, 404)
+            else:
+                self.send_json({"success": True, "participation": listes_electorales.participation(vote_id)})
+        
+    
+        elif path == "/api/jobs":
+            self.send_json({"success": True, "taches": db.get_taches(), "file": taches.statistiques()})
+        
+    
+        elif path.startswith("/api/jobs/"):
+            tache_id = path[len("/api/jobs/"):]
+            if not tache_id.isdigit():
+                self.send_json({"success": False, "error": "Tache non trouvee"}, 404)
+                return
+            try:
+                delai = float(query.get("attendre", ["0"])[0])
+            except ValueError:
+                delai = 0
+            tache = taches.attendre(int(tache_id), delai) if delai > 0 else db.get_tache(int(tache_id))
+            if tache:
+                self.send_json({"success": True, "tache": tache})
+            else:
+                self.send_json({"success": False, "error": "Tache non trouvee"}, 404)
+        
+    
         elif path == "/api/generer-cles":
             cle_pub, cle_priv = generer_cles()
             self.send_json({"success": True, "cle_publique": cle_pub, "cle_privee": cle_priv})
@@ -119,7 +375,7 @@ class VoteRequestHandler(http.server.SimpleHTTPRequestHandler):
             super().do_GET()
     
 
-    def do_POST(self):
+    def traiter_post(self):
     
         path = urllib.parse.urlparse(self.path).path
         data = self.get_body()
@@ -129,6 +385,7 @@ class VoteRequestHandler(http.server.SimpleHTTPRequestHandler):
             email = data.get("email", "")
             mot_de_passe = data.get("mot_de_passe", "")
             resultat = db.authentifier_electeur(email, mot_de_passe)
+            audit.enregistrer("auth_electeur", email=email, succes=resultat["success"], client=self.client())
             if resultat["success"]:
                 self.send_json(resultat)
             else:
@@ -139,6 +396,7 @@ class VoteRequestHandler(http.server.SimpleHTTPRequestHandler):
             username = data.get("username", "")
             mot_de_passe = data.get("mot_de_passe", "")
             resultat = db.authentifier_admin(username, mot_de_passe)
+            audit.enregistrer("auth_admin", username=username, succes=resultat["success"], client=self.client())
             if resultat["success"]:
                 self.send_json(resultat)
             else:
@@ -165,14 +423,42 @@ class VoteRequestHandler(http.server.SimpleHTTPRequestHandler):
             libelle = data.get("libelle", "")
             vote_id = data.get("vote_id", "")
             description = data.get("description", "")
+            photo = data.get("photo", "")
             
             if not libelle:
                 self.send_json({"success": False, "error": "Libelle requis"}, 400)
             elif not vote_id:
                 self.send_json({"success": False, "error": "Vote requis"}, 400)
+            elif not lire_id(vote_id):
+                self.send_json({"success": False, "error": "vote_id entier requis"}, 400)
             else:
-                resultat = db.ajouter_option(vote_id, libelle, description)
+                # Meme cle entiere que les lectures : ajout et invalidation visent le meme cache
+                vote_id = lire_id(vote_id)
+                try:
+                    resultat = db.ajouter_option(vote_id, libelle, description, photo)
+                except medias.MediaInvalide as e:
+                    self.send_json({"success": False, "error": str(e)}, 400)
+                    return
+                cache_votes.invalider_options(vote_id)
+                self.send_json(resultat)
+        
+    
+        elif path == "/api/options/photo":
+            option_id = data.get("id", "")
+            
+            if not option_id:
+                self.send_json({"success": False, "error": "ID requis"}, 400)
+                return
+            try:
+                resultat = db.definir_photo_option(option_id, data.get("photo", ""))
+            except medias.MediaInvalide as e:
+                self.send_json({"success": False, "error": str(e)}, 400)
+                return
+            if resultat["success"]:
+                cache_votes.invalider_options(resultat["vote_id"])
                 self.send_json(resultat)
+            else:
+                self.send_json(resultat, 404)
         
     
         elif path == "/api/options/supprimer":
@@ -184,6 +470,7 @@ class VoteRequestHandler(http.server.SimpleHTTPRequestHandler):
                 self.send_json({"success": False, "error": "Impossible de supprimer une option pendant ou apres un vote"}, 400)
             else:
                 resultat = db.supprimer_option(option_id)
+                cache_votes.invalider_options()
                 self.send_json(resultat)
         
     
@@ -212,21 +499,34 @@ class VoteRequestHandler(http.server.SimpleHTTPRequestHandler):
             if vote["statut"] != "active":
                 self.send_json({"success": False, "error": "Ce vote n'est pas actif"}, 400)
                 return
+            if not listes_electorales.est_eligible(vote["id"], electeur["id"]):
+                self.send_json({"success": False, "error": "Electeur non inscrit sur la liste de ce vote"}, 403)
+                return
             
         
             jeton = db.generer_jeton(electeur_id, vote_id, vote["salt"])
             jeton_hash = db.hash_jeton(jeton)
+            if self.hors_partition(jeton_hash):
+                return
             
         
-            existant = db.jeton_existe(jeton_hash)
+            # Pre-filtre en memoire : seul "inconnu" est certain et evite la requete SQL
+            etat = filtre_jetons.consulter(jeton_hash, vote["id"])
+            existant = None
+            if etat != filtre_jetons.INCONNU:
+                existant = db.jeton_existe(jeton_hash, vote["id"])
+                if not existant:
+                    filtre_jetons.signaler_absent(jeton_hash, vote["id"])
             if existant:
                 if existant["utilise"] == 1:
                     self.send_json({"success": False, "error": "Vous avez deja vote pour ce vote"}, 400)
                 else:
+                    listes_electorales.marquer_retrait(vote["id"], electeur["id"])
                     self.send_json({"success": True, "jeton": jeton, "message": "Jeton deja attribue"})
             else:
             
                 db.creer_jeton(vote_id, jeton_hash)
+                listes_electorales.marquer_retrait(vote["id"], electeur["id"])
                 self.send_json({"success": True, "jeton": jeton})
         
     
@@ -243,9 +543,15 @@ class VoteRequestHandler(http.server.SimpleHTTPRequestHandler):
             
         
             jeton_hash = db.hash_jeton(jeton)
+            if self.hors_partition(jeton_hash):
+                return
+            if filtre_jetons.consulter(jeton_hash, votes_actifs=db.get_ids_votes_actifs()) == filtre_jetons.INCONNU:
+                self.send_json({"success": False, "error": "Jeton invalide"}, 400)
+                return
             jeton_data = db.jeton_existe(jeton_hash)
             
             if not jeton_data:
+                filtre_jetons.signaler_absent(jeton_hash)
                 self.send_json({"success": False, "error": "Jeton invalide"}, 400)
                 return
             if jeton_data["utilise"] == 1:
@@ -253,7 +559,7 @@ class VoteRequestHandler(http.server.SimpleHTTPRequestHandler):
                 return
             
         
-            vote = db.get_vote(jeton_data["vote_id"])
+            vote = cache_votes.get_vote(jeton_data["vote_id"])
             if not vote:
                 self.send_json({"success": False, "error": "Vote non trouve"}, 404)
                 return
@@ -263,12 +569,15 @@ class VoteRequestHandler(http.server.SimpleHTTPRequestHandler):
             
             try:
             
-                cle_pub = crypto.json_vers_cle_publique(vote["cle_publique_vote"])
+                cle_pub = cache_votes.get_cle_publique(vote)
                 bulletin = crypto.chiffrer_vote(option_id, jeton_hash, cle_pub)
                 
             
                 resultat = db.enregistrer_bulletin(vote["id"], bulletin["vote_chiffre"], jeton_hash)
                 if resultat["success"]:
+                    recu_signe = recus.signer(resultat["recu"])
+                    if recu_signe:
+                        resultat["recu"] = recu_signe
                     self.send_json(resultat)
                 else:
                     self.send_json(resultat, 400)
@@ -276,16 +585,81 @@ class VoteRequestHandler(http.server.SimpleHTTPRequestHandler):
                 self.send_json({"success": False, "error": str(e)}, 400)
         
     
+        elif path == "/api/voter/batch":
+            bulletins = data.get("bulletins")
+            
+            if not isinstance(bulletins, list) or not bulletins:
+                self.send_json({"success": False, "error": "Liste de bulletins requise"}, 400)
+                return
+            if len(bulletins) > lots_bulletins.TAILLE_MAX:
+                self.send_json({"success": False, "error": "Lot limite a " + str(lots_bulletins.TAILLE_MAX) + " bulletins"}, 413)
+                return
+            resultats = lots_bulletins.deposer(bulletins)
+            acceptes = sum(1 for resultat in resultats if resultat["success"])
+            self.send_json({"success": True, "acceptes": acceptes, "refuses": len(resultats) - acceptes, "resultats": resultats})
+        
+    
+        elif path == "/api/recus/verifier":
+            liste = data.get("recus", [])
+            if not isinstance(liste, list) or not liste:
+                self.send_json({"success": False, "error": "Liste de recus requise"}, 400)
+            else:
+                valides = recus.verifier_recus(liste)
+                self.send_json({"success": True, "valides": valides, "tous_valides": all(valides)})
+        
+    
         elif path == "/api/votes":
             titre = data.get("titre", "")
             description = data.get("description", "")
             
             if not titre:
                 self.send_json({"success": False, "error": "Titre requis"}, 400)
-            else:
+                return
+            try:
+                ouverture, fermeture = planificateur.valider_planning(data.get("date_ouverture"), data.get("date_fermeture"))
+            except ValueError as e:
+                self.send_json({"success": False, "error": str(e)}, 400)
+                return
+            
+            # Cles generees en tache de fond : le vote ne peut etre active qu'une fois la tache finie
+            resultat = db.creer_vote(titre, description)
+            try:
+                tache, creee = taches.soumettre("generer_cles", {"vote_id": resultat["id"]}, "generer_cles-" + str(resultat["id"]))
+                resultat["tache"] = tache
+            except taches.FileSaturee:
                 cle_pub, cle_priv = generer_cles()
-                resultat = db.creer_vote(titre, description, cle_pub, cle_priv)
-                self.send_json(resultat)
+                db.enregistrer_cles_vote(resultat["id"], cle_pub, cle_priv)
+            if ouverture or fermeture:
+                db.planifier_vote(resultat["id"], ouverture, fermeture)
+                planificateur.planifier(resultat["id"], ouverture, fermeture)
+            self.send_json(resultat)
+        
+    
+        elif path == "/api/votes/planifier":
+            vote_id = data.get("id", "")
+            
+            if not vote_id:
+                self.send_json({"success": False, "error": "ID requis"}, 400)
+                return
+            vote = db.get_vote(vote_id)
+            if not vote:
+                self.send_json({"success": False, "error": "Vote non trouve"}, 404)
+                return
+            if vote["statut"] == "terminee":
+                self.send_json({"success": False, "error": "Ce vote est termine"}, 400)
+                return
+            try:
+                ouverture, fermeture = planificateur.valider_planning(data.get("date_ouverture"), data.get("date_fermeture"))
+            except ValueError as e:
+                self.send_json({"success": False, "error": str(e)}, 400)
+                return
+            if vote["statut"] == "active" and ouverture:
+                self.send_json({"success": False, "error": "Ce vote est deja ouvert"}, 400)
+                return
+            
+            resultat = db.planifier_vote(vote["id"], ouverture, fermeture)
+            planificateur.planifier(vote["id"], ouverture, fermeture)
+            self.send_json(resultat)
         
     
         elif path == "/api/votes/statut":
@@ -295,59 +669,111 @@ class VoteRequestHandler(http.server.SimpleHTTPRequestHandler):
             if not vote_id or not statut:
                 self.send_json({"success": False, "error": "ID et statut requis"}, 400)
             else:
-                resultat = db.changer_statut_vote(vote_id, statut)
-                self.send_json(resultat)
+                resultat = planificateur.appliquer_statut(vote_id, statut)
+                if resultat["success"]:
+                    self.send_json(resultat)
+                else:
+                    self.send_json(resultat, 400)
         
     
-        elif path == "/api/decompte":
+        elif path == "/api/votes/liste":
             vote_id = data.get("vote_id", "")
             
             if not vote_id:
                 self.send_json({"success": False, "error": "ID vote requis"}, 400)
                 return
-            
-        
             vote = db.get_vote(vote_id)
             if not vote:
                 self.send_json({"success": False, "error": "Vote non trouve"}, 404)
                 return
+            if vote["statut"] == "terminee":
+                self.send_json({"success": False, "error": "Ce vote est termine"}, 400)
+                return
+            if data.get("supprimer"):
+                self.send_json(listes_electorales.supprimer(vote["id"]))
+                return
+            electeurs = data.get("electeurs")
+            segments = data.get("segments") or {}
+            if not isinstance(electeurs, list) or not isinstance(segments, dict):
+                self.send_json({"success": False, "error": "Liste d'electeurs requise"}, 400)
+                return
+            try:
+                self.send_json(listes_electorales.charger(vote["id"], electeurs, segments))
+            except (TypeError, ValueError) as e:
+                self.send_json({"success": False, "error": str(e)}, 400)
+        
+    
+        elif path == "/api/votes/detacher":
+            vote_id = data.get("vote_id", "")
             
+            if not vote_id:
+                self.send_json({"success": False, "error": "ID vote requis"}, 400)
+            else:
+                resultat = db.detacher_fragment(vote_id)
+                if resultat["success"]:
+                    self.send_json(resultat)
+                else:
+                    self.send_json(resultat, 400)
         
-            if db.resultats_existent(vote_id):
-                resultats = db.get_resultats(vote_id)
-                self.send_json({"success": True, "resultats": resultats, "deja_calcule": True})
-                return
+    
+        elif path == "/api/partition/synchroniser":
+            vote_id = data.get("vote_id", "")
             
-            try:
+            if self.client_address[0] not in LOCAUX:
+                self.send_json({"success": False, "error": "Reserve au routeur local"}, 403)
+            elif not vote_id:
+                cache_votes.invalider_options()
+                self.send_json({"success": True})
+            elif data.get("prechauffer"):
+                # Ouverture programmee imminente (minuterie du routeur)
+                self.send_json({"success": cache_votes.prechauffer(vote_id)})
+            else:
+                self.send_json({"success": planificateur.synchroniser(vote_id)})
+        
+    
+        elif path == "/api/votes/exporter":
+            vote_id = data.get("vote_id", "")
             
-                cle_priv = crypto.json_vers_cle_privee(vote["cle_privee_vote"])
-                bulletins = db.get_bulletins_by_vote(vote_id)
-                
+            if not vote_id:
+                self.send_json({"success": False, "error": "ID vote requis"}, 400)
+            else:
+                resultat = db.exporter_vote(vote_id)
+                if resultat["success"]:
+                    self.send_json(resultat)
+                else:
+                    self.send_json(resultat, 400)
+        
+    
+        elif path == "/api/jobs":
+            # Cle d'idempotence : en-tete Idempotency-Key ou champ "cle"
+            cle = self.headers.get("Idempotency-Key") or data.get("cle") or None
+            try:
+                tache, creee = taches.soumettre(data.get("type", ""), data.get("parametres") or {}, cle)
+            except taches.TacheInvalide as e:
+                self.send_json({"success": False, "error": str(e)}, 400)
+                return
+            except taches.FileSaturee as e:
+                self.send_json({"success": False, "error": str(e)}, 503, {"Retry-After": "5"})
+                return
+            self.send_json({"success": True, "tache": tache, "existante": not creee}, 202 if creee else 200)
+        
+    
+        elif path == "/api/decompte":
+            vote_id = data.get("vote_id", "")
             
-                decompte = {}
-                for bulletin in bulletins:
-                    try:
-                        resultat = crypto.dechiffrer_vote(bulletin["bulletin_chiffre"], cle_priv)
-                        option_id = resultat["candidat_id"]
-                        if option_id in decompte:
-                            decompte[option_id] = decompte[option_id] + 1
-                        else:
-                            decompte[option_id] = 1
-                    except:
-                        pass
-                
+            if not vote_id:
+                self.send_json({"success": False, "error": "ID vote requis"}, 400)
+                return
             
-                for option_id in decompte:
-                    nombre = decompte[option_id]
-                    db.enregistrer_resultat(vote_id, option_id, nombre)
-                
+        
+            vote = db.get_vote(vote_id)
+            if not vote:
+                self.send_json({"success": False, "error": "Vote non trouve"}, 404)
+                return
             
-                total = 0
-                for option_id in decompte:
-                    total = total + decompte[option_id]
-                
-                resultats = db.get_resultats(vote_id)
-                self.send_json({"success": True, "resultats": resultats, "total_bulletins": total})
+        
+            try:
+                self.send_json(decompte.executer_decompte(vote))
             except Exception as e:
                 self.send_json({"success": False, "error": str(e)}, 400)
         
@@ -356,18 +782,65 @@ class VoteRequestHandler(http.server.SimpleHTTPRequestHandler):
             self.send_json({"success": False, "error": "Route non trouvee"}, 404)
 
 
-if __name__ == "__main__":
+class VoteServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def initialiser(skip_init=False):
+    # --skip-init : on evite les CREATE TABLE et migrations si le schema est deja a jour
+    if not (skip_init and db.schema_a_jour()):
+        db.init_database()
+    for vote_id in db.get_ids_votes_actifs():
+        cache_votes.prechauffer(vote_id)
+
+
+def creer_application(host=HOST, port=PORT, skip_init=False, partition=None, partitions=1, replique_intervalle=None):
+    if partition is not None:
+        db.configurer_partition(partition, partitions)
+        audit.demarrer(os.path.join(db.DOSSIER_PARTITIONS, "audit_" + str(partition) + ".log"))
+    else:
+        audit.demarrer()
+    initialiser(skip_init)
+    # En mode partitionne, les minuteries des votes tournent dans le routeur seul
+    if partition is None:
+        planificateur.demarrer()
+    # Les requetes /api/jobs arrivent a la partition 0 ; le decompte fusionne reste au routeur
+    if partition is None:
+        taches.demarrer(tuple(taches.TRAVAUX))
+    elif partition == 0:
+        taches.demarrer(tuple(t for t in taches.TRAVAUX if t != "decompte"))
+    if replique.ACTIVE:
+        replique.demarrer(replique_intervalle)
+    return VoteServer((host, port), VoteRequestHandler)
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Serveur de vote electronique")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--skip-init", action="store_true", help="Ne pas initialiser la base si le schema est a jour")
+    parser.add_argument("--partition", type=int, default=None, help="Indice de la partition servie (voir routeur.py)")
+    parser.add_argument("--partitions", type=int, default=1, help="Nombre total de partitions")
+    parser.add_argument("--replique-intervalle", type=float, default=None, help="Secondes entre deux copies de la replique")
+    args = parser.parse_args(argv)
+    
+    serveur = creer_application(args.host, args.port, args.skip_init, args.partition, args.partitions, args.replique_intervalle)
+    
     print("")
     print("Demarrage du serveur de vote...")
-    print("URL: http://" + HOST + ":" + str(PORT))
+    print("URL: http://" + args.host + ":" + str(args.port))
     print("Admin: admin / admin123")
     print("")
     
-    serveur = socketserver.TCPServer((HOST, PORT), VoteRequestHandler)
-    
     try:
         serveur.serve_forever()
     except KeyboardInterrupt:
         print("")
         print("Arret du serveur.")
-        serveur.shutdown()
+        serveur.server_close()
+
+
+if __name__ == "__main__":
+    main()
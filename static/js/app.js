@@ -106,7 +106,9 @@ async function loadOptions(containerId, selectable = false, voteId = null) {
     if (!r.success || !r.options?.length) { c.innerHTML = '<p class="text-center text-muted">Aucune option</p>'; return; }
     c.innerHTML = r.options.map(x => `
         <div class="candidat-card ${selectable ? 'selectable' : ''}" data-id="${x.id}" ${selectable ? `onclick="selectOption(${x.id})"` : ''}>
-            <div class="candidat-photo">${x.libelle.substring(0, 2).toUpperCase()}</div>
+            ${x.photo
+                ? `<img class="candidat-photo" src="/medias/${x.photo}/400" srcset="/medias/${x.photo}/400 1x, /medias/${x.photo}/800 2x" alt="${esc(x.libelle)}" loading="lazy">`
+                : `<div class="candidat-photo">${x.libelle.substring(0, 2).toUpperCase()}</div>`}
             <div class="candidat-info">
                 <h3>${esc(x.libelle)}</h3>
                 <p class="description">${esc(x.description || '')}</p>
@@ -172,7 +174,7 @@ async function submitVote() {
         session.markVoted(currentVoteId);
         notify('Vote anonyme enregistré!', 'success');
         const s = document.getElementById('vote-section');
-        if (s) s.innerHTML = `<div class="card text-center"><div style="font-size:4rem;color:var(--secondary-color)">✓</div><h2>Merci!</h2><p>Votre vote a été enregistré de manière anonyme.</p><p class="text-muted">L'administrateur ne peut pas savoir qui a voté.</p><a href="resultats.html" class="btn btn-primary mt-3">Voir les résultats</a></div>`;
+        if (s) s.innerHTML = `<div class="card text-center"><div style="font-size:4rem;color:var(--secondary-color)">✓</div><h2>Merci!</h2><p>Votre vote a été enregistré de manière anonyme.</p><p class="text-muted">L'administrateur ne peut pas savoir qui a voté.</p>${r.recu ? `<p class="text-muted">Reçu : <code>${r.recu.feuille}</code></p>` : ''}<a href="resultats.html" class="btn btn-primary mt-3">Voir les résultats</a></div>`;
     } else notify(r.error || 'Erreur', 'error');
 }
 
@@ -209,9 +211,18 @@ async function loadResultats(id) {
 }
 
 
-async function addOption(voteId, libelle, description) {
+function lireFichier(fichier) {
+    return new Promise((resolve, reject) => {
+        const lecteur = new FileReader();
+        lecteur.onload = () => resolve(lecteur.result);
+        lecteur.onerror = reject;
+        lecteur.readAsDataURL(fichier);
+    });
+}
+
+async function addOption(voteId, libelle, description, photo = '') {
     loader(true, 'Ajout...');
-    const r = await api('/api/options', 'POST', { vote_id: voteId, libelle, description });
+    const r = await api('/api/options', 'POST', { vote_id: voteId, libelle, description, photo });
     loader(false);
     notify(r.success ? 'Option ajoutée!' : (r.error || 'Erreur'), r.success ? 'success' : 'error');
     return r;
@@ -234,16 +245,24 @@ async function loadAdminOptions(id) {
     c.innerHTML = r.options?.length ? r.options.map(x => `<tr><td>${x.id}</td><td>${esc(x.libelle)}</td><td>${esc(x.vote_titre || '-')}</td><td>${esc(x.description || '-')}</td><td>${voteLance ? '<span class="text-muted">-</span>' : `<button class="btn btn-danger btn-sm" onclick="deleteOption(${x.id})">Supprimer</button>`}</td></tr>`).join('') : '<tr><td colspan="5" class="text-center">Aucune option</td></tr>';
 }
 
-async function loadAdminElecteurs(id) {
+async function loadAdminElecteurs(id, q = '') {
     const c = document.getElementById(id);
     if (!c) return;
-    const r = await api('/api/electeurs');
+    const r = await api(q ? `/api/electeurs/search?q=${encodeURIComponent(q)}&limit=50` : '/api/electeurs');
     c.innerHTML = r.electeurs?.length ? r.electeurs.map(x => `<tr><td>${x.id}</td><td>${esc(x.prenom)} ${esc(x.nom)}</td><td>${esc(x.email)}</td><td>${formatDate(x.date_inscription)}</td></tr>`).join('') : '<tr><td colspan="4" class="text-center">Aucun électeur</td></tr>';
 }
 
-async function createVote(titre, description) {
+async function createVote(titre, description, ouverture = '', fermeture = '') {
     loader(true, 'Création...');
-    const r = await api('/api/votes', 'POST', { titre, description });
+    // Les dates saisies sont locales : on les envoie en UTC
+    const date_ouverture = ouverture ? new Date(ouverture).toISOString() : null;
+    const date_fermeture = fermeture ? new Date(fermeture).toISOString() : null;
+    let r = await api('/api/votes', 'POST', { titre, description, date_ouverture, date_fermeture });
+    // Les cles du vote sont generees par une tache de fond
+    if (r.success && r.tache) {
+        const cles = await suivreTache(r.tache, 'Génération des clés...');
+        if (!cles.success) r = { success: false, error: cles.error };
+    }
     loader(false);
     notify(r.success ? 'Vote créé!' : (r.error || 'Erreur'), r.success ? 'success' : 'error');
     return r;
@@ -269,9 +288,21 @@ async function loadAdminVotes(id) {
     </td></tr>`).join('') : '<tr><td colspan="4" class="text-center">Aucun vote</td></tr>';
 }
 
+// Tache de fond : attente longue sur /api/jobs/<id> jusqu'a la fin, avec la progression
+async function suivreTache(tache, msg) {
+    while (!['terminee', 'echouee'].includes(tache.statut)) {
+        loader(true, `${msg} ${Math.round((tache.progression || 0) * 100)}%`);
+        const r = await api(`/api/jobs/${tache.id}?attendre=20`);
+        if (!r.success) return { success: false, error: r.error };
+        tache = r.tache;
+    }
+    return tache.resultat || { success: false, error: tache.erreur };
+}
+
 async function decompterBulletins(voteId) {
     loader(true, 'Décompte des bulletins...');
-    const r = await api('/api/decompte', 'POST', { vote_id: voteId });
+    const j = await api('/api/jobs', 'POST', { type: 'decompte', parametres: { vote_id: voteId }, cle: `decompte-${voteId}` });
+    const r = j.success ? await suivreTache(j.tache, 'Décompte des bulletins...') : j;
     loader(false);
     if (r.success) {
         const total = r.resultats?.reduce((s, x) => s + x.nombre_bulletins, 0) || 0;
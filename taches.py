@@ -0,0 +1,193 @@
+# taches.py
+# Travaux d'administration longs (generation de cles, depouillement, archivage) executes
+# hors du fil HTTP par un nombre borne de travailleurs. POST /api/jobs renvoie l'id de la
+# tache ; GET /api/jobs/<id> donne son etat, sa progression puis son resultat.
+#
+# L'etat est dans la table taches : un resultat reste consultable apres un redemarrage et
+# une tache interrompue par un arret est reprise au demarrage suivant.
+# Cle d'idempotence : une soumission repetee avec la meme cle renvoie la tache existante.
+
+import queue
+import threading
+import time
+import audit
+import database as db
+import decompte
+import rsa as crypto
+
+NB_TRAVAILLEURS = 2
+TAILLE_FILE = 100
+# Duree maximale d'une attente longue sur GET /api/jobs/<id>?attendre=N
+ATTENTE_MAX = 20
+# Ecriture de la progression en base au plus une fois par intervalle
+INTERVALLE_PROGRESSION = 0.5
+
+STATUTS_FINAUX = ("terminee", "echouee")
+
+_file = queue.Queue(TAILLE_FILE)
+_condition = threading.Condition()
+_verrou = threading.Lock()
+_threads = []
+_dernieres_progressions = {}
+
+
+class TacheInvalide(Exception):
+    pass
+
+
+class FileSaturee(Exception):
+    pass
+
+
+def _generer_cles(parametres, progression):
+    # La cle privee reste dans la ligne du vote : le resultat de la tache, stocke en clair dans
+    # taches et servi par GET /api/jobs, ne porte que la cle publique
+    vote = db.get_vote(parametres.get("vote_id"))
+    if not vote:
+        return {"success": False, "error": "Vote non trouve"}
+    if not vote["cle_publique_vote"]:
+        cle_publique, cle_privee = crypto.generer_cles_rsa(1024)
+        cle_pub_json, cle_priv_json = crypto.cles_vers_json(cle_publique, cle_privee)
+        db.enregistrer_cles_vote(vote["id"], cle_pub_json, cle_priv_json)
+        vote = db.get_vote(vote["id"])
+    return {"success": True, "vote_id": vote["id"], "cle_publique": vote["cle_publique_vote"]}
+
+
+def _decompte(parametres, progression):
+    if db.PARTITION is not None:
+        return {"success": False, "error": "En mode partitionne, le decompte est lance par le routeur"}
+    vote = db.get_vote(parametres["vote_id"])
+    if not vote:
+        return {"success": False, "error": "Vote non trouve"}
+    total = max(1, db.get_nombre_bulletins(vote["id"]))
+    return decompte.executer_decompte(vote, lambda traites: progression(min(1, traites / total)))
+
+
+def _exporter(parametres, progression):
+    return db.exporter_vote(parametres["vote_id"])
+
+
+def _detacher(parametres, progression):
+    return db.detacher_fragment(parametres["vote_id"])
+
+
+# type -> (fonction(parametres, progression), parametres requis)
+TRAVAUX = {
+    "generer_cles": (_generer_cles, ("vote_id",)),
+    "decompte": (_decompte, ("vote_id",)),
+    "exporter": (_exporter, ("vote_id",)),
+    "detacher": (_detacher, ("vote_id",)),
+}
+
+
+def _notifier():
+    with _condition:
+        _condition.notify_all()
+
+
+def _progresser(tache_id, progression):
+    maintenant = time.time()
+    if maintenant - _dernieres_progressions.get(tache_id, 0) < INTERVALLE_PROGRESSION:
+        return
+    _dernieres_progressions[tache_id] = maintenant
+    db.progresser_tache(tache_id, round(progression, 4))
+    _notifier()
+
+
+def _executer(tache_id):
+    tache = db.get_tache(tache_id)
+    if not tache or tache["statut"] in STATUTS_FINAUX:
+        return
+    db.demarrer_tache(tache_id)
+    _notifier()
+    fonction = TRAVAUX[tache["type"]][0]
+    debut = time.perf_counter()
+    resultat = None
+    erreur = None
+    try:
+        resultat = fonction(tache["parametres"], lambda progression: _progresser(tache_id, progression))
+        if resultat.get("success") is False:
+            erreur = resultat.get("error", "Echec")
+    except Exception as e:
+        erreur = str(e)
+    statut = "echouee" if erreur else "terminee"
+    db.terminer_tache(tache_id, statut, resultat, erreur)
+    _dernieres_progressions.pop(tache_id, None)
+    audit.enregistrer("tache", tache_id=tache_id, type=tache["type"], statut=statut,
+                      duree_ms=round((time.perf_counter() - debut) * 1000, 1))
+    _notifier()
+
+
+def _boucle():
+    while True:
+        tache_id = _file.get()
+        try:
+            _executer(tache_id)
+        except Exception as e:
+            print("Tache " + str(tache_id) + " : " + str(e))
+
+
+def demarrer(reprendre_types=()):
+    # reprendre_types : taches interrompues par le dernier arret que ce processus doit relancer
+    with _verrou:
+        if not _threads:
+            for indice in range(NB_TRAVAILLEURS):
+                thread = threading.Thread(target=_boucle, name="tache-" + str(indice), daemon=True)
+                thread.start()
+                _threads.append(thread)
+    for tache_id, type_tache in db.get_taches_interrompues():
+        if type_tache in reprendre_types:
+            try:
+                _file.put_nowait(tache_id)
+            except queue.Full:
+                db.terminer_tache(tache_id, "echouee", erreur="File des taches pleine au redemarrage")
+
+
+def soumettre(type_tache, parametres, cle=None):
+    if type_tache not in TRAVAUX:
+        raise TacheInvalide("Type de tache inconnu : " + str(type_tache))
+    if not isinstance(parametres, dict):
+        raise TacheInvalide("Parametres invalides")
+    for champ in TRAVAUX[type_tache][1]:
+        if not parametres.get(champ):
+            raise TacheInvalide("Parametre requis : " + champ)
+
+    tache_id, creee = db.creer_tache(type_tache, parametres, cle)
+    if not creee:
+        tache = db.get_tache(tache_id)
+        if tache["type"] != type_tache or tache["parametres"] != parametres:
+            raise TacheInvalide("Cle d'idempotence deja utilisee pour une autre tache")
+        # Une tache echouee est relancee ; en cours ou terminee, on la renvoie telle quelle
+        if not db.relancer_tache(tache_id):
+            return tache, False
+
+    demarrer()
+    try:
+        _file.put_nowait(tache_id)
+    except queue.Full:
+        db.terminer_tache(tache_id, "echouee", erreur="File des taches pleine")
+        raise FileSaturee("File des taches pleine")
+    audit.enregistrer("soumettre_tache", tache_id=tache_id, type=type_tache, parametres=parametres)
+    return db.get_tache(tache_id), True
+
+
+def attendre(tache_id, delai):
+    # Attente longue : rend la main des que l'etat ou la progression change, ou a la fin du delai.
+    # L'etat est relu en base chaque seconde (tache executee par un autre processus).
+    tache = db.get_tache(tache_id)
+    if not tache:
+        return None
+    depart = (tache["statut"], tache["progression"])
+    fin = time.time() + min(delai, ATTENTE_MAX)
+    while tache["statut"] not in STATUTS_FINAUX and (tache["statut"], tache["progression"]) == depart:
+        restant = fin - time.time()
+        if restant <= 0:
+            break
+        with _condition:
+            _condition.wait(min(restant, 1.0))
+        tache = db.get_tache(tache_id)
+    return tache
+
+
+def statistiques():
+    return {"travailleurs": len(_threads), "en_file": _file.qsize(), "taille_file": TAILLE_FILE}
@@ -0,0 +1,110 @@
+# test_voter_concurrent.py
+# Depots concurrents du meme jeton sur /api/voter : un seul bulletin doit etre accepte, et le
+# registre Merkle ne doit recevoir qu'une feuille.
+#
+# Usage : python -m unittest test_voter_concurrent
+
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+import urllib.error
+import urllib.request
+
+DOSSIER_SOURCE = os.path.dirname(os.path.abspath(__file__))
+
+
+def appel(port, chemin, data):
+    requete = urllib.request.Request("http://127.0.0.1:" + str(port) + chemin, json.dumps(data).encode(),
+                                     {"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(requete, timeout=60) as reponse:
+            return reponse.status, json.loads(reponse.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+class TestVoterConcurrent(unittest.TestCase):
+
+    def setUp(self):
+        # Base, journal d'audit et fichiers annexes dans un dossier jetable
+        self.dossier_initial = os.getcwd()
+        self.dossier = tempfile.mkdtemp()
+        os.chdir(self.dossier)
+        import audit
+        import database as db
+        import rsa as crypto
+        import server
+        self.db = db
+        self.audit = audit
+        audit.CHEMIN = os.path.join(self.dossier, "audit.log")
+        db.DATABASE_PATH = os.path.join(self.dossier, "vote_system.db")
+        self.serveur = server.creer_application("127.0.0.1", 0)
+        self.port = self.serveur.server_address[1]
+        threading.Thread(target=self.serveur.serve_forever, daemon=True).start()
+
+        publique, privee = crypto.generer_cles_rsa(2 ** 512, 2 ** 513)
+        cle_pub, cle_priv = crypto.cles_vers_json(publique, privee)
+        self.vote_id = db.creer_vote("Concurrence", "", cle_pub, cle_priv)["id"]
+        self.option_id = db.ajouter_option(self.vote_id, "A", "")["id"]
+        db.changer_statut_vote(self.vote_id, "active")
+        self.electeur_id = db.ajouter_electeur("N", "P", "concurrence@example.org", "pw")["id"]
+
+    def tearDown(self):
+        self.serveur.shutdown()
+        self.serveur.server_close()
+        self.audit.vider()
+        os.chdir(self.dossier_initial)
+        shutil.rmtree(self.dossier, ignore_errors=True)
+
+    def test_un_seul_bulletin_par_jeton(self):
+        statut, reponse = appel(self.port, "/api/jeton", {"electeur_id": self.electeur_id, "vote_id": self.vote_id})
+        self.assertEqual(statut, 200, reponse)
+        jeton = reponse["jeton"]
+
+        # Les 8 depots passent la verification du jeton avant qu'aucun n'enregistre son bulletin :
+        # la fenetre de la course est ouverte a chaque execution, meme sur un seul coeur
+        depart = threading.Barrier(8)
+        verification = threading.Barrier(8, timeout=10)
+        jeton_existe = self.db.jeton_existe
+
+        def jeton_existe_synchronise(*args, **kwargs):
+            resultat = jeton_existe(*args, **kwargs)
+            try:
+                verification.wait()
+            except threading.BrokenBarrierError:
+                pass
+            return resultat
+
+        self.db.jeton_existe = jeton_existe_synchronise
+        self.addCleanup(setattr, self.db, "jeton_existe", jeton_existe)
+        reponses = []
+
+        def voter():
+            depart.wait()
+            reponses.append(appel(self.port, "/api/voter", {"jeton": jeton, "option_id": self.option_id}))
+
+        threads = [threading.Thread(target=voter) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        acceptes = [r for statut, r in reponses if statut == 200 and r.get("success")]
+        self.assertEqual(len(acceptes), 1, reponses)
+        for statut, r in reponses:
+            if not r.get("success"):
+                self.assertEqual(statut, 400, r)
+
+        conn = sqlite3.connect(self.db.DATABASE_PATH)
+        bulletins = conn.execute("SELECT COUNT(*) FROM bulletins WHERE vote_id = ?", (self.vote_id,)).fetchone()[0]
+        conn.close()
+        self.assertEqual(bulletins, 1)
+        self.assertEqual(self.db.get_racine_merkle(self.vote_id)["taille"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()